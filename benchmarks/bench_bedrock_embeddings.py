@@ -0,0 +1,94 @@
+"""
+Bedrock embedding throughput against a stubbed bedrock-runtime client.
+
+The stub answers invoke_model after a fixed latency and raises ThrottlingException
+whenever more than --quota requests are in flight, like an account at its limit.
+Embeds the same texts sequentially and through the concurrent pool, checks that
+every vector comes back in order, and reports calls, throttles and embeddings per
+second. Runs fully offline; no AWS credentials are needed.
+
+Usage:
+    python benchmarks/bench_bedrock_embeddings.py [--texts 400] [--latency 0.05] [--quota 6]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError  # noqa: E402
+from config import config  # noqa: E402
+from plat.embedding.embeddings_bedrock import BedrockEmbeddings  # noqa: E402
+
+
+def stub_embedding(text: str):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [b / 255.0 for b in digest[:16]]
+
+
+class StubBedrockClient:
+    """Stand-in for boto3's bedrock-runtime client with an in-flight request quota."""
+
+    def __init__(self, latency: float, quota: int):
+        self.latency = latency
+        self.quota = quota
+        self.stats = {"calls": 0, "throttled": 0, "max_in_flight": 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, contentType, accept):
+        with self._lock:
+            self.stats["calls"] += 1
+            if self._in_flight >= self.quota:
+                self.stats["throttled"] += 1
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "InvokeModel"
+                )
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        try:
+            time.sleep(self.latency)
+            text = json.loads(body)["inputText"]
+            return {"body": io.BytesIO(json.dumps({"embedding": stub_embedding(text)}).encode("utf-8"))}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def _run(name: str, texts, concurrency: int, latency: float, quota: int):
+    config.BEDROCK_EMBEDDING_CONCURRENCY = concurrency
+    client = StubBedrockClient(latency, quota)
+    embeddings = BedrockEmbeddings(client=client)
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    seconds = time.perf_counter() - start
+
+    assert len(vectors) == len(texts), "wrong number of vectors"
+    assert all(vector == stub_embedding(text) for vector, text in zip(vectors, texts)), "vectors out of order"
+    print(f"{name:<24}{client.stats['calls']:>8}{client.stats['throttled']:>11}"
+          f"{client.stats['max_in_flight']:>11}{seconds:>10.2f}{len(texts) / seconds:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bedrock embedding throughput against a stubbed client")
+    parser.add_argument("--texts", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per invoke_model call")
+    parser.add_argument("--quota", type=int, default=6, help="Requests the stub allows in flight")
+    parser.add_argument("--concurrency", type=int, default=16, help="Pool size for the concurrent run")
+    args = parser.parse_args()
+
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet " * (1 + i % 20) for i in range(args.texts)]
+    print(f"{'mode':<24}{'calls':>8}{'throttled':>11}{'in flight':>11}{'seconds':>10}{'texts/s':>10}")
+    _run("sequential", texts, 1, args.latency, args.quota)
+    _run(f"concurrent ({args.concurrency})", texts, args.concurrency, args.latency, args.quota)
+
+
+if __name__ == "__main__":
+    main()
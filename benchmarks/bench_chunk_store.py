@@ -0,0 +1,116 @@
+"""
+Load time and resident memory of FAISS chunk metadata: pickles vs the chunk store.
+
+Writes the same synthetic chunks as the pickled list of dicts (plus id map) that FAISS
+stores used to keep and as a memory-mapped ChunkStore, then loads each in a fresh
+process, as a web worker does at startup, and reports the load time and the resident
+memory the process gained, before and after reading the chunks of a few searches:
+private memory (RssAnon) separately from file pages mapped from the page cache
+(RssFile), which every worker serving the store shares.
+
+Usage:
+    python benchmarks/bench_chunk_store.py [--chunks 200000] [--text-bytes 1000]
+"""
+
+import os
+import sys
+import json
+import pickle
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plat.vectordb.chunk_store import ChunkStore  # noqa: E402
+
+# Runs in a child process; prints seconds to load and the [private, shared] KB gained by
+# loading and by 50 searches of k=10
+_LOADER = """
+import os, sys, time, json, pickle, random
+sys.path.insert(0, {root!r})
+def rss():
+    with open("/proc/self/status") as f:
+        fields = dict(line.split(":", 1) for line in f if line.startswith("Rss"))
+    return [int(fields[name].split()[0]) for name in ("RssAnon", "RssFile")]
+from plat.vectordb.chunk_store import ChunkStore
+before = rss()
+start = time.perf_counter()
+if {kind!r} == "pickle":
+    with open(os.path.join({path!r}, "metadata.pkl"), "rb") as f:
+        metadata = pickle.load(f)
+    with open(os.path.join({path!r}, "id_map.pkl"), "rb") as f:
+        id_map = pickle.load(f)
+    get = metadata.__getitem__
+    count = len(metadata)
+else:
+    store = ChunkStore(os.path.join({path!r}, "chunks"))
+    get = store.get
+    count = len(store)
+seconds = time.perf_counter() - start
+loaded = rss()
+rng = random.Random(0)
+for _ in range(50):
+    for pos in rng.sample(range(count), min(10, count)):
+        get(pos)["text"]
+searched = rss()
+print(json.dumps([seconds, [a - b for a, b in zip(loaded, before)], [a - b for a, b in zip(searched, before)]]))
+"""
+
+
+def synthetic_chunks(count: int, text_bytes: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))) for _ in range(5000)]
+    for i in range(count):
+        text = " ".join(rng.choice(words) for _ in range(text_bytes // 6))
+        yield {
+            "id": f"docs/file{i // 200}.pdf:{i % 200}",
+            "file": f"docs/file{i // 200}.pdf",
+            "page": (i % 200) // 10 + 1,
+            "line": f"{i % 200 * 20}-{i % 200 * 20 + 20}",
+            "count": len(text.split()),
+            "text": text,
+        }
+
+
+def measure(kind: str, path: str):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, "-c", _LOADER.format(root=root, kind=kind, path=path)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load time and memory of FAISS chunk metadata")
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--text-bytes", type=int, default=1000, help="approximate text size per chunk")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        metadata = []
+        store = ChunkStore(os.path.join(path, "chunks"), load=False)
+        for i, chunk in enumerate(synthetic_chunks(args.chunks, args.text_bytes)):
+            metadata.append({**chunk, "faiss_idx": i})
+            store.append([chunk])
+        store.persist()
+        del store
+        with open(os.path.join(path, "metadata.pkl"), "wb") as f:
+            pickle.dump(metadata, f)
+        with open(os.path.join(path, "id_map.pkl"), "wb") as f:
+            pickle.dump({chunk["id"]: chunk["faiss_idx"] for chunk in metadata}, f)
+        del metadata
+
+        print(f"{args.chunks} chunks of ~{args.text_bytes} bytes of text")
+        print(f"{'metadata':<14}{'load s':>10}{'private MB':>12}{'shared MB':>11}"
+              f"{'+search private':>17}{'shared':>8}")
+        for kind in ("pickle", "chunk store"):
+            seconds, loaded, searched = measure(kind, path)
+            print(f"{kind:<14}{seconds:>10.3f}{loaded[0] / 1024:>12.1f}{loaded[1] / 1024:>11.1f}"
+                  f"{searched[0] / 1024:>17.1f}{searched[1] / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
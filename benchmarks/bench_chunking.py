@@ -0,0 +1,145 @@
+"""
+Chunking throughput microbenchmark.
+
+Generates synthetic text, code and PDF-extracted inputs of growing size and reports the
+chunking throughput in MB/s for each. With a linear-time chunker the MB/s figures stay
+flat as the input grows; a quadratic one drops by about half each time the size doubles.
+
+Usage:
+    python benchmarks/bench_chunking.py [--sizes 1,2,4,8] [--max-chunk-size 500] [--overlap 50]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from utils import iter_text_file_chunks, iter_code_file_chunks  # noqa: E402
+from utils.chunk_a_pdf_file import _chunk_page_text  # noqa: E402
+
+MB = 1 << 20
+WORDS = ("the index stores chunk vectors and metadata for every file so queries can find "
+         "relevant passages quickly while builds stay incremental and resumable").split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+
+def make_text(size: int, rng: random.Random) -> str:
+    """Prose paragraphs separated by blank lines."""
+    parts, total = [], 0
+    while total < size:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(2, 8)))
+        parts.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def make_unbroken_text(size: int, rng: random.Random) -> str:
+    """A single paragraph with no blank lines, the worst case for paragraph splitting."""
+    parts, total = [], 0
+    while total < size:
+        sentence = _sentence(rng)
+        parts.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(parts)
+
+
+def make_code(size: int, rng: random.Random) -> str:
+    """Python-like source with functions, comments and blank lines."""
+    parts, total, n = [], 0, 0
+    while total < size:
+        body = "\n".join(
+            f"    value_{i} = compute({rng.choice(WORDS)!r}, {rng.randint(0, 99)})"
+            for i in range(rng.randint(2, 12))
+        )
+        block = f"# {_sentence(rng)}\ndef function_{n}(arg):\n{body}\n    return value_0\n"
+        parts.append(block)
+        total += len(block) + 1
+        n += 1
+    return "\n".join(parts)
+
+
+def make_pdf_pages(size: int, rng: random.Random, page_size: int = 3000):
+    """Page texts shaped like PyMuPDF output: short lines, occasional blank-line breaks."""
+    pages, total = [], 0
+    while total < size:
+        lines, page_total = [], 0
+        while page_total < page_size:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12)))
+            lines.append(line if rng.random() > 0.1 else line + "\n")
+            page_total += len(line) + 1
+        page = "\n".join(lines)
+        pages.append(page)
+        total += len(page)
+    return pages
+
+
+def _time_file(chunker, path: str, max_chunk_size: int, overlap: int):
+    start = time.perf_counter()
+    count = sum(1 for _ in chunker(path, max_chunk_size, overlap))
+    return time.perf_counter() - start, count
+
+
+def _time_pages(pages, max_chunk_size: int, overlap: int):
+    start = time.perf_counter()
+    count, seq_no = 0, 1
+    for page_num, page in enumerate(pages, start=1):
+        chunks = _chunk_page_text(page, "bench.pdf", page_num, max_chunk_size, overlap, seq_no)
+        seq_no += len(chunks)
+        count += len(chunks)
+    return time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking throughput microbenchmark")
+    parser.add_argument("--sizes", default="1,2,4,8", help="Input sizes in MB, comma separated")
+    parser.add_argument("--max-chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # measure chunking alone, not reads from the extracted-text cache
+    config.TEXT_CACHE_MAX_MB = 0
+    sizes = [float(s) for s in args.sizes.split(",")]
+    rng = random.Random(args.seed)
+    results = {}
+
+    print(f"{'input':<16}{'MB':>8}{'chunks':>10}{'seconds':>10}{'MB/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in sizes:
+            size = int(size_mb * MB)
+            cases = []
+            for name, make, suffix in (("text", make_text, ".txt"),
+                                       ("text-unbroken", make_unbroken_text, ".txt"),
+                                       ("code", make_code, ".py")):
+                path = os.path.join(tmp, f"{name}-{size_mb}{suffix}")
+                with open(path, "w") as f:
+                    f.write(make(size, rng))
+                chunker = iter_code_file_chunks if suffix == ".py" else iter_text_file_chunks
+                seconds, count = _time_file(chunker, path, args.max_chunk_size, args.overlap)
+                cases.append((name, os.path.getsize(path) / MB, count, seconds))
+
+            pages = make_pdf_pages(size, rng)
+            seconds, count = _time_pages(pages, args.max_chunk_size, args.overlap)
+            cases.append(("pdf-extracted", sum(len(p) for p in pages) / MB, count, seconds))
+
+            for name, mb, count, seconds in cases:
+                rate = mb / seconds if seconds > 0 else float("inf")
+                results.setdefault(name, []).append(rate)
+                print(f"{name:<16}{mb:>8.1f}{count:>10}{seconds:>10.3f}{rate:>10.1f}")
+
+    # Linear scaling keeps throughput flat: compare the largest input with the smallest
+    print()
+    for name, rates in results.items():
+        print(f"{name:<16} throughput at largest / smallest input: {rates[-1] / rates[0]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
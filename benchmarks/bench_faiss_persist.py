@@ -0,0 +1,85 @@
+"""
+Cost of persisting a FAISS store after a small incremental add.
+
+Builds a store of --vectors random vectors with synthetic chunks in a temporary
+VECTORDB_ROOT and persists it, then repeatedly adds --delta more and persists again,
+reporting the seconds and the bytes written (wchar from /proc/self/io) of each persist.
+With segments, an incremental persist writes in proportion to the delta, not the store.
+
+Usage:
+    python benchmarks/bench_faiss_persist.py [--vectors 200000] [--dim 384] [--delta 100] [--rounds 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def bytes_written() -> int:
+    with open("/proc/self/io") as f:
+        return int(next(line for line in f if line.startswith("wchar:")).split()[1])
+
+
+class RandomEmbeddings:
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_query(self, text):
+        return np.random.default_rng(len(text)).random(self.dim, dtype=np.float32)
+
+
+def chunks(first: int, count: int):
+    return [
+        {"id": f"file{i // 100}.txt:{i}", "file": f"file{i // 100}.txt", "page": 0,
+         "line": f"{i}", "count": 150, "text": "lorem ipsum dolor sit amet " * 30}
+        for i in range(first, first + count)
+    ]
+
+
+def timed_persist(accessor):
+    written = bytes_written()
+    start = time.perf_counter()
+    accessor.persist_vector_store()
+    accessor.close()
+    return time.perf_counter() - start, bytes_written() - written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of an incremental FAISS persist")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--delta", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["VECTORDB_ROOT"] = root
+        os.environ.setdefault("FAISS_INDEX_TYPE", "flat")
+        from plat.vectordb.vectordb_faiss import PlatServedFaissDb
+
+        rng = np.random.default_rng(0)
+        accessor = PlatServedFaissDb("bench", None)
+        accessor.set_embedding_function(RandomEmbeddings(args.dim))
+        for first in range(0, args.vectors, 10000):
+            count = min(10000, args.vectors - first)
+            accessor.store_the_embedded_chunks(chunks(first, count), rng.random((count, args.dim), dtype=np.float32))
+        seconds, written = timed_persist(accessor)
+        print(f"{'persist':<28}{'seconds':>10}{'MB written':>12}")
+        print(f"{f'initial {args.vectors}':<28}{seconds:>10.3f}{written / 2**20:>12.2f}")
+
+        total = args.vectors
+        for _ in range(args.rounds):
+            accessor.store_the_embedded_chunks(chunks(total, args.delta), rng.random((args.delta, args.dim), dtype=np.float32))
+            total += args.delta
+            seconds, written = timed_persist(accessor)
+            print(f"{f'+{args.delta} (store {total})':<28}{seconds:>10.3f}{written / 2**20:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
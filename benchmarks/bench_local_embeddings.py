@@ -0,0 +1,57 @@
+"""
+Local embedding throughput: PyTorch against the ONNX and int8 ONNX backends.
+
+Embeds the same chunk-sized texts with each backend, reports chunks per second and
+the lowest cosine similarity to the PyTorch vectors. The ONNX exports are created on
+first use under LOCAL_EMBEDDING_ONNX_DIR. Needs sentence-transformers>=3.2 and
+optimum[onnxruntime].
+
+Usage:
+    python benchmarks/bench_local_embeddings.py [--model all-MiniLM-L6-v2] [--texts 1000] [--quantize avx2]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from plat.embedding.embeddings_huggingface import SentenceTransformerEmbeddings, parity_check  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embedding throughput by backend")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=config.LOCAL_EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--quantize", default="avx2", help="int8 target for the quantized run")
+    args = parser.parse_args()
+
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet, consectetur adipiscing elit " * (1 + i % 25)
+             for i in range(args.texts)]
+    variants = [
+        ("torch, batch 2", "torch", "", 2),
+        (f"torch, batch {args.batch_size}", "torch", "", args.batch_size),
+        (f"onnx, batch {args.batch_size}", "onnx", "", args.batch_size),
+        (f"onnx int8 ({args.quantize})", "onnx", args.quantize, args.batch_size),
+    ]
+
+    reference = None
+    print(f"{'backend':<28}{'seconds':>10}{'chunks/s':>12}{'min cosine':>12}")
+    for name, backend, quantize, batch_size in variants:
+        embeddings = SentenceTransformerEmbeddings(args.model, backend=backend, quantize=quantize, batch_size=batch_size)
+        embeddings.embed_documents(texts[:batch_size])  # warm up
+        start = time.perf_counter()
+        embeddings.embed_documents(texts)
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference = embeddings.embedder
+        cosine = parity_check(reference, embeddings.embedder, texts[:200])
+        label = name if embeddings.variant or backend == "torch" else f"{name} (fell back to torch)"
+        print(f"{label:<28}{seconds:>10.2f}{len(texts) / seconds:>12.1f}{cosine:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+OpenAI embedding throughput against the local stub endpoint.
+
+Embeds the same texts one request per text (the old behaviour) and with request
+packing, concurrency and rate-limit pacing, checks that every vector comes back in
+order, and reports requests, 429s and embeddings per second. Runs fully offline.
+
+Usage:
+    python benchmarks/bench_openai_embeddings.py [--texts 2000] [--latency 0.05] [--rpw 40] [--window 1]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config  # noqa: E402
+from plat.embedding.embeddings_openai import OpenAIEmbeddings  # noqa: E402
+from openai_stub import OpenAIStub, stub_embedding  # noqa: E402
+
+
+def _run(name: str, stub: OpenAIStub, texts, batch_size: int, concurrency: int):
+    config.OPENAI_EMBEDDING_BATCH_SIZE = batch_size
+    config.OPENAI_EMBEDDING_CONCURRENCY = concurrency
+    config.OPENAI_EMBEDDING_MAX_RETRIES = 20
+    embeddings = OpenAIEmbeddings(api_key="stub", model="stub-embedding", base_url=stub.base_url)
+
+    before = dict(stub.stats)
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    seconds = time.perf_counter() - start
+
+    assert len(vectors) == len(texts), "wrong number of vectors"
+    assert all(vector == stub_embedding(text) for vector, text in zip(vectors, texts)), "vectors out of order"
+    requests = stub.stats["requests"] - before["requests"]
+    throttled = stub.stats["throttled"] - before["throttled"]
+    print(f"{name:<24}{requests:>10}{throttled:>8}{seconds:>10.2f}{len(texts) / seconds:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI embedding throughput against a local stub")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub seconds per request")
+    parser.add_argument("--rpw", type=int, default=40, help="Stub requests per rate-limit window")
+    parser.add_argument("--window", type=float, default=1.0, help="Stub rate-limit window in seconds")
+    parser.add_argument("--sequential-texts", type=int, default=200,
+                        help="Texts for the one-request-per-text run, which is slow by design")
+    args = parser.parse_args()
+
+    packed_batch_size = config.OPENAI_EMBEDDING_BATCH_SIZE
+    texts = [f"chunk {i}: " + "lorem ipsum dolor sit amet " * (1 + i % 20) for i in range(args.texts)]
+    stub = OpenAIStub(requests_per_window=args.rpw, window=args.window, latency=args.latency).start()
+    try:
+        print(f"{'mode':<24}{'requests':>10}{'429s':>8}{'seconds':>10}{'texts/s':>12}")
+        _run("one text per request", stub, texts[:args.sequential_texts], batch_size=1, concurrency=1)
+        _run("packed", stub, texts, batch_size=packed_batch_size, concurrency=1)
+        _run("packed + concurrent", stub, texts, batch_size=64, concurrency=8)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Recall cost of embedding dimensionality reduction.
+
+Searches a corpus exactly at full dimension and after PCA or Matryoshka reduction to a
+few smaller dimensions, and reports recall@k against the full-dimension results, the
+index size and the search time. PCA is fitted on a sample of the corpus, as docIndex
+does. By default the corpus is synthetic, with the decaying spectrum of real sentence
+embeddings; --docs embeds the chunks under RAW_DOC_PATH with the configured provider
+instead (Matryoshka numbers are only meaningful for models trained for it).
+
+Usage:
+    python benchmarks/bench_reduction_recall.py [--vectors 20000] [--dim 768] [--k 10]
+    python benchmarks/bench_reduction_recall.py --docs [--max-chunks 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+from itertools import islice
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from plat.embedding.embedding_reduction import EmbeddingReducer  # noqa: E402
+
+
+def synthetic_corpus(count: int, dim: int, topics: int = 200, seed: int = 0) -> np.ndarray:
+    """Unit vectors clustered around topics, with variance decaying along the axes of a random rotation."""
+    rng = np.random.default_rng(seed)
+    scales = 1.0 / (1.0 + np.arange(dim) / 16.0)
+    rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    centers = rng.standard_normal((topics, dim)) * scales
+    points = centers[rng.integers(topics, size=count)] + 0.5 * rng.standard_normal((count, dim)) * scales
+    vectors = points @ rotation.T
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def document_corpus(max_chunks: int) -> np.ndarray:
+    """Embed up to max_chunks chunks of the documents under RAW_DOC_PATH."""
+    from utils import find_files_with_ext, iter_file_chunks, iter_batches
+    from plat.embedding.embedding_factory import EmbeddingFactory
+
+    accessor = EmbeddingFactory(
+        embedding_provider=config.EMBEDDING_PROVIDER, api_key=config.EMBEDDING_API_KEY
+    ).get_embedding_accessor(indexing=True)
+    texts = (
+        chunk["text"]
+        for file in find_files_with_ext(config.RAW_DOC_PATH, ".*", [".bak"])
+        for chunk in iter_file_chunks(file, config.MAX_CHUNK_SIZE, config.CHUNK_OVERLAP)
+    )
+    try:
+        batches = [
+            np.asarray(accessor.embed_documents(batch), dtype=np.float32)
+            for batch in iter_batches(islice(texts, max_chunks), config.INDEX_EMBED_BATCH_SIZE)
+        ]
+    finally:
+        if hasattr(accessor, "close"):
+            accessor.close()
+    return np.concatenate(batches)
+
+
+def search(corpus: np.ndarray, queries: np.ndarray, k: int):
+    """Exact L2 search; returns the neighbour ids and the best of three runs in seconds per query."""
+    index = faiss.IndexFlatL2(corpus.shape[1])
+    index.add(np.ascontiguousarray(corpus))
+    queries = np.ascontiguousarray(queries)
+    seconds = []
+    for _ in range(3):
+        start = time.perf_counter()
+        _, ids = index.search(queries, k)
+        seconds.append(time.perf_counter() - start)
+    return ids, min(seconds) / len(queries)
+
+
+def recall(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall cost of embedding dimensionality reduction")
+    parser.add_argument("--docs", action="store_true", help="embed the documents under RAW_DOC_PATH")
+    parser.add_argument("--max-chunks", type=int, default=20000)
+    parser.add_argument("--vectors", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768, help="synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=config.EMBEDDING_REDUCTION_SAMPLE)
+    args = parser.parse_args()
+
+    vectors = document_corpus(args.max_chunks) if args.docs else synthetic_corpus(args.vectors + args.queries, args.dim)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    dim = corpus.shape[1]
+    k = min(args.k, len(corpus))
+    print(f"{len(corpus)} vectors of dimension {dim}, {len(queries)} queries, recall@{k}")
+
+    expected, full_seconds = search(corpus, queries, k)
+    print(f"{'reduction':<22}{'dim':>6}{'index MB':>10}{'ms/query':>10}{'recall':>8}")
+    print(f"{'none':<22}{dim:>6}{corpus.nbytes / 2**20:>10.1f}{full_seconds * 1000:>10.3f}{1.0:>8.3f}")
+
+    sample = corpus[np.random.default_rng(1).permutation(len(corpus))[:args.sample]]
+    for output_dim in sorted({dim // 4, dim // 3, dim // 2, 3 * dim // 4}):
+        reducers = [EmbeddingReducer("matryoshka", dim, output_dim)]
+        if len(sample) >= output_dim:
+            reducers.insert(0, EmbeddingReducer.fit_pca(sample, output_dim))
+        for reducer in reducers:
+            reduced = reducer.transform(corpus)
+            actual, seconds = search(reduced, reducer.transform(queries), k)
+            name = reducer.method
+            if reducer.method == "pca":
+                name += f" ({reducer.info['explained_variance']:.0%} var)"
+            print(f"{name:<22}{output_dim:>6}{reduced.nbytes / 2**20:>10.1f}{seconds * 1000:>10.3f}"
+                  f"{recall(expected, actual):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Local stub of the OpenAI embeddings endpoint, for offline testing and benchmarks.
+
+Serves POST /v1/embeddings with deterministic vectors (a hash of each input), the
+x-ratelimit-* headers of the real API, and 429 responses with retry-after-ms once the
+per-window request or token limit is used up.
+
+Usage:
+    python benchmarks/openai_stub.py [--port 8089] [--rpm 500] [--tpm 1000000] [--latency 0.05]
+
+then point OPENAI_EMBEDDING_BASE_URL at http://127.0.0.1:8089/v1.
+"""
+
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DIMENSION = 16
+
+
+def stub_embedding(text: str, dimension: int = DIMENSION):
+    """The vector the stub returns for a text, for checking results."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [digest[i % len(digest)] / 255.0 for i in range(dimension)]
+
+
+class OpenAIStub:
+    """
+    Embeddings endpoint with a fixed rate-limit window.
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        requests_per_window: Requests allowed per window
+        tokens_per_window: Tokens (characters / 4) allowed per window
+        window: Window length in seconds
+        latency: Seconds each request takes
+    """
+
+    def __init__(self, port: int = 0, requests_per_window: int = 500, tokens_per_window: int = 1_000_000,
+                 window: float = 1.0, latency: float = 0.05):
+        self.requests_per_window = requests_per_window
+        self.tokens_per_window = tokens_per_window
+        self.window = window
+        self.latency = latency
+        self.stats = {"requests": 0, "inputs": 0, "throttled": 0, "max_in_flight": 0}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._used_requests = 0
+        self._used_tokens = 0
+        self._in_flight = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _admit(self, tokens: int):
+        """Count a request against the window; return (admitted, headers)."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._window_start, self._used_requests, self._used_tokens = now, 0, 0
+            reset = max(0.0, self.window - (now - self._window_start))
+            admitted = (self._used_requests < self.requests_per_window
+                        and self._used_tokens + tokens <= self.tokens_per_window)
+            if admitted:
+                self._used_requests += 1
+                self._used_tokens += tokens
+                self.stats["requests"] += 1
+            else:
+                self.stats["throttled"] += 1
+            headers = {
+                "x-ratelimit-limit-requests": str(self.requests_per_window),
+                "x-ratelimit-limit-tokens": str(self.tokens_per_window),
+                "x-ratelimit-remaining-requests": str(self.requests_per_window - self._used_requests),
+                "x-ratelimit-remaining-tokens": str(self.tokens_per_window - self._used_tokens),
+                "x-ratelimit-reset-requests": f"{reset * 1000:.0f}ms",
+                "x-ratelimit-reset-tokens": f"{reset * 1000:.0f}ms",
+            }
+            if not admitted:
+                headers["retry-after-ms"] = f"{reset * 1000:.0f}"
+            return admitted, headers
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.endswith("/embeddings"):
+                    self._send(404, {"error": {"message": "not found"}}, {})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                inputs = request["input"]
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                tokens = sum(len(text) // 4 + 1 for text in inputs)
+
+                admitted, headers = stub._admit(tokens)
+                if not admitted:
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, headers)
+                    return
+
+                with stub._lock:
+                    stub._in_flight += 1
+                    stub.stats["max_in_flight"] = max(stub.stats["max_in_flight"], stub._in_flight)
+                    stub.stats["inputs"] += len(inputs)
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub._in_flight -= 1
+
+                self._send(200, {
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": stub_embedding(text)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "model": request["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                }, headers)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub of the OpenAI embeddings endpoint")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rpm", type=int, default=500, help="Requests per window")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="Tokens per window")
+    parser.add_argument("--window", type=float, default=60.0, help="Window length in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request")
+    args = parser.parse_args()
+
+    stub = OpenAIStub(args.port, args.rpm, args.tpm, args.window, args.latency)
+    print(f"OpenAI embeddings stub listening on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
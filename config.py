@@ -21,7 +21,10 @@ class Config:
 
     # Embedding configuration
     EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "plat")
-    EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "mahonzhan/all-MiniLM-L6-v2")
+    EMBEDDING_MODEL_NAME: str = os.getenv(
+        "EMBEDDING_MODEL_NAME",
+        "text-embedding-3-small" if EMBEDDING_PROVIDER == "openai" else "mahonzhan/all-MiniLM-L6-v2",
+    )
     EMBEDDING_API_URL: str = os.getenv("EMBEDDING_API_URL", "http://localhost:11434")
     EMBEDDING_API_KEY: Optional[str] = os.getenv("EMBEDDING_API_KEY")
 
@@ -52,6 +55,50 @@ class Config:
     # Chunking configuration
     MAX_CHUNK_SIZE: int = int(os.getenv("MAX_CHUNK_SIZE", "500"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "50"))
+    PDF_EXTRACT_PAGES_PER_TASK: int = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "50"))  # PDFs with more pages are chunked in parallel
+
+    # Extracted-text cache, shared by every store (0 MB = off)
+    TEXT_CACHE_DIR: str = os.getenv("TEXT_CACHE_DIR", os.path.join(VECTORDB_ROOT, "text_cache"))
+    TEXT_CACHE_MAX_MB: int = int(os.getenv("TEXT_CACHE_MAX_MB", "1024"))
+
+    # Embedding cache, shared by every store and vector backend (0 MB = off)
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(VECTORDB_ROOT, "embedding_cache"))
+    EMBEDDING_CACHE_MAX_MB: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048"))
+
+    # Query embedding cache for the web app (0 entries = off; empty db = in-process only)
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # query vectors kept per process
+    QUERY_CACHE_TTL_SECONDS: int = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400"))  # 0 = never expire
+    QUERY_CACHE_DB: str = os.getenv("QUERY_CACHE_DB", "")  # SQLite file shared by processes, e.g. .vdb/query_cache.sqlite3
+    QUERY_CACHE_DB_MAX_ENTRIES: int = int(os.getenv("QUERY_CACHE_DB_MAX_ENTRIES", "100000"))
+
+    # Dimensionality reduction of the vectors in a new store
+    EMBEDDING_REDUCTION: str = os.getenv("EMBEDDING_REDUCTION", "none")  # none | pca | matryoshka
+    EMBEDDING_REDUCTION_DIM: int = int(os.getenv("EMBEDDING_REDUCTION_DIM", "0"))  # reduced dimension (0 = half the model's)
+    EMBEDDING_REDUCTION_SAMPLE: int = int(os.getenv("EMBEDDING_REDUCTION_SAMPLE", "4096"))  # chunks embedded to fit pca
+
+    # Indexing pipeline configuration
+    INDEX_CHUNK_WORKERS: int = int(os.getenv("INDEX_CHUNK_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+    INDEX_EMBED_WORKERS: int = int(os.getenv("INDEX_EMBED_WORKERS", "2"))
+    INDEX_EMBED_BATCH_SIZE: int = int(os.getenv("INDEX_EMBED_BATCH_SIZE", "64"))
+    INDEX_EMBED_ASYNC: bool = os.getenv("INDEX_EMBED_ASYNC", "false").lower() in ("true", "1", "yes", "on")  # embed on an event loop
+    INDEX_EMBED_CONCURRENCY: int = int(os.getenv("INDEX_EMBED_CONCURRENCY", "64"))  # batches in flight when async
+    INDEX_CHUNK_QUEUE_DEPTH: int = int(os.getenv("INDEX_CHUNK_QUEUE_DEPTH", "32"))  # files' worth of chunks in flight
+    INDEX_WRITE_QUEUE_DEPTH: int = int(os.getenv("INDEX_WRITE_QUEUE_DEPTH", "8"))  # embedded batches waiting for the writer
+    INDEX_CHECKPOINT_CHUNKS: int = int(os.getenv("INDEX_CHECKPOINT_CHUNKS", "10000"))  # persist every N stored chunks (0 = off)
+    INDEX_CHECKPOINT_SECONDS: int = int(os.getenv("INDEX_CHECKPOINT_SECONDS", "300"))  # ... or every T seconds (0 = off)
+
+    # FAISS index family of new stores (flat | ivf | hnsw | ivfpq) and its parameters
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat")
+    FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", "1024"))  # ivf cells, ~4 * sqrt(chunks)
+    FAISS_TRAIN_SIZE: int = int(os.getenv("FAISS_TRAIN_SIZE", "0"))  # vectors buffered to train ivf (0 = 40 per cell)
+    FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))  # hnsw links per node
+    FAISS_HNSW_EF_CONSTRUCTION: int = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "0"))  # ivfpq codes per vector (0 = dim / 8)
+    FAISS_PQ_BITS: int = int(os.getenv("FAISS_PQ_BITS", "8"))
+    FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "0"))  # ivf cells scanned per query (0 = the store's)
+    FAISS_EF_SEARCH: int = int(os.getenv("FAISS_EF_SEARCH", "0"))  # hnsw candidates per query (0 = the store's)
+    FAISS_MAX_SEGMENTS: int = int(os.getenv("FAISS_MAX_SEGMENTS", "8"))  # merge segments beyond this in the background (0 = never)
+    FAISS_MAX_DELETED_RATIO: float = float(os.getenv("FAISS_MAX_DELETED_RATIO", "0.2"))  # rewrite a segment (or the chunk store) without its deleted vectors (rows) beyond this share
 
     # Reranking configuration
     RERANK_METHOD: str = os.getenv("RERANK_METHOD", "cross_encoder")
@@ -62,6 +109,37 @@ class Config:
     # API timeouts (in seconds)
     OLLAMA_LLM_TIMEOUT: int = int(os.getenv("OLLAMA_LLM_TIMEOUT", "300"))  # 5 minutes for LLM calls
     OLLAMA_EMBEDDING_TIMEOUT: int = int(os.getenv("OLLAMA_EMBEDDING_TIMEOUT", "120"))  # 2 minutes for embeddings
+    PLAT_LLM_TIMEOUT: int = int(os.getenv("PLAT_LLM_TIMEOUT", "300"))  # plat served model calls
+    PLAT_EMBEDDING_TIMEOUT: int = int(os.getenv("PLAT_EMBEDDING_TIMEOUT", "120"))  # plat served embedding calls
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))  # seconds to open a connection
+
+    # Shared HTTP connection pool for the plat and ollama clients
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # keep-alive connections per host
+    HTTP_ASYNC_MAX_CONNECTIONS: int = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "256"))  # shared by all async calls
+
+    # OpenAI embedding batching and rate limiting
+    OPENAI_EMBEDDING_BASE_URL: Optional[str] = os.getenv("OPENAI_EMBEDDING_BASE_URL") or None  # e.g. a gateway or local stub
+    OPENAI_EMBEDDING_BATCH_SIZE: int = int(os.getenv("OPENAI_EMBEDDING_BATCH_SIZE", "512"))  # inputs per request
+    OPENAI_EMBEDDING_MAX_TOKENS: int = int(os.getenv("OPENAI_EMBEDDING_MAX_TOKENS", "100000"))  # estimated tokens per request
+    OPENAI_EMBEDDING_CONCURRENCY: int = int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "4"))  # requests in flight
+    OPENAI_EMBEDDING_MAX_RETRIES: int = int(os.getenv("OPENAI_EMBEDDING_MAX_RETRIES", "6"))  # on 429s and transient errors
+
+    # Ollama embedding batching
+    OLLAMA_EMBEDDING_BATCH_SIZE: int = int(os.getenv("OLLAMA_EMBEDDING_BATCH_SIZE", "64"))  # texts per /api/embed request
+    OLLAMA_EMBEDDING_CONCURRENCY: int = int(os.getenv("OLLAMA_EMBEDDING_CONCURRENCY", "4"))  # requests in flight
+
+    # Local (SentenceTransformer) embedding backend
+    LOCAL_EMBEDDING_BACKEND: str = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")  # torch | onnx
+    LOCAL_EMBEDDING_QUANTIZE: str = os.getenv("LOCAL_EMBEDDING_QUANTIZE", "")  # int8 target for onnx: avx2, avx512, avx512_vnni, arm64
+    LOCAL_EMBEDDING_BATCH_SIZE: int = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))  # texts per forward pass
+    LOCAL_EMBEDDING_ONNX_DIR: str = os.getenv("LOCAL_EMBEDDING_ONNX_DIR", os.path.join(VECTORDB_ROOT, "onnx_models"))
+    LOCAL_EMBEDDING_PARITY_MIN_COSINE: float = float(os.getenv("LOCAL_EMBEDDING_PARITY_MIN_COSINE", "0.99"))  # vs pytorch
+    LOCAL_EMBEDDING_WORKERS: int = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "1"))  # processes for index builds (1 = in-process)
+    LOCAL_EMBEDDING_THREADS: int = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0"))  # intra-op threads per worker (0 = cores / workers)
+
+    # Bedrock embedding concurrency
+    BEDROCK_EMBEDDING_CONCURRENCY: int = int(os.getenv("BEDROCK_EMBEDDING_CONCURRENCY", "8"))  # invoke_model calls in flight
+    BEDROCK_EMBEDDING_MAX_RETRIES: int = int(os.getenv("BEDROCK_EMBEDDING_MAX_RETRIES", "8"))  # per text, on throttling
 
     @classmethod
     def validate_providers(cls) -> None:
@@ -0,0 +1,236 @@
+"""
+Pick the FAISS index configuration of a store from measurements on its own vectors.
+
+Samples held-out query vectors from the store's index, computes their exact
+nearest neighbours with a flat index over the remaining vectors, then builds each
+candidate configuration (ivf and ivfpq with a few nlist and code sizes, hnsw with a few
+M) and sweeps its query-time knob (nprobe, efSearch). Every point is reported with its
+recall@k against the exact neighbours, p50/p99 single-query latency, index size and
+build time, and the report is saved as autotune_report.json in the store.
+
+The fastest point reaching --target-recall (and fitting in --max-memory-mb) is then
+written into the store's index_config.json. If it only changes nprobe or efSearch the
+store is left as is; otherwise the index is rebuilt from the stored vectors, as
+indexer.faiss_rebuild does. Nothing is re-embedded. Use --dry-run to only report.
+
+Usage:
+    python -m indexer.faiss_autotune [--target-recall 0.95] [--k 10] [--queries 500] [--dry-run]
+"""
+
+import os
+import json
+import math
+import time
+import argparse
+import numpy as np
+import faiss
+from indexer.store_lock import StoreLock
+from plat.vectordb.faiss_index import (
+    INDEX_CONFIG_FILE, INDEX_TYPES, DEFAULT_NPROBE, DEFAULT_EF_SEARCH,
+    create_index, train_index, train_size, search_parameters, write_index_config,
+)
+from plat.vectordb.vectordb_factory import VectorDbFactory
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+REPORT_FILE = "autotune_report.json"
+NPROBE_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256, 512)
+# build parameters that need a rebuild when they change
+_STRUCTURE_KEYS = {
+    "flat": (),
+    "ivf": ("nlist",),
+    "hnsw": ("hnsw_m", "ef_construction"),
+    "ivfpq": ("nlist", "pq_m", "pq_bits"),
+}
+_KNOB_KEYS = {"flat": (), "ivf": ("nprobe",), "hnsw": ("ef_search",), "ivfpq": ("nprobe",)}
+
+
+def candidate_configs(count: int, dim: int, types=INDEX_TYPES):
+    """Index configurations worth trying for count vectors of dimension dim."""
+    base = {
+        "nlist": 0, "hnsw_m": 32, "ef_construction": 200, "pq_m": 0, "pq_bits": 8,
+        "nprobe": DEFAULT_NPROBE, "ef_search": DEFAULT_EF_SEARCH,
+    }
+    root = math.sqrt(count)
+    # ivf needs ~40 training vectors per cell
+    nlists = sorted({max(1, min(int(n), count // 40)) for n in (root, 4 * root, 16 * root)})
+    candidates = []
+    if "flat" in types:
+        candidates.append({**base, "type": "flat"})
+    if "ivf" in types:
+        candidates += [{**base, "type": "ivf", "nlist": nlist} for nlist in nlists]
+    if "hnsw" in types:
+        candidates += [{**base, "type": "hnsw", "hnsw_m": m} for m in (16, 32, 48)]
+    if "ivfpq" in types and count >= 1024:
+        nlist = nlists[len(nlists) // 2] if nlists else 1
+        candidates += [
+            {**base, "type": "ivfpq", "nlist": nlist, "pq_m": pq_m}
+            for pq_m in sorted({max(1, dim // 16), max(1, dim // 8), max(1, dim // 4)})
+            if dim % pq_m == 0
+        ]
+    return candidates
+
+
+def _sweep(index_config: dict, index):
+    """The query-time settings to try for a built index."""
+    if index_config["type"] in ("ivf", "ivfpq"):
+        return [{"nprobe": n} for n in NPROBE_SWEEP if n <= index.nlist]
+    if index_config["type"] == "hnsw":
+        return [{"ef_search": ef} for ef in EF_SEARCH_SWEEP]
+    return [{}]
+
+
+def _recall(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def _time_queries(index, index_config: dict, queries: np.ndarray, k: int, knobs: dict):
+    """Search the queries one at a time, as the web app does; returns ids and latencies in ms."""
+    params = search_parameters(index, {**index_config, **knobs}, knobs.get("nprobe"), knobs.get("ef_search"))
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), k, params=params)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        ids[i] = found[0]
+    return ids, latencies
+
+
+def autotune(vectors: np.ndarray, queries: int = 500, k: int = 10, types=INDEX_TYPES, seed: int = 0):
+    """
+    Measure every candidate configuration on the vectors.
+
+    Returns:
+        List of result dicts (config, recall, p50_ms, p99_ms, memory_mb, build_seconds)
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    held_out = np.ascontiguousarray(vectors[order[:queries]])
+    corpus = np.ascontiguousarray(vectors[np.sort(order[queries:])])
+    k = min(k, len(corpus))
+
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, expected = exact.search(held_out, k)
+
+    results = []
+    for candidate in candidate_configs(len(corpus), corpus.shape[1], types):
+        start = time.perf_counter()
+        if candidate["type"] in ("ivf", "ivfpq"):
+            wanted = np.unique(np.linspace(0, len(corpus) - 1, train_size(candidate)).astype(np.int64))
+            index, candidate = train_index(candidate, corpus.shape[1], corpus[wanted])
+        else:
+            index = create_index(candidate, corpus.shape[1])
+        # ids are the corpus positions, as in the exact search
+        index.add_with_ids(corpus, np.arange(len(corpus), dtype=np.int64))
+        build_seconds = time.perf_counter() - start
+        memory_mb = faiss.serialize_index(index).size / 2**20
+
+        for knobs in _sweep(candidate, index):
+            ids, latencies = _time_queries(index, candidate, held_out, k, knobs)
+            result = {
+                "config": {**candidate, **knobs},
+                "recall": round(_recall(expected, ids), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                "memory_mb": round(memory_mb, 1),
+                "build_seconds": round(build_seconds, 2),
+            }
+            results.append(result)
+            logger.info(f"{describe(result['config'])}: recall {result['recall']}, p50 {result['p50_ms']} ms")
+        del index
+    return results
+
+
+def choose(results, target_recall: float, max_memory_mb: float = 0):
+    """The lowest-latency result reaching the target recall within the memory budget, or None."""
+    eligible = [
+        r for r in results
+        if r["recall"] >= target_recall and (max_memory_mb <= 0 or r["memory_mb"] <= max_memory_mb)
+    ]
+    return min(eligible, key=lambda r: (r["p50_ms"], r["p99_ms"], r["memory_mb"]), default=None)
+
+
+def describe(index_config: dict) -> str:
+    keys = _STRUCTURE_KEYS[index_config["type"]] + _KNOB_KEYS[index_config["type"]]
+    return index_config["type"] + "".join(f" {key}={index_config[key]}" for key in keys)
+
+
+def _print_report(results, best):
+    print(f"{'configuration':<52}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}{'MB':>9}{'build s':>9}")
+    for r in results:
+        mark = " *" if r is best else ""
+        print(f"{describe(r['config']):<52}{r['recall']:>8.4f}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+              f"{r['memory_mb']:>9.1f}{r['build_seconds']:>9.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the FAISS store's index on its own vectors")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="held-out query vectors")
+    parser.add_argument("--max-vectors", type=int, default=0, help="tune on a random subset (0 = all)")
+    parser.add_argument("--max-memory-mb", type=float, default=0, help="memory budget for the index (0 = none)")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--dry-run", action="store_true", help="report only, leave the store unchanged")
+    args = parser.parse_args()
+
+    if config.VECTORDB_TYPE != "faiss":
+        raise SystemExit(f"VECTORDB_TYPE is {config.VECTORDB_TYPE}, not faiss")
+    vectordb_model = VectorDbFactory(
+        vectordb_provider=config.VECTORDB_PROVIDER,
+        db_type=config.VECTORDB_TYPE,
+        api_key=config.VECTORDB_API_KEY,
+    )
+    store_dir = vectordb_model.get_store_dir()
+    with StoreLock(store_dir):
+        vectordb_accessor = vectordb_model.get_vectordb_accessor()
+        if vectordb_accessor.index is None or vectordb_accessor.index.ntotal <= args.queries:
+            raise SystemExit(f"Not enough vectors in {store_dir} to tune on")
+        current = vectordb_accessor.index_config
+        if current["type"] == "ivfpq":
+            logger.warning("The store holds an ivfpq index: tuning on its approximate vectors")
+
+        vectors = np.concatenate([batch for _, batch in vectordb_accessor.index.reconstruct_all()])
+        if 0 < args.max_vectors < len(vectors):
+            vectors = vectors[np.random.default_rng(1).choice(len(vectors), args.max_vectors, replace=False)]
+        logger.info(f"Tuning on {len(vectors)} vectors of dimension {vectors.shape[1]}")
+        results = autotune(vectors, args.queries, args.k, args.types)
+        best = choose(results, args.target_recall, args.max_memory_mb)
+        _print_report(results, best)
+
+        with open(os.path.join(store_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "vectors": len(vectors), "k": args.k, "target_recall": args.target_recall,
+                "best": best, "results": results,
+            }, f, indent=2)
+
+        if best is None:
+            print(f"No configuration reaches recall {args.target_recall}; the store is unchanged")
+            return
+        chosen = {**current, **best["config"]}
+        print(f"Best: {describe(chosen)}")
+        if args.dry_run:
+            return
+
+        same_structure = current["type"] == chosen["type"] and all(
+            current.get(key) == chosen[key] for key in _STRUCTURE_KEYS[chosen["type"]]
+        )
+        if same_structure:
+            # only the query-time knobs change; the index file stays as it is
+            path = os.path.join(store_dir, INDEX_CONFIG_FILE)
+            write_index_config(path + ".tmp", chosen)
+            os.replace(path + ".tmp", path)
+        else:
+            vectordb_accessor.rebuild_index(chosen)
+            vectordb_accessor.persist_vector_store()
+            vectordb_accessor.close()
+        logger.info(f"Wrote {describe(chosen)} to {store_dir}" + ("" if same_structure else ", index rebuilt"))
+
+
+if __name__ == "__main__":
+    main()
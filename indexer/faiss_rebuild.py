@@ -0,0 +1,78 @@
+"""
+Rebuild a FAISS store's index as another type, reusing the vectors it already holds.
+
+The index type of a store is fixed when it is created; this converts an existing store
+(e.g. a flat one that has grown too large to scan) to ivf, hnsw or ivfpq, or changes
+the parameters of its current type, without re-embedding a single chunk. Options not
+given are taken from the FAISS_* settings. Chunk positions are kept, so the metadata
+and the manifest stay valid, and the store ends up as a single segment. The web app picks the new index up after its next build
+or restart.
+
+Usage:
+    python -m indexer.faiss_rebuild --type ivf --nlist 4096 --nprobe 32
+    python -m indexer.faiss_rebuild --type hnsw --hnsw-m 32 --ef-search 128
+"""
+
+import time
+import argparse
+from indexer.store_lock import StoreLock
+from plat.vectordb.faiss_index import INDEX_TYPES, index_config_from_settings
+from plat.vectordb.vectordb_factory import VectorDbFactory
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def rebuild_faiss_index(index_config: dict):
+    """Convert the configured FAISS store to the given index configuration and persist it."""
+    if config.VECTORDB_TYPE != "faiss":
+        raise ValueError(f"VECTORDB_TYPE is {config.VECTORDB_TYPE}, not faiss")
+    vectordb_model = VectorDbFactory(
+        vectordb_provider=config.VECTORDB_PROVIDER,
+        db_type=config.VECTORDB_TYPE,
+        api_key=config.VECTORDB_API_KEY,
+    )
+    with StoreLock(vectordb_model.get_store_dir()):
+        vectordb_accessor = vectordb_model.get_vectordb_accessor()
+        if vectordb_accessor.index is None:
+            raise ValueError(f"No FAISS index in {vectordb_model.get_store_dir()}")
+        previous = vectordb_accessor.index_config["type"]
+        start = time.perf_counter()
+        vectordb_accessor.rebuild_index(index_config)
+        vectordb_accessor.persist_vector_store()
+        vectordb_accessor.close()
+        logger.info(
+            f"Rebuilt {vectordb_accessor.index.ntotal} vectors from {previous} to "
+            f"{vectordb_accessor.index_config} in {time.perf_counter() - start:.1f}s"
+        )
+        return vectordb_accessor.index_config
+
+
+def main():
+    defaults = index_config_from_settings()
+    parser = argparse.ArgumentParser(description="Rebuild the FAISS store's index as another type")
+    parser.add_argument("--type", choices=INDEX_TYPES, default=defaults["type"])
+    parser.add_argument("--nlist", type=int, default=defaults["nlist"], help="IVF cells")
+    parser.add_argument("--nprobe", type=int, default=defaults["nprobe"], help="IVF cells scanned per query")
+    parser.add_argument("--hnsw-m", type=int, default=defaults["hnsw_m"], help="HNSW links per node")
+    parser.add_argument("--ef-construction", type=int, default=defaults["ef_construction"])
+    parser.add_argument("--ef-search", type=int, default=defaults["ef_search"], help="HNSW candidates per query")
+    parser.add_argument("--pq-m", type=int, default=defaults["pq_m"], help="PQ codes per vector (0 = dim / 8)")
+    parser.add_argument("--pq-bits", type=int, default=defaults["pq_bits"])
+    args = parser.parse_args()
+
+    rebuild_faiss_index({
+        "type": args.type,
+        "nlist": args.nlist,
+        "hnsw_m": args.hnsw_m,
+        "ef_construction": args.ef_construction,
+        "pq_m": args.pq_m,
+        "pq_bits": args.pq_bits,
+        "nprobe": args.nprobe,
+        "ef_search": args.ef_search,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Background index jobs for the web app.
+
+An index build can take hours on a large corpus, far longer than a proxy will keep an
+HTTP request open. IndexJobManager runs each build on a background thread and keeps a
+record of it: phase, files/chunks/vectors done, throughput, ETA and, when it fails, the
+error. Finished jobs are kept in a small JSON history under VECTORDB_ROOT so failed builds
+can still be inspected after a restart.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from indexer.index_pipeline import IndexCancelled
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+HISTORY_FILE = "index_jobs.json"
+HISTORY_SIZE = 50
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class IndexJobConflict(Exception):
+    """Raised when a build is requested for a store that already has one running."""
+
+    def __init__(self, job):
+        super().__init__(f"Index job {job.job_id} is already running for {job.store}")
+        self.job = job
+
+
+class IndexJob:
+    """State of one index build."""
+
+    def __init__(self, store: str):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.store = store
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}  # filled in place by docIndex and the index pipeline
+        self.cancel_event = threading.Event()
+
+    def to_dict(self) -> dict:
+        """Snapshot of the job for the status endpoint, with throughput and ETA."""
+        progress = dict(self.progress)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+
+        files_total = progress.get("files_total", 0)
+        files_done = progress.get("files_done", 0) + progress.get("files_failed", 0)
+        chunks_done = progress.get("chunks_done", 0)
+
+        eta = None
+        if self.status == RUNNING and elapsed > 0 and 0 < files_done < files_total:
+            eta = round((files_total - files_done) * elapsed / files_done, 1)
+
+        return {
+            "job_id": self.job_id,
+            "store": self.store,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 1),
+            "progress": progress,
+            "chunks_per_second": round(chunks_done / elapsed, 2) if elapsed > 0 else 0.0,
+            "files_per_second": round(files_done / elapsed, 3) if elapsed > 0 else 0.0,
+            "eta_seconds": eta,
+        }
+
+
+class IndexJobManager:
+    """
+    Runs index builds on background threads, one at a time per store.
+
+    Args:
+        build: Callable taking (progress, cancel_event) that performs the build, e.g. docIndex
+        on_store_updated: Optional callable run after a build that committed to the store, e.g.
+            to reload the query store; cancelled and failed builds that reached the persist
+            phase count, as they keep the files already stored
+    """
+
+    def __init__(self, build, on_store_updated=None, history_dir: str = None):
+        self.build = build
+        self.on_store_updated = on_store_updated
+        self.history_path = os.path.join(history_dir or config.VECTORDB_ROOT, HISTORY_FILE)
+        self.jobs = {}
+        self._active = {}  # store -> running IndexJob
+        self._lock = threading.Lock()
+        self._load_history()
+
+    def submit(self, store: str) -> IndexJob:
+        """Start a build for a store. Raises IndexJobConflict if one is already running."""
+        with self._lock:
+            active = self._active.get(store)
+            if active is not None:
+                raise IndexJobConflict(active)
+            job = IndexJob(store)
+            self.jobs[job.job_id] = job
+            self._active[store] = job
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"index-job-{job.job_id}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str):
+        """Return a job by id, or None."""
+        return self.jobs.get(job_id)
+
+    def list(self):
+        """Return every known job, newest first."""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop. Returns False if it has already finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _run(self, job: IndexJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        logger.info(f"Index job {job.job_id} started for {job.store}")
+        try:
+            self.build(progress=job.progress, cancel_event=job.cancel_event)
+            job.status = CANCELLED if job.cancel_event.is_set() else SUCCEEDED
+        except IndexCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            logger.error(f"Index job {job.job_id} failed: {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"Index job {job.job_id} finished: {job.status}")
+
+        committed = job.status == SUCCEEDED or job.progress.get("phase") in ("persisting", "done")
+        try:
+            if committed and self.on_store_updated is not None:
+                self.on_store_updated()
+        except Exception as e:
+            logger.error(f"Post-build hook of index job {job.job_id} failed: {e}")
+        finally:
+            # the store stays busy until the hook is done, so the next build cannot overlap it
+            with self._lock:
+                self._active.pop(job.store, None)
+        self._save_history()
+
+    def _load_history(self):
+        """Load finished jobs recorded by earlier runs of the app."""
+        if not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load index job history {self.history_path}: {e}")
+            return
+        for record in records:
+            job = IndexJob(record["store"])
+            job.job_id = record["job_id"]
+            job.status = record["status"]
+            job.error = record.get("error")
+            job.created_at = record.get("created_at")
+            job.started_at = record.get("started_at")
+            job.finished_at = record.get("finished_at")
+            job.progress = record.get("progress", {})
+            self.jobs[job.job_id] = job
+
+    def _save_history(self):
+        """Write the most recent finished jobs to disk and forget the older ones."""
+        with self._lock:
+            finished = [job for job in self.jobs.values() if job.status in FINISHED_STATES]
+            finished.sort(key=lambda job: job.created_at, reverse=True)
+            records = [job.to_dict() for job in finished[:HISTORY_SIZE]]
+            for job in finished[HISTORY_SIZE:]:
+                del self.jobs[job.job_id]
+        try:
+            os.makedirs(os.path.dirname(self.history_path) or ".", exist_ok=True)
+            tmp_path = self.history_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, indent=2)
+            os.replace(tmp_path, self.history_path)
+        except Exception as e:
+            logger.warning(f"Could not save index job history {self.history_path}: {e}")
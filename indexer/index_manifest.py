@@ -0,0 +1,161 @@
+"""
+Index manifest for incremental re-indexing.
+
+The manifest lives next to the vector store under VECTORDB_ROOT and records, for every
+indexed file, its size, mtime, content hash and the ids of the chunks stored for it.
+Comparing it with the files on disk tells docIndex which files were added, changed or
+removed since the last build, so only those are re-chunked, re-embedded or dropped.
+
+Builds checkpoint the manifest as they go: files still in flight are recorded as partial
+entries, and a flag marks the build as in progress until it ends cleanly. A later build
+uses both to resume an interrupted one without re-embedding the chunks already stored.
+"""
+
+import os
+import json
+from utils.file_hash import hash_file
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def describe_file(file: str) -> dict:
+    """Return the size, mtime and content hash recorded for a file in the manifest."""
+    stat = os.stat(file)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": hash_file(file),
+    }
+
+
+class IndexManifest:
+    """
+    Persistent record of the files indexed in one vector store.
+
+    Entries are keyed by file path (as stored in the chunk "file" field) and hold the
+    file's size, mtime_ns, content hash and chunk_ids; "complete" is False for files whose
+    chunks were only partly stored when the manifest was checkpointed.
+    """
+
+    def __init__(self, store_dir: str):
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = os.path.join(store_dir, MANIFEST_FILE)
+        self.files = {}
+        self.build_in_progress = False
+        self.exists = False
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        """Load the manifest from disk if it exists."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.build_in_progress = data.get("build_in_progress", False)
+            self.exists = True
+        except Exception as e:
+            print(f"Warning: Could not load index manifest {self.path}: {e}")
+            self.files = {}
+
+    def save(self):
+        """Write the manifest atomically: a crash mid-write leaves the previous copy intact."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "build_in_progress": self.build_in_progress,
+                "files": self.files,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.exists = True
+        self.dirty = False
+
+    def begin_build(self):
+        """Mark a build as started and save, so a crash is detected by the next build."""
+        self.build_in_progress = True
+        self.save()
+
+    def end_build(self):
+        """Mark the build as cleanly finished; saved with the next save()."""
+        self.build_in_progress = False
+        self.dirty = True
+
+    def diff(self, files_found):
+        """
+        Compare the manifest with the files currently on disk.
+
+        Files whose size and mtime are unchanged are trusted without reading them; the
+        others are hashed, and only a different content hash counts as a change.
+
+        Returns:
+            Tuple of (added, changed, removed, resumed) file path lists, where resumed
+            files have a partial entry and unchanged content
+        """
+        added, changed, resumed = [], [], []
+        for file in files_found:
+            entry = self.files.get(file)
+            if entry is None:
+                added.append(file)
+                continue
+            try:
+                stat = os.stat(file)
+                if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+                    continue
+                content_hash = hash_file(file)
+            except OSError:
+                # vanished or unreadable since it was found; let the indexer report it
+                changed.append(file)
+                continue
+            if content_hash == entry["hash"]:
+                # touched but not modified: remember the new stat to skip hashing next time
+                entry["size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                self.dirty = True
+            else:
+                changed.append(file)
+
+        # partial files are indexed again either way: from scratch if changed, else resumed
+        changed_set = set(changed)
+        for file in files_found:
+            if file in self.files and not self.is_complete(file) and file not in changed_set:
+                resumed.append(file)
+
+        found = set(files_found)
+        removed = [file for file in self.files if file not in found]
+        return added, changed, removed, resumed
+
+    def record(self, file: str, info: dict, chunk_ids):
+        """Record a fully indexed file with its describe_file() info and chunk ids."""
+        self.files[file] = {
+            "size": info["size"],
+            "mtime_ns": info["mtime_ns"],
+            "hash": info["hash"],
+            "chunk_ids": list(chunk_ids),
+        }
+        self.dirty = True
+
+    def record_partial(self, file: str, info: dict, chunk_ids):
+        """Record a file whose chunks are only partly stored, to resume it after a crash."""
+        self.record(file, info, chunk_ids)
+        self.files[file]["complete"] = False
+
+    def forget(self, file: str):
+        """Drop a file from the manifest."""
+        if self.files.pop(file, None) is not None:
+            self.dirty = True
+
+    def is_complete(self, file: str) -> bool:
+        """Return False for a file recorded as partial by a checkpoint."""
+        entry = self.files.get(file)
+        return entry is None or entry.get("complete", True)
+
+    def chunk_ids(self, file: str):
+        """Return the chunk ids recorded for a file."""
+        entry = self.files.get(file)
+        return list(entry["chunk_ids"]) if entry else []
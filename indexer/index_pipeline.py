@@ -0,0 +1,483 @@
+"""
+Pipelined document indexing for the RAG system.
+
+Files flow through three stages that run at the same time:
+
+1. chunk - a pool of worker processes chunks files (PDF parsing and regex work is CPU bound);
+           large PDFs are split into page ranges chunked by several workers at once
+2. embed - a batcher fills fixed-size batches across file boundaries and a small thread
+           pool sends them to the embedding accessor (network or model bound), or with
+           INDEX_EMBED_ASYNC one event loop keeps INDEX_EMBED_CONCURRENCY of them in flight
+3. write - a single writer thread hands embedded batches to the vectordb accessor
+
+The stages are connected by bounded queues, so a fast stage waits for a slow one instead
+of buffering the whole corpus in memory.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import threading
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils import (
+    chunk_a_file, iter_file_chunks, iter_batches,
+    pdf_page_ranges, chunk_a_pdf_page_range, renumber_pdf_chunks,
+)
+from indexer.index_manifest import describe_file
+from plat.embedding.embedding_async import aembed_documents
+from plat.http_transport import close_async_transport
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long a blocked stage waits before re-checking whether the build was aborted
+_POLL_SECONDS = 0.5
+
+
+class IndexCancelled(Exception):
+    """Raised by IndexPipeline.run when the build was cancelled through its cancel_event."""
+
+
+class _EventLoopThread:
+    """Run coroutines on an event loop in one background thread, used like an executor."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._futures = []
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def submit(self, coroutine_function, *args):
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(*args), self.loop)
+        self._futures = [f for f in self._futures if not f.done()] + [future]
+        return future
+
+    def __exit__(self, *exc):
+        wait(self._futures)
+        asyncio.run_coroutine_threadsafe(close_async_transport(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def _chunk_worker(file_queue, chunk_queue, max_chunk_size: int, overlap: int, batch_size: int):
+    """
+    Worker process: chunk the files taken from file_queue and send the chunks downstream.
+
+    Chunks are streamed in batches of batch_size as the chunker produces them, so a large
+    file never has to fit in memory as a whole list of chunks. A (file, part, start, end)
+    task is one page range of a large PDF; its chunks are sent together as one part.
+    """
+    while True:
+        task = file_queue.get()
+        if task is None:
+            break
+        if isinstance(task, tuple):
+            file, part, start, end = task
+            try:
+                chunks = chunk_a_pdf_page_range(file, start, end, max_chunk_size, overlap)
+            except Exception as e:
+                chunk_queue.put(("error", file, str(e)))
+                continue
+            chunk_queue.put(("part", file, (part, chunks)))
+            continue
+
+        file = task
+        count = 0
+        try:
+            # describe the file before reading it, so a concurrent edit shows up as a change next run
+            chunk_queue.put(("start", file, describe_file(file)))
+            for batch in iter_batches(iter_file_chunks(file, max_chunk_size, overlap), batch_size):
+                chunk_queue.put(("chunks", file, batch))
+                count += len(batch)
+        except Exception as e:
+            if count:
+                # part of the file is already downstream; the writer discards it at the end
+                chunk_queue.put(("error", file, str(e)))
+                continue
+            try:
+                # nothing sent yet: chunk_a_file falls back to the simple chunkers
+                chunks = chunk_a_file(file, max_chunk_size, overlap)
+            except Exception as e:
+                chunk_queue.put(("error", file, str(e)))
+                continue
+            if chunks:
+                chunk_queue.put(("chunks", file, chunks))
+            count = len(chunks)
+        chunk_queue.put(("done", file, count))
+    chunk_queue.put(("exit", None, None))
+
+
+def _file_size(file: str) -> int:
+    try:
+        return os.path.getsize(file)
+    except OSError:
+        return 0
+
+
+class IndexPipeline:
+    """
+    Chunk, embed and store a list of files with the three stages running in parallel.
+
+    The vectordb accessor must already have its embedding function set; the pipeline calls
+    `store_the_embedded_chunks` on it from a single writer thread, so accessors do not need
+    to be thread-safe. When a manifest is given, every file whose chunks have all been
+    stored is recorded in it. The final persist of the store and the manifest is left to
+    the caller.
+
+    Every INDEX_CHECKPOINT_CHUNKS chunks or INDEX_CHECKPOINT_SECONDS seconds the writer
+    checkpoints: it persists the store, records the files still in flight as partial in the
+    manifest and saves it. `resume` maps files of an interrupted build to the chunk ids
+    already stored for them; those chunks are not embedded again.
+
+    Progress is published in `stats` (pass a dict to share it with another thread), and
+    setting `cancel_event` stops the build. If the build stops early, the chunks of files
+    that were only partly stored are deleted again, so the store only ever holds complete
+    files and can be persisted as is.
+    """
+
+    def __init__(self, embedding_accessor, vectordb_accessor, manifest=None,
+                 max_chunk_size: int = None, overlap: int = None,
+                 stats: dict = None, cancel_event: threading.Event = None,
+                 resume: dict = None):
+        self.embedding_accessor = embedding_accessor
+        self.vectordb_accessor = vectordb_accessor
+        self.manifest = manifest
+        self.resume = resume or {}
+        self.max_chunk_size = max_chunk_size or config.MAX_CHUNK_SIZE
+        self.overlap = config.CHUNK_OVERLAP if overlap is None else overlap
+
+        self.chunk_workers = max(1, config.INDEX_CHUNK_WORKERS)
+        self.embed_workers = max(1, config.INDEX_EMBED_WORKERS)
+        self.batch_size = max(1, config.INDEX_EMBED_BATCH_SIZE)
+        self.chunk_queue_depth = max(1, config.INDEX_CHUNK_QUEUE_DEPTH)
+        self.write_queue_depth = max(1, config.INDEX_WRITE_QUEUE_DEPTH)
+        self.checkpoint_chunks = config.INDEX_CHECKPOINT_CHUNKS
+        self.checkpoint_seconds = config.INDEX_CHECKPOINT_SECONDS
+
+        self.stats = stats if stats is not None else {}
+        self.stats.update({
+            "files_total": 0,
+            "files_done": 0,
+            "files_failed": 0,
+            "chunks_done": 0,
+            "chunks_resumed": 0,
+            "vectors_done": 0,
+            "checkpoints": 0,
+        })
+        self._stats_lock = threading.Lock()
+        self._abort = threading.Event()
+        self.cancel_event = cancel_event
+        self._error = None
+
+        # Per-file bookkeeping used by the writer to detect completed files: describe_file()
+        # info, the chunk count once chunking finished, and the chunk ids stored so far
+        self._info = {}
+        self._expected = {}
+        self._written = {}
+        self._chunks_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        # Large PDFs chunked in page ranges, used by the embed stage to put the parts back
+        # in order: describe_file() info, part count, next part due, chunks so far, parts
+        # that arrived early and whether a part failed
+        self._split = {}
+
+    def run(self, files):
+        """Index the given files. Raises the first embedding or storage error, if any."""
+        files = list(files)
+        self.stats["files_total"] = len(files)
+        if not files:
+            return self.stats
+
+        # spawn, not fork: builds run on a thread of the multithreaded web app, and a forked
+        # copy of its locks and runtimes can deadlock
+        ctx = mp.get_context("spawn")
+        file_queue = ctx.Queue()
+        chunk_queue = ctx.Queue(maxsize=self.chunk_queue_depth)
+        write_queue = queue.Queue(maxsize=self.write_queue_depth)
+
+        # largest files first, so a long manual does not start last and hold up the end of the build
+        tasks = self._plan_tasks(sorted(files, key=_file_size, reverse=True))
+        for task in tasks:
+            file_queue.put(task)
+        workers = []
+        for _ in range(min(self.chunk_workers, len(tasks))):
+            file_queue.put(None)
+            worker = ctx.Process(
+                target=_chunk_worker,
+                args=(file_queue, chunk_queue, self.max_chunk_size, self.overlap, self.batch_size),
+                daemon=True,
+            )
+            worker.start()
+            workers.append(worker)
+
+        writer = threading.Thread(target=self._write_stage, args=(write_queue,), daemon=True)
+        writer.start()
+
+        try:
+            self._embed_stage(chunk_queue, write_queue, len(workers))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # the writer keeps draining until it sees the marker, so this never blocks for long
+            write_queue.put(None)
+            writer.join()
+            if self._abort.is_set():
+                file_queue.cancel_join_thread()
+            for worker in workers:
+                if self._abort.is_set() and worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            file_queue.close()
+            chunk_queue.close()
+            # files left incomplete were aborted or failed part way through chunking
+            self._discard_partial_files()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _plan_tasks(self, files):
+        """Turn the files into chunk worker tasks, one per page range for PDFs longer than a range."""
+        tasks = []
+        for file in files:
+            ranges = None
+            if os.path.splitext(file)[1] == ".pdf":
+                try:
+                    ranges = pdf_page_ranges(file)
+                    # describe the file before any part is read, as the workers do for whole files
+                    info = describe_file(file) if len(ranges) > 1 else None
+                except Exception:
+                    ranges = None  # left to the worker, which falls back or reports the error
+            if not ranges or len(ranges) == 1:
+                tasks.append(file)
+                continue
+            self._split[file] = {
+                "info": info, "parts": len(ranges), "next": 0, "count": 0, "early": {}, "failed": False,
+            }
+            tasks.extend((file, part, start, end) for part, (start, end) in enumerate(ranges))
+        return tasks
+
+    def _discard_partial_files(self):
+        """Delete the chunks of files that were stored only in part before the build stopped."""
+        partial_ids = [chunk_id for chunk_ids in self._written.values() for chunk_id in chunk_ids]
+        if partial_ids:
+            try:
+                self.vectordb_accessor.delete_chunks(partial_ids)
+            except Exception as e:
+                logger.error(f"Could not discard {len(partial_ids)} chunks of partly indexed files: {e}")
+        if self.manifest is not None:
+            for file in self._written:
+                self.manifest.forget(file)
+        self._info = {}
+        self._written = {}
+        self._expected = {}
+
+    def _cancelled(self):
+        """Turn a set cancel_event into an abort of every stage."""
+        if self.cancel_event is not None and self.cancel_event.is_set() and not self._abort.is_set():
+            self._fail(IndexCancelled("Index build cancelled"))
+        return self._abort.is_set()
+
+    def _embed_stage(self, chunk_queue, write_queue, n_workers: int):
+        """Batch chunks across file boundaries and embed the batches on a thread pool or event loop."""
+        use_async = config.INDEX_EMBED_ASYNC
+        slots = threading.Semaphore(max(1, config.INDEX_EMBED_CONCURRENCY) if use_async else self.embed_workers * 2)
+        pending = []
+        exits = 0
+
+        def embed_batch(batch):
+            try:
+                texts = [chunk["text"] for chunk in batch]
+                vectors = self.embedding_accessor.embed_documents(texts)
+                self._put(write_queue, ("batch", batch, vectors))
+            except BaseException as e:
+                self._fail(e)
+            finally:
+                slots.release()
+
+        async def aembed_batch(batch):
+            try:
+                texts = [chunk["text"] for chunk in batch]
+                vectors = await aembed_documents(self.embedding_accessor, texts)
+                await self._aput(write_queue, ("batch", batch, vectors))
+            except BaseException as e:
+                self._fail(e)
+            finally:
+                slots.release()
+
+        def submit(batch):
+            while not slots.acquire(timeout=_POLL_SECONDS):
+                if self._cancelled():
+                    return
+            pool.submit(aembed_batch if use_async else embed_batch, batch)
+
+        def add_chunks(file, chunks):
+            nonlocal pending
+            stored = self.resume.get(file)
+            if stored:
+                # chunks already stored by an interrupted build go straight to the writer
+                skipped = [chunk["id"] for chunk in chunks if chunk["id"] in stored]
+                if skipped:
+                    self._put(write_queue, ("skip", file, skipped))
+                    chunks = [chunk for chunk in chunks if chunk["id"] not in stored]
+            pending.extend(chunks)
+            full = len(pending) - len(pending) % self.batch_size
+            for start in range(0, full, self.batch_size):
+                submit(pending[start:start + self.batch_size])
+            pending = pending[full:]
+
+        def add_part(file, part, chunks):
+            """Pass the page ranges of a split PDF on in page order, numbering their chunks."""
+            split = self._split[file]
+            if split["failed"]:
+                return
+            split["early"][part] = chunks
+            while split["next"] in split["early"]:
+                chunks = split["early"].pop(split["next"])
+                if split["next"] == 0:
+                    self._put(write_queue, ("start", file, split["info"]))
+                add_chunks(file, renumber_pdf_chunks(chunks, split["count"] + 1))
+                split["count"] += len(chunks)
+                split["next"] += 1
+            if split["next"] == split["parts"]:
+                self._put(write_queue, ("expect", file, split["count"]))
+
+        with _EventLoopThread() if use_async else ThreadPoolExecutor(max_workers=self.embed_workers) as pool:
+            while exits < n_workers and not self._cancelled():
+                try:
+                    kind, file, payload = chunk_queue.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+
+                if kind == "exit":
+                    exits += 1
+                elif kind == "error":
+                    split = self._split.get(file)
+                    if split is not None:
+                        # the parts already passed on are discarded as a partly stored file
+                        if split["failed"]:
+                            continue
+                        split["failed"] = True
+                        split["early"].clear()
+                    logger.error(f"An error occurred with file {file}: {payload}")
+                    with self._stats_lock:
+                        self.stats["files_failed"] += 1
+                elif kind == "start":
+                    self._put(write_queue, ("start", file, payload))
+                elif kind == "chunks":
+                    add_chunks(file, payload)
+                elif kind == "part":
+                    add_part(file, *payload)
+                elif kind == "done":
+                    self._put(write_queue, ("expect", file, payload))
+
+            if pending and not self._abort.is_set():
+                submit(pending)
+
+    def _write_stage(self, write_queue):
+        """Single writer: store embedded batches and track which files are complete."""
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            if self._cancelled():
+                continue
+            try:
+                kind, first, second = item
+                if kind == "batch":
+                    self.vectordb_accessor.store_the_embedded_chunks(first, second)
+                    with self._stats_lock:
+                        self.stats["chunks_done"] += len(first)
+                        self.stats["vectors_done"] += len(first)
+                    for chunk in first:
+                        self._written.setdefault(chunk["file"], []).append(chunk["id"])
+                    for file in {chunk["file"] for chunk in first}:
+                        self._check_file_complete(file)
+                    self._chunks_since_checkpoint += len(first)
+                    self._maybe_checkpoint()
+                elif kind == "skip":
+                    self._written.setdefault(first, []).extend(second)
+                    with self._stats_lock:
+                        self.stats["chunks_resumed"] += len(second)
+                    self._check_file_complete(first)
+                elif kind == "start":
+                    self._info[first] = second
+                    self._written.setdefault(first, [])
+                elif kind == "expect":
+                    self._expected[first] = second
+                    self._check_file_complete(first)
+            except BaseException as e:
+                self._fail(e)
+
+    def _check_file_complete(self, file: str):
+        count = self._expected.get(file)
+        chunk_ids = self._written.get(file, [])
+        if count is None or len(chunk_ids) < count:
+            return
+        del self._expected[file]
+        self._written.pop(file, None)
+        self._file_completed(file, self._info.pop(file), chunk_ids)
+
+    def _maybe_checkpoint(self):
+        """Checkpoint once enough chunks or time have gone by since the last one."""
+        due_by_chunks = 0 < self.checkpoint_chunks <= self._chunks_since_checkpoint
+        due_by_time = 0 < self.checkpoint_seconds <= time.monotonic() - self._last_checkpoint
+        if due_by_chunks or due_by_time:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Durably persist the store, then the manifest with the files still in flight as partial."""
+        if self.manifest is not None:
+            for file, chunk_ids in self._written.items():
+                if chunk_ids:
+                    self.manifest.record_partial(file, self._info[file], chunk_ids)
+        self.vectordb_accessor.persist_vector_store(checkpoint=True)
+        if self.manifest is not None:
+            self.manifest.save()
+        self._chunks_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        with self._stats_lock:
+            self.stats["checkpoints"] += 1
+
+    def _file_completed(self, file: str, info: dict, chunk_ids):
+        """Called by the writer once every chunk of a file has been stored."""
+        stored = self.resume.get(file)
+        if stored:
+            # chunks an interrupted build stored that this run no longer produces
+            leftover = stored.difference(chunk_ids)
+            if leftover:
+                self.vectordb_accessor.delete_chunks(list(leftover))
+        if self.manifest is not None:
+            self.manifest.record(file, info, chunk_ids)
+        with self._stats_lock:
+            self.stats["files_done"] += 1
+
+    def _put(self, q, item):
+        """Put into a bounded queue without blocking forever once the build is aborted."""
+        while not self._cancelled():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    async def _aput(self, q, item):
+        """Coroutine version of _put(), waiting for room without blocking the event loop."""
+        while not self._cancelled():
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(_POLL_SECONDS / 10)
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._abort.set()
@@ -0,0 +1,67 @@
+"""
+Exclusive write lock for a vector store.
+
+Only one index build may write a store at a time, whether it runs inside the web app or
+from the command line. The lock is an OS-level lock on a file in the store directory, so
+it is released automatically if the process holding it dies.
+"""
+
+import os
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+LOCK_FILE = "index.lock"
+
+
+class StoreLockedError(RuntimeError):
+    """Raised when another build already holds the write lock of a store."""
+
+
+class StoreLock:
+    """Non-blocking exclusive lock on a store directory, usable as a context manager."""
+
+    def __init__(self, store_dir: str):
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = os.path.join(store_dir, LOCK_FILE)
+        self._fd = None
+
+    def acquire(self):
+        """Take the lock or raise StoreLockedError if another build holds it."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.name == "nt":
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise StoreLockedError(f"Another index build is writing {os.path.dirname(self.path)}")
+
+        # leave the holder's pid in the file to help whoever finds it locked
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+
+    def release(self):
+        """Release the lock if held."""
+        if self._fd is None:
+            return
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
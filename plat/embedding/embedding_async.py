@@ -0,0 +1,24 @@
+"""
+Coroutine entry points for any embedding accessor.
+
+The network accessors (plat, ollama, openai) implement aembed_documents() and
+aembed_query() natively on the shared async connection pool. The others (local models,
+Bedrock) only block; these helpers run them on the event loop's default thread pool so
+callers can await every accessor the same way.
+"""
+
+import asyncio
+
+
+async def aembed_documents(embedding_accessor, texts: list[str]):
+    """Embed documents through the accessor's coroutine, or on a worker thread if it has none."""
+    if hasattr(embedding_accessor, "aembed_documents"):
+        return await embedding_accessor.aembed_documents(texts)
+    return await asyncio.to_thread(embedding_accessor.embed_documents, texts)
+
+
+async def aembed_query(embedding_accessor, text: str):
+    """Embed a query through the accessor's coroutine, or on a worker thread if it has none."""
+    if hasattr(embedding_accessor, "aembed_query"):
+        return await embedding_accessor.aembed_query(text)
+    return await asyncio.to_thread(embedding_accessor.embed_query, text)
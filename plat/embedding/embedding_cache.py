@@ -0,0 +1,356 @@
+"""
+Persistent embedding cache shared by every vector backend.
+
+CachedEmbeddings wraps the accessor returned by EmbeddingFactory. embed_documents() looks
+each text up by (model, normalized text hash) and only sends the misses to the provider,
+so rebuilding a store, re-indexing unchanged chunks or switching between faiss, chroma
+and milvus does not embed the same text twice.
+
+Each model has its own directory under EMBEDDING_CACHE_DIR holding:
+
+- vectors.f32: float32 vectors, one row per slot, memory-mapped and grown on demand
+- keys.bin: append-only log of (16-byte key, slot) records, rewritten when evicting
+- meta.json: model name and vector dimension
+
+Lookups and inserts take a short exclusive lock on the directory (never held while the
+provider is called), and each process replays log records appended by the others, so
+the web app, index jobs and the command-line indexer can share one cache. The cache is
+kept under EMBEDDING_CACHE_MAX_MB by evicting the least recently used vectors.
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+import numpy as np
+from config import config
+from logger import get_logger
+from plat.embedding.embedding_async import aembed_documents, aembed_query
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = get_logger(__name__)
+
+_KEY_RECORD = np.dtype([("key", "V16"), ("slot", "<i4")])
+_INITIAL_ROWS = 4096
+_EVICT_FRACTION = 0.1
+
+
+def _normalize_text(text: str) -> str:
+    """Normalize Unicode and whitespace so trivially different copies share an entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings:
+    """
+    Embedding accessor that serves repeated texts from a persistent cache.
+
+    Args:
+        embedding_accessor: The provider accessor to wrap
+        model_name: Name of the embedding model, part of every cache key
+        cache_dir: Root directory of the cache, one subdirectory per model
+        max_bytes: Size of the vector file above which old vectors are evicted
+    """
+
+    def __init__(self, embedding_accessor, model_name: str, cache_dir: str = None, max_bytes: int = None):
+        self.embedding_accessor = embedding_accessor
+        self.model_name = model_name
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        digest = hashlib.blake2b(model_name.encode("utf-8"), digest_size=4).hexdigest()
+        self.cache_dir = os.path.join(cache_dir or config.EMBEDDING_CACHE_DIR, f"{safe_name}-{digest}")
+        self.max_bytes = max_bytes if max_bytes is not None else config.EMBEDDING_CACHE_MAX_MB * (1 << 20)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "entries": 0}
+
+        self._thread_lock = threading.Lock()
+        self._lock_fd = None
+        self._dim = None
+        self._vectors = None
+        self._slots = {}  # key -> slot
+        self._free = set()
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._tick = 0
+        self._log_ino = None
+        self._log_offset = 0
+
+    def embed_documents(self, texts: list[str]):
+        """Embed documents, sending only texts missing from the cache to the provider."""
+        if not texts:
+            return self.embedding_accessor.embed_documents(texts)
+
+        keys, found, missing = self._find(texts)
+        if missing:
+            vectors = self.embedding_accessor.embed_documents([texts[i] for i in missing.values()])
+            self._store(found, missing, vectors)
+        return np.stack([found[key] for key in keys])
+
+    def embed_query(self, text: str):
+        """Embed a query; queries go straight to the provider."""
+        return self.embedding_accessor.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]):
+        """Coroutine version of embed_documents(); the provider is awaited without holding the lock."""
+        if not texts:
+            return await aembed_documents(self.embedding_accessor, texts)
+
+        keys, found, missing = self._find(texts)
+        if missing:
+            vectors = await aembed_documents(self.embedding_accessor, [texts[i] for i in missing.values()])
+            self._store(found, missing, vectors)
+        return np.stack([found[key] for key in keys])
+
+    async def aembed_query(self, text: str):
+        return await aembed_query(self.embedding_accessor, text)
+
+    def close(self):
+        """Release the cache files, close the wrapped accessor and log the hit/miss statistics."""
+        with self._thread_lock:
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+            self._vectors = None
+        if hasattr(self.embedding_accessor, "close"):
+            self.embedding_accessor.close()
+        total = self.stats["hits"] + self.stats["misses"]
+        if total:
+            logger.info(
+                f"Embedding cache {self.model_name}: {self.stats['hits']}/{total} hits, "
+                f"{self.stats['evictions']} evicted, {self.stats['entries']} entries"
+            )
+
+    def _find(self, texts: list[str]):
+        """Look the texts up; return their keys, the vectors found and {missing key: first index}."""
+        keys = [self._key(text) for text in texts]
+        with self._locked():
+            found = self._lookup(keys)
+            # embed each missing text once, even if it appears several times in the batch
+            missing = {}
+            for i, key in enumerate(keys):
+                if key not in found:
+                    missing.setdefault(key, i)
+            self.stats["hits"] += len(keys) - len(missing)
+            self.stats["misses"] += len(missing)
+        return keys, found, missing
+
+    def _store(self, found: dict, missing: dict, vectors):
+        """Cache the provider's vectors for the missing keys and add them to found."""
+        new = dict(zip(missing, np.asarray(vectors, dtype=np.float32)))
+        with self._locked():
+            self._insert(new)
+        found.update(new)
+
+    def _key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(_normalize_text(text).encode("utf-8"))
+        return digest.digest()
+
+    # --- locking and synchronisation with other processes ---
+
+    @contextmanager
+    def _locked(self):
+        """Hold this object's thread lock and the directory lock, in sync with other processes."""
+        with self._thread_lock:
+            if self._lock_fd is None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._lock_fd = os.open(self._path("cache.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            if os.name == "nt":
+                os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._lock_fd, msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._sync()
+                yield
+            finally:
+                if os.name == "nt":
+                    os.lseek(self._lock_fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._lock_fd, msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _sync(self):
+        """Catch up with changes other processes made since this one last held the lock."""
+        log_path = self._path("keys.bin")
+        try:
+            stat = os.stat(log_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._log_ino:
+            self._reload(stat)
+        elif stat.st_size > self._log_offset:
+            self._replay(self._read_records(self._log_offset, stat.st_size))
+        self._map_vectors()
+
+    def _reload(self, stat):
+        """Rebuild the in-memory key index from the whole log (first use, or after a compaction)."""
+        self._dim = None
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f)["dim"]
+
+        self._slots = {}
+        self._log_ino = stat.st_ino if stat else None
+        self._log_offset = 0
+        self._vectors = None
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._free = set()
+        self._map_vectors()
+        if stat is not None:
+            records = self._read_records(0, stat.st_size)
+            # older log records count as less recently used
+            self._tick = -len(records)
+            self._replay(records)
+        self._tick = max(self._tick, 0)
+
+    def _read_records(self, start: int, end: int):
+        count = (end - start) // _KEY_RECORD.itemsize
+        with open(self._path("keys.bin"), "rb") as f:
+            f.seek(start)
+            records = np.frombuffer(f.read(count * _KEY_RECORD.itemsize), dtype=_KEY_RECORD)
+        if start + count * _KEY_RECORD.itemsize != end:
+            # torn record from a crash mid-append: cut it off so later appends stay aligned
+            with open(self._path("keys.bin"), "r+b") as f:
+                f.truncate(start + count * _KEY_RECORD.itemsize)
+        return records
+
+    def _replay(self, records):
+        self._map_vectors()
+        for key, slot in zip(records["key"].tolist(), records["slot"].tolist()):
+            self._slots[bytes(key)] = slot
+            self._free.discard(slot)
+            self._touch(slot)
+        self._log_offset += len(records) * _KEY_RECORD.itemsize
+        self.stats["entries"] = len(self._slots)
+
+    def _map_vectors(self):
+        """(Re)map the vector file if it was created or grown since it was last mapped."""
+        if self._dim is None:
+            return
+        path = self._path("vectors.f32")
+        if not os.path.exists(path):
+            return
+        rows = os.path.getsize(path) // (self._dim * 4)
+        mapped = len(self._vectors) if self._vectors is not None else 0
+        if rows == mapped:
+            return
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, self._dim))
+        self._free.update(range(mapped, rows))
+        self._last_used = np.concatenate([self._last_used, np.zeros(rows - len(self._last_used), dtype=np.int64)])
+
+    def _touch(self, slot: int):
+        self._tick += 1
+        if slot < len(self._last_used):
+            self._last_used[slot] = self._tick
+
+    # --- lookups and inserts, called with the lock held ---
+
+    def _lookup(self, keys):
+        found = {}
+        if self._vectors is None:
+            return found
+        for key in keys:
+            slot = self._slots.get(key)
+            if slot is not None and key not in found:
+                found[key] = np.array(self._vectors[slot])
+                self._touch(slot)
+        return found
+
+    def _insert(self, new: dict):
+        """Store new vectors and append their keys to the log."""
+        new = {key: vector for key, vector in new.items() if key not in self._slots}
+        if not new:
+            return
+        dim = len(next(iter(new.values())))
+        if self._dim != dim:
+            self._reset(dim)
+
+        # a batch larger than the whole cache only caches what fits, the rest is skipped
+        new = list(new.items())[:self._max_rows()]
+        records = np.zeros(len(new), dtype=_KEY_RECORD)
+        for i, (key, vector) in enumerate(new):
+            slot = self._allocate()
+            if slot is None:
+                records = records[:i]
+                break
+            self._vectors[slot] = vector
+            records[i] = (key, slot)
+        if not len(records):
+            return
+        # vectors must be on disk before the keys that point at them
+        self._vectors.flush()
+        with open(self._path("keys.bin"), "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        if self._log_ino is None:
+            self._log_ino = os.stat(self._path("keys.bin")).st_ino
+        self._replay(records)
+
+    def _max_rows(self) -> int:
+        return max(1, self.max_bytes // (self._dim * 4))
+
+    def _allocate(self):
+        """Return a free slot, growing the vector file or evicting entries; None if all slots
+        are taken by the batch being inserted."""
+        if not self._free:
+            max_rows = self._max_rows()
+            rows = len(self._vectors) if self._vectors is not None else 0
+            if rows < max_rows:
+                self._grow(min(max_rows, max(_INITIAL_ROWS, rows * 2)))
+            elif self._slots:
+                self._evict()
+        return self._free.pop() if self._free else None
+
+    def _grow(self, rows: int):
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(rows * self._dim * 4)
+        self._map_vectors()
+
+    def _evict(self):
+        """Drop the least recently used fraction of the entries and compact the log."""
+        count = max(1, int(len(self._slots) * _EVICT_FRACTION))
+        keys = list(self._slots)
+        slots = np.array([self._slots[key] for key in keys], dtype=np.int64)
+        order = np.argsort(self._last_used[slots], kind="stable")
+        for i in order[:count]:
+            slot = self._slots.pop(keys[i])
+            self._free.add(slot)
+        self.stats["evictions"] += count
+
+        # rewrite the log in recency order, so the next reload keeps the LRU order
+        kept = [keys[i] for i in order[count:]]
+        records = np.zeros(len(kept), dtype=_KEY_RECORD)
+        records["key"] = np.frombuffer(b"".join(kept), dtype="V16")
+        records["slot"] = [self._slots[key] for key in kept]
+        tmp_path = self._path("keys.bin.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path("keys.bin"))
+        self._log_ino = os.stat(self._path("keys.bin")).st_ino
+        self._log_offset = len(records) * _KEY_RECORD.itemsize
+        self.stats["entries"] = len(self._slots)
+
+    def _reset(self, dim: int):
+        """Start an empty cache for a model whose vectors have a different dimension."""
+        if self._dim is not None:
+            logger.warning(f"Embedding cache {self.model_name}: dimension changed to {dim}, clearing it")
+        for name in ("keys.bin", "vectors.f32"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": dim}, f)
+        self._reload(None)
+
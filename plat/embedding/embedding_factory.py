@@ -3,6 +3,9 @@ from plat.embedding.embeddings_huggingface import SentenceTransformerEmbeddings
 from plat.embedding.embeddings_microplat import PlatServedEmbeddings
 from plat.embedding.embeddings_ollama import OllamaEmbeddings
 from plat.embedding.embeddings_bedrock import BedrockEmbeddings
+from plat.embedding.embedding_cache import CachedEmbeddings
+from plat.embedding.embedding_pool import LocalEmbeddingPool
+from plat.embedding.query_cache import CachedQueryEmbeddings
 from config import config
 
 class EmbeddingFactory:
@@ -10,9 +13,37 @@ class EmbeddingFactory:
         self.embedding_provider = embedding_provider
         self.api_key = api_key
 
-    def get_embedding_accessor(self):
+    def get_embedding_accessor(self, indexing: bool = False):
+        """
+        Return the provider's accessor, wrapped in the persistent embedding cache unless it is off.
+
+        Accessors for queries are also wrapped in the query cache unless it is off.
+
+        Args:
+            indexing: The accessor is for an index build, which may use a multi-process pool
+        """
+        embedding_accessor = self._create_embedding_accessor(indexing)
+        model_name = self._cache_model_name(embedding_accessor)
+        if config.EMBEDDING_CACHE_MAX_MB > 0:
+            embedding_accessor = CachedEmbeddings(embedding_accessor, model_name=model_name)
+        if not indexing and config.QUERY_CACHE_SIZE > 0:
+            embedding_accessor = CachedQueryEmbeddings(embedding_accessor, model_name=model_name)
+        return embedding_accessor
+
+    def _cache_model_name(self, embedding_accessor):
+        """Provider and model the accessor's vectors come from, as used in cache keys."""
+        model_name = getattr(embedding_accessor, "model", None) or getattr(embedding_accessor, "model_id", None)
+        variant = getattr(embedding_accessor, "variant", None)
+        if variant:
+            # e.g. an int8 ONNX export, whose vectors differ slightly from the original model's
+            model_name = f"{model_name or config.EMBEDDING_MODEL_NAME}+{variant}"
+        return f"{self.embedding_provider}:{model_name or config.EMBEDDING_MODEL_NAME}"
+
+    def _create_embedding_accessor(self, indexing: bool = False):
         match self.embedding_provider:
             case "local":
+                if indexing and config.LOCAL_EMBEDDING_WORKERS > 1:
+                    return LocalEmbeddingPool(model=config.EMBEDDING_MODEL_NAME)
                 return SentenceTransformerEmbeddings(model=config.EMBEDDING_MODEL_NAME)
             case "plat":
                 return PlatServedEmbeddings(model=config.EMBEDDING_MODEL_NAME)
@@ -23,7 +54,7 @@ class EmbeddingFactory:
                     raise ValueError(
                         "OpenAI API key must be provided for OpenAI embeddings"
                     )
-                return OpenAIEmbeddings(api_key=self.api_key)
+                return OpenAIEmbeddings(api_key=self.api_key, model=config.EMBEDDING_MODEL_NAME)
             case "bedrock":
                 return BedrockEmbeddings(
                     credentials_profile_name="default", region_name="us-east-1"
@@ -0,0 +1,236 @@
+"""
+Multi-process pool for the local SentenceTransformer provider.
+
+One model runs in one process at a time, however many cores the machine has. With
+LOCAL_EMBEDDING_WORKERS > 1, index builds embed through LocalEmbeddingPool instead:
+each worker process loads the model once, pins its intra-op thread pool to
+LOCAL_EMBEDDING_THREADS threads, and takes shards of texts from a shared task queue.
+Workers write their vectors straight into a shared-memory block owned by the calling
+embed_documents(), so results come back in input order without pickling vectors
+through a pipe.
+
+Several threads may call embed_documents() at once (the index pipeline's embed stage
+does); their shards are interleaved on the same workers.
+"""
+
+import os
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# smallest shard worth a round trip to a worker
+_MIN_SHARD = 8
+_POLL_SECONDS = 1.0
+_STOP_SECONDS = 30.0
+
+
+def _embed_worker(model, backend, quantize, batch_size, threads, task_queue, result_queue):
+    """Load the model once, then embed shards into the callers' shared-memory blocks."""
+    # must be set before torch (or onnxruntime) creates its thread pools
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from plat.embedding.embeddings_huggingface import SentenceTransformerEmbeddings
+
+    try:
+        embeddings = SentenceTransformerEmbeddings(model, backend=backend, quantize=quantize, batch_size=batch_size)
+        dim = len(embeddings.embed_query("dimension probe"))
+    except BaseException as e:
+        result_queue.put(("failed", None, f"{type(e).__name__}: {e}"))
+        return
+    result_queue.put(("ready", None, (dim, embeddings.variant)))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        call_id, shm_name, start, texts = task
+        try:
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            shm = SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray((shm.size // (dim * 4), dim), dtype=np.float32, buffer=shm.buf)
+                out[start:start + len(texts)] = vectors
+                del out
+            finally:
+                shm.close()
+            result_queue.put(("done", call_id, None))
+        except BaseException as e:
+            result_queue.put(("error", call_id, f"{type(e).__name__}: {e}"))
+
+
+class _Call:
+    def __init__(self, shards: int):
+        self.remaining = shards
+        self.error = None
+        self.finished = threading.Event()
+
+
+class LocalEmbeddingPool:
+    """
+    Embedding accessor that spreads local SentenceTransformer inference over processes.
+
+    The first worker starts (and, for the ONNX backend, exports and checks the model)
+    when the pool is created; the others start on the first embed_documents() call.
+    Call close() to stop them.
+
+    Args:
+        model: Name or path of the SentenceTransformer model
+        workers: Worker processes (default LOCAL_EMBEDDING_WORKERS)
+        threads: Intra-op threads per worker; 0 splits the cores evenly (default LOCAL_EMBEDDING_THREADS)
+    """
+
+    def __init__(self, model: str, workers: int = None, threads: int = None):
+        self.model = model
+        self.workers = max(1, workers or config.LOCAL_EMBEDDING_WORKERS)
+        threads = config.LOCAL_EMBEDDING_THREADS if threads is None else threads
+        self.threads = threads if threads > 0 else max(1, (os.cpu_count() or 1) // self.workers)
+
+        # spawn, not fork: a forked copy of an initialized torch/OpenMP runtime can deadlock
+        self._ctx = mp.get_context("spawn")
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._processes = []
+        self._calls = {}
+        self._call_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._broken = None
+        self._dispatcher = None
+
+        self._spawn()
+        while True:
+            try:
+                kind, _, payload = self._results.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if not self._processes[0].is_alive():
+                    kind, payload = "failed", f"exit code {self._processes[0].exitcode}"
+                    break
+        if kind != "ready":
+            self.close()
+            raise Exception(f"Local embedding worker failed to start: {payload}")
+        self.dim, self.variant = payload
+        logger.info(
+            f"Local embedding pool for {model}: {self.workers} workers x {self.threads} threads"
+            + (f", {self.variant}" if self.variant else "")
+        )
+
+    def embed_documents(self, texts: list[str]):
+        """Embed documents across the worker processes, in input order."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        self._start()
+
+        shard = max(_MIN_SHARD, -(-len(texts) // self.workers))
+        starts = range(0, len(texts), shard)
+        shm = SharedMemory(create=True, size=len(texts) * self.dim * 4)
+        call_id = next(self._call_ids)
+        call = _Call(len(starts))
+        try:
+            with self._lock:
+                if self._broken:
+                    raise Exception(self._broken)
+                self._calls[call_id] = call
+            for start in starts:
+                self._tasks.put((call_id, shm.name, start, list(texts[start:start + shard])))
+            call.finished.wait()
+            if call.error:
+                raise Exception(f"Local embedding failed: {call.error}")
+            view = np.ndarray((len(texts), self.dim), dtype=np.float32, buffer=shm.buf)
+            vectors = view.copy()
+            del view
+            return vectors
+        finally:
+            with self._lock:
+                self._calls.pop(call_id, None)
+            shm.close()
+            shm.unlink()
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(_STOP_SECONDS)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        self._fail_all("Local embedding pool closed")
+        self._tasks.close()
+        self._results.close()
+
+    def _spawn(self):
+        process = self._ctx.Process(
+            target=_embed_worker,
+            args=(self.model, config.LOCAL_EMBEDDING_BACKEND, config.LOCAL_EMBEDDING_QUANTIZE,
+                  config.LOCAL_EMBEDDING_BATCH_SIZE, self.threads, self._tasks, self._results),
+            daemon=True,
+        )
+        process.start()
+        self._processes.append(process)
+
+    def _start(self):
+        """Start the remaining workers and the result dispatcher on first use."""
+        with self._lock:
+            if self._dispatcher is not None or self._closing:
+                return
+            # the first worker already exported and checked the model, so the rest only load it
+            for _ in range(self.workers - 1):
+                self._spawn()
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        """Route worker results to the waiting calls; fail them all if a worker dies."""
+        while not self._closing:
+            try:
+                kind, call_id, payload = self._results.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                dead = [p for p in self._processes if not p.is_alive()]
+                if dead and not self._closing:
+                    self._fail_all(f"{len(dead)} local embedding worker(s) exited unexpectedly")
+                    return
+                continue
+            if kind == "failed":
+                self._fail_all(f"Local embedding worker failed to start: {payload}")
+                return
+            if kind == "ready":
+                continue
+            with self._lock:
+                call = self._calls.get(call_id)
+                if call is None:
+                    continue
+                if kind == "error":
+                    call.error = call.error or payload
+                call.remaining -= 1
+                if call.remaining == 0 or kind == "error":
+                    call.finished.set()
+
+    def _fail_all(self, message: str):
+        with self._lock:
+            self._broken = self._broken or message
+            for call in self._calls.values():
+                call.error = call.error or message
+                call.finished.set()
@@ -0,0 +1,225 @@
+"""
+Dimensionality reduction between the embedding accessor and the vector store.
+
+With EMBEDDING_REDUCTION set, a new store keeps EMBEDDING_REDUCTION_DIM-dimensional
+vectors instead of the model's full ones, which cuts index memory and search cost in
+proportion:
+
+- pca: a PCA projection fitted by docIndex on up to EMBEDDING_REDUCTION_SAMPLE chunks of
+  the documents being indexed
+- matryoshka: the first EMBEDDING_REDUCTION_DIM components, re-normalized; only for
+  models trained with Matryoshka representation learning (e.g. nomic-embed-text,
+  text-embedding-3-*), whose vector prefixes are embeddings in their own right
+
+The transform is saved in the store directory (reduction.json, plus reduction_pca.npz
+for PCA), and ReducedEmbeddings applies it to document and query vectors alike, so
+searches always compare vectors of the same space. A saved transform always wins over
+the settings: it is only chosen when a store is created, and changing it means
+rebuilding the store.
+"""
+
+import os
+import json
+from itertools import islice
+import numpy as np
+from plat.embedding.embedding_async import aembed_documents, aembed_query
+from utils import iter_file_chunks, iter_batches
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+REDUCTION_FILE = "reduction.json"
+PCA_FILE = "reduction_pca.npz"
+REDUCTION_METHODS = ("pca", "matryoshka")
+
+
+class EmbeddingReducer:
+    """
+    Linear map from the model's embedding space to a smaller one.
+
+    Args:
+        method: "pca" or "matryoshka"
+        input_dim: Dimension of the model's vectors
+        output_dim: Dimension of the reduced vectors
+        mean: PCA only, the mean of the training vectors
+        components: PCA only, the (output_dim, input_dim) principal axes
+    """
+
+    def __init__(self, method: str, input_dim: int, output_dim: int, mean=None, components=None):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unsupported embedding reduction: {method}")
+        if not 0 < output_dim < input_dim:
+            raise ValueError(f"Reduced dimension {output_dim} must be between 0 and {input_dim}")
+        self.method = method
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.mean = mean
+        self.components = components
+        self.info = {}
+
+    @classmethod
+    def fit_pca(cls, vectors, output_dim: int):
+        """Fit a PCA projection keeping the output_dim directions of largest variance."""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if len(vectors) < output_dim:
+            raise ValueError(f"PCA to {output_dim} dimensions needs at least {output_dim} vectors, got {len(vectors)}")
+        mean = vectors.mean(axis=0)
+        _, singular, axes = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular ** 2
+        reducer = cls(
+            "pca", vectors.shape[1], output_dim,
+            mean=mean.astype(np.float32), components=axes[:output_dim].astype(np.float32),
+        )
+        reducer.info = {
+            "trained_on": len(vectors),
+            "explained_variance": round(float(variance[:output_dim].sum() / variance.sum()), 4),
+        }
+        return reducer
+
+    def transform(self, vectors) -> np.ndarray:
+        """Reduce a (n, input_dim) batch of vectors to (n, output_dim) float32."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[-1] != self.input_dim:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[-1]} does not match the store's reduction "
+                f"input {self.input_dim}; the embedding model changed, rebuild the store"
+            )
+        if self.method == "pca":
+            return (vectors - self.mean) @ self.components.T
+        prefix = vectors[..., :self.output_dim]
+        norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+        return prefix / np.maximum(norms, 1e-12)
+
+    def save(self, store_dir: str, model_name: str = None):
+        """Write the transform into the store directory."""
+        os.makedirs(store_dir, exist_ok=True)
+        if self.method == "pca":
+            np.savez(os.path.join(store_dir, PCA_FILE), mean=self.mean, components=self.components)
+        data = {
+            "method": self.method,
+            "input_dim": self.input_dim,
+            "output_dim": self.output_dim,
+            "model": model_name,
+            **self.info,
+        }
+        path = os.path.join(store_dir, REDUCTION_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, store_dir: str):
+        """Return the transform saved in the store directory, or None if the store keeps full vectors."""
+        path = os.path.join(store_dir, REDUCTION_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        mean = components = None
+        if data["method"] == "pca":
+            with np.load(os.path.join(store_dir, PCA_FILE)) as arrays:
+                mean, components = arrays["mean"], arrays["components"]
+        reducer = cls(data["method"], data["input_dim"], data["output_dim"], mean=mean, components=components)
+        reducer.info = {key: value for key, value in data.items() if key in ("model", "trained_on", "explained_variance")}
+        return reducer
+
+
+class ReducedEmbeddings:
+    """
+    Embedding accessor that applies a store's reduction to every vector it returns.
+
+    Args:
+        embedding_accessor: The accessor producing full-size vectors
+        reducer: The store's EmbeddingReducer
+    """
+
+    def __init__(self, embedding_accessor, reducer: EmbeddingReducer):
+        self.embedding_accessor = embedding_accessor
+        self.reducer = reducer
+
+    def embed_documents(self, texts: list[str]):
+        if not len(texts):
+            return np.zeros((0, self.reducer.output_dim), dtype=np.float32)
+        return self.reducer.transform(self.embedding_accessor.embed_documents(texts))
+
+    def embed_query(self, text: str):
+        return self.reducer.transform(self.embedding_accessor.embed_query(text))
+
+    async def aembed_documents(self, texts: list[str]):
+        if not len(texts):
+            return np.zeros((0, self.reducer.output_dim), dtype=np.float32)
+        return self.reducer.transform(await aembed_documents(self.embedding_accessor, texts))
+
+    async def aembed_query(self, text: str):
+        return self.reducer.transform(await aembed_query(self.embedding_accessor, text))
+
+
+def with_store_reduction(embedding_accessor, store_dir: str):
+    """Wrap the accessor in the store's saved reduction, or return it as is if the store has none."""
+    reducer = EmbeddingReducer.load(store_dir)
+    if reducer is None:
+        return embedding_accessor
+    model = reducer.info.get("model")
+    if model and model != config.EMBEDDING_MODEL_NAME:
+        logger.warning(f"Store reduction was fitted for {model}, not {config.EMBEDDING_MODEL_NAME}")
+    return ReducedEmbeddings(embedding_accessor, reducer)
+
+
+def create_store_reduction(embedding_accessor, store_dir: str, files: list[str]):
+    """
+    Choose the reduction for a new store from the settings and save it in store_dir.
+
+    For PCA the documents are chunked and embedded until EMBEDDING_REDUCTION_SAMPLE chunks
+    are collected; through the embedding cache those vectors are reused by the build.
+
+    Returns:
+        The EmbeddingReducer, or None if reduction is off or there was too little text to fit PCA
+    """
+    method = config.EMBEDDING_REDUCTION.lower()
+    if method in ("", "none"):
+        return None
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"Unsupported embedding reduction: {method}")
+
+    input_dim = len(embedding_accessor.embed_query("dimension probe"))
+    output_dim = config.EMBEDDING_REDUCTION_DIM or input_dim // 2
+    if method == "matryoshka":
+        reducer = EmbeddingReducer("matryoshka", input_dim, output_dim)
+    else:
+        sample = _embed_sample(embedding_accessor, files, max(config.EMBEDDING_REDUCTION_SAMPLE, output_dim))
+        if len(sample) < output_dim:
+            logger.warning(
+                f"Only {len(sample)} chunks to fit PCA to {output_dim} dimensions, "
+                f"keeping full {input_dim}-dimensional vectors"
+            )
+            return None
+        reducer = EmbeddingReducer.fit_pca(sample, output_dim)
+
+    reducer.save(store_dir, config.EMBEDDING_MODEL_NAME)
+    logger.info(
+        f"Embedding reduction {method}: {input_dim} -> {output_dim} dimensions"
+        + (f", {reducer.info['explained_variance']:.1%} of the variance kept" if method == "pca" else "")
+    )
+    return reducer
+
+
+def _embed_sample(embedding_accessor, files: list[str], sample_size: int) -> np.ndarray:
+    """Embed up to sample_size chunks, a few from each file so the sample spans the corpus."""
+    per_file = max(1, -(-sample_size // max(1, len(files))))
+
+    def texts():
+        for file in files:
+            chunks = iter_file_chunks(file, config.MAX_CHUNK_SIZE, config.CHUNK_OVERLAP)
+            for chunk in islice(chunks, per_file):
+                yield chunk["text"]
+
+    vectors = []
+    collected = 0
+    for batch in iter_batches(texts(), config.INDEX_EMBED_BATCH_SIZE):
+        batch = batch[:sample_size - collected]
+        vectors.append(np.asarray(embedding_accessor.embed_documents(batch), dtype=np.float32))
+        collected += len(batch)
+        if collected >= sample_size:
+            break
+    return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
@@ -1,30 +1,103 @@
-import boto3
 import json
-from botocore.exceptions import BotoCoreError, ClientError
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError, ConnectionError as BotoConnectionError
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Error codes Bedrock returns when the account or model is over its quota
+_THROTTLING_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class _AdaptiveLimit:
+    """
+    Number of requests allowed in flight, adjusted to the service's throttling.
+
+    Starts at the configured concurrency, halves on every throttled request and
+    grows back by one after each run of successful requests, so a pool that
+    outruns the quota settles just below it instead of retrying in a loop.
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self.limit = maximum
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def throttled(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+    def succeeded(self):
+        with self._condition:
+            self._successes += 1
+            if self.limit < self.maximum and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
 
 
 class BedrockEmbeddings:
     """
     Pure Python implementation of AWS Bedrock embeddings without LangChain.
+
+    invoke_model takes a single text, so embed_documents() keeps up to
+    BEDROCK_EMBEDDING_CONCURRENCY requests in flight, retries throttled requests with
+    jittered exponential backoff and returns the vectors in input order. Pass `client`
+    to use an existing (or stubbed) bedrock-runtime client.
     """
 
-    def __init__(self, credentials_profile_name: str = "default", region_name: str = "us-east-1"):
+    def __init__(self, credentials_profile_name: str = "default", region_name: str = "us-east-1", client=None):
         self.region_name = region_name
         self.model_id = "amazon.titan-embed-text-v1"  # Default Titan embedding model
+        self.concurrency = max(1, config.BEDROCK_EMBEDDING_CONCURRENCY)
+        self.max_retries = max(0, config.BEDROCK_EMBEDDING_MAX_RETRIES)
+        self.limit = _AdaptiveLimit(self.concurrency)
 
+        if client is not None:
+            self.client = client
+            return
         try:
             session = boto3.Session(profile_name=credentials_profile_name, region_name=region_name)
-            self.client = session.client("bedrock-runtime")
+            self.client = session.client(
+                "bedrock-runtime",
+                # one connection per worker; throttling is retried here, paced with the other workers
+                config=BotoConfig(max_pool_connections=self.concurrency, retries={"total_max_attempts": 1, "mode": "standard"}),
+            )
         except Exception as e:
             raise Exception(f"Failed to initialize Bedrock client: {e}")
 
     def embed_documents(self, texts: list[str]):
-        """Embed multiple documents."""
-        embeddings = []
-        for text in texts:
-            embedding = self.embed_query(text)
-            embeddings.append(embedding)
-        return embeddings
+        """Embed multiple documents concurrently, in input order."""
+        if len(texts) <= 1 or self.concurrency == 1:
+            return [self.embed_query(text) for text in texts]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(texts))) as pool:
+            return list(pool.map(self.embed_query, texts))
 
     def embed_query(self, text: str):
         """Embed a single query."""
@@ -32,18 +105,36 @@ class BedrockEmbeddings:
             "inputText": text
         })
 
-        try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=body,
-                contentType="application/json",
-                accept="application/json"
-            )
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limit:
+                    response = self.client.invoke_model(
+                        modelId=self.model_id,
+                        body=body,
+                        contentType="application/json",
+                        accept="application/json"
+                    )
+                    response_body = json.loads(response["body"].read())
+                self.limit.succeeded()
+                return response_body["embedding"]
 
-            response_body = json.loads(response["body"].read())
-            return response_body["embedding"]
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in _THROTTLING_CODES or attempt == self.max_retries:
+                    raise Exception(f"Bedrock API error: {e}")
+                self.limit.throttled()
+                self._wait(attempt, f"throttled ({e.response['Error']['Code']})")
+            except BotoConnectionError as e:
+                if attempt == self.max_retries:
+                    raise Exception(f"Bedrock API error: {e}")
+                self._wait(attempt, f"failed ({e})")
+            except BotoCoreError as e:
+                raise Exception(f"Bedrock API error: {e}")
+            except (KeyError, json.JSONDecodeError) as e:
+                raise Exception(f"Invalid response from Bedrock API: {e}")
 
-        except ClientError as e:
-            raise Exception(f"Bedrock API error: {e}")
-        except (KeyError, json.JSONDecodeError) as e:
-            raise Exception(f"Invalid response from Bedrock API: {e}")
\ No newline at end of file
+    @staticmethod
+    def _wait(attempt: int, reason: str):
+        """Exponential backoff with full jitter: up to 0.5s, 1s, 2s ... capped at 20s."""
+        delay = random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+        logger.warning(f"Bedrock embedding request {reason}, retrying in {delay:.2f}s")
+        time.sleep(delay)
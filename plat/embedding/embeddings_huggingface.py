@@ -1,19 +1,138 @@
+"""
+Local SentenceTransformer embeddings, on PyTorch or an ONNX Runtime backend.
+
+LOCAL_EMBEDDING_BACKEND=onnx exports the model to ONNX once (optionally with dynamic
+int8 quantization, LOCAL_EMBEDDING_QUANTIZE) into LOCAL_EMBEDDING_ONNX_DIR and runs it
+with ONNX Runtime, which is several times faster than PyTorch on CPU. Right after the
+export the ONNX vectors are compared with the PyTorch ones on a fixed sample; if their
+cosine similarity falls below LOCAL_EMBEDDING_PARITY_MIN_COSINE the exported model is
+not used and the provider stays on PyTorch. The result is kept next to the export, so
+the check runs once per model and variant.
+
+The ONNX backend needs sentence-transformers>=3.2 and optimum[onnxruntime].
+"""
+
+import os
+import re
+import json
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# texts of varied length and content for the ONNX/PyTorch parity check
+_PARITY_SAMPLE = [
+    "hello",
+    "How do I rebuild the vector store after changing the embedding model?",
+    "def chunk_a_file(file, max, overlap):\n    return chunk_a_text_file(file, max, overlap)",
+    "The quarterly report lists revenue, operating costs and net income by region, "
+    "with a breakdown of the top ten customers and the changes since the previous quarter.",
+    "Konfigurationsdatei: Zeitüberschreitung der Verbindung nach 30 Sekunden.",
+    "表格中的数据按月份汇总。",
+    " ".join(["lorem ipsum dolor sit amet"] * 60),
+]
 
 
 class SentenceTransformerEmbeddings:
     """
     class that implements two methods to be called from Chroma
+
+    Args:
+        model: Name or path of the SentenceTransformer model
+        backend: "torch" or "onnx" (default LOCAL_EMBEDDING_BACKEND)
+        quantize: int8 quantization target for the ONNX export, e.g. "avx2", "avx512_vnni"
+            or "arm64"; empty for a float32 export (default LOCAL_EMBEDDING_QUANTIZE)
+        batch_size: Texts per forward pass (default LOCAL_EMBEDDING_BATCH_SIZE)
     """
 
-    def __init__(self, model: str):
+    def __init__(self, model: str, backend: str = None, quantize: str = None, batch_size: int = None):
         self.model = model
-        self.embedder = SentenceTransformer(model, device="cpu")
+        self.batch_size = max(1, batch_size or config.LOCAL_EMBEDDING_BATCH_SIZE)
+        backend = (backend or config.LOCAL_EMBEDDING_BACKEND).lower()
+        quantize = (config.LOCAL_EMBEDDING_QUANTIZE if quantize is None else quantize).lower()
+
+        # what the vectors were computed with, so caches keep the variants apart
+        self.variant = None
+        if backend == "onnx":
+            self.embedder = _load_onnx_model(model, quantize)
+            if self.embedder is not None:
+                self.variant = f"onnx-{quantize}" if quantize else "onnx"
+        elif backend != "torch":
+            raise ValueError(f"Unsupported local embedding backend: {backend}")
+        if self.variant is None:
+            self.embedder = SentenceTransformer(model, device="cpu")
 
     def embed_documents(self, texts: list[str]):
-        vectors = self.embedder.encode(texts, batch_size=2)
+        # encode() sorts the texts by length before batching, so each batch pads to
+        # similar lengths, and returns the vectors in input order
+        vectors = self.embedder.encode(texts, batch_size=self.batch_size)
         return vectors
 
     def embed_query(self, text: str):
         vectors = self.embedder.encode([text])
         return vectors[0]
+
+
+def _load_onnx_model(model: str, quantize: str):
+    """Load the model's ONNX export, creating and checking it on first use; None if it failed parity."""
+    export_dir = os.path.join(config.LOCAL_EMBEDDING_ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model))
+    file_name = f"onnx/model_qint8_{quantize}.onnx" if quantize else "onnx/model.onnx"
+    parity_path = os.path.join(export_dir, f"parity-{quantize or 'fp32'}.json")
+
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        _export_onnx_model(model, quantize, export_dir)
+
+    onnx_model = SentenceTransformer(export_dir, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+
+    if not os.path.exists(parity_path):
+        reference = SentenceTransformer(model, device="cpu")
+        min_cosine = parity_check(reference, onnx_model)
+        with open(parity_path, "w", encoding="utf-8") as f:
+            json.dump({"model": model, "file_name": file_name, "min_cosine": min_cosine}, f)
+    else:
+        with open(parity_path, "r", encoding="utf-8") as f:
+            min_cosine = json.load(f)["min_cosine"]
+
+    if min_cosine < config.LOCAL_EMBEDDING_PARITY_MIN_COSINE:
+        logger.warning(
+            f"ONNX export {file_name} of {model} drifts from PyTorch (min cosine {min_cosine:.4f} < "
+            f"{config.LOCAL_EMBEDDING_PARITY_MIN_COSINE}), using the PyTorch backend"
+        )
+        return None
+    logger.info(f"Using ONNX export {file_name} of {model} (min cosine vs PyTorch {min_cosine:.4f})")
+    return onnx_model
+
+
+def _export_onnx_model(model: str, quantize: str, export_dir: str):
+    """Export the model to ONNX under export_dir, plus an int8 quantized copy if asked."""
+    try:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+    except ImportError as e:
+        raise ImportError(
+            "LOCAL_EMBEDDING_BACKEND=onnx needs sentence-transformers>=3.2 and optimum[onnxruntime]"
+        ) from e
+
+    logger.info(f"Exporting {model} to ONNX in {export_dir}")
+    os.makedirs(export_dir, exist_ok=True)
+    onnx_model = SentenceTransformer(model, device="cpu", backend="onnx")
+    onnx_model.save_pretrained(export_dir)
+    if quantize:
+        logger.info(f"Quantizing the ONNX export of {model} to int8 for {quantize}")
+        export_dynamic_quantized_onnx_model(onnx_model, quantize, export_dir)
+
+
+def parity_check(reference, candidate, texts: list[str] = None) -> float:
+    """
+    Compare two embedders on the same texts.
+
+    Returns:
+        The lowest cosine similarity between corresponding vectors
+    """
+    texts = texts or _PARITY_SAMPLE
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    actual = np.asarray(candidate.encode(texts), dtype=np.float32)
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosines = np.sum(expected * actual, axis=1) / np.maximum(norms, 1e-12)
+    return float(cosines.min())
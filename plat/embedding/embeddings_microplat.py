@@ -1,8 +1,9 @@
 import os
 import json
-import requests
 import numpy as np
 from dotenv import load_dotenv
+from config import config
+from plat.http_transport import get_transport, get_async_transport
 
 load_dotenv()
 EMBEDDING_API_URL = os.getenv("EMBEDDING_API_URL")
@@ -38,7 +39,8 @@ class PlatServedEmbeddings:
             np.ndarray: Array of embedding vectors.
         """
         payload = {"model": self.model, "input": texts}
-        response = requests.post(self.api_endpoint, json=payload)
+        response = get_transport().post(self.api_endpoint, json=payload, timeout=config.PLAT_EMBEDDING_TIMEOUT)
+        response.raise_for_status()
         vectors = response.json()["embeddings"]
         return np.array(vectors)
 
@@ -53,7 +55,20 @@ class PlatServedEmbeddings:
             np.ndarray: The embedding vector for the query.
         """
         payload = {"model": self.model, "input": [text]}
-        response = requests.post(self.api_endpoint, json=payload)
+        response = get_transport().post(self.api_endpoint, json=payload, timeout=config.PLAT_EMBEDDING_TIMEOUT)
+        response.raise_for_status()
         vectors = response.json()["embeddings"]
         return np.array(vectors)[0]
-    
\ No newline at end of file
+    
+
+    async def aembed_documents(self, texts: list[str]) -> np.ndarray:
+        """Coroutine version of embed_documents(), on the shared async connection pool."""
+        payload = {"model": self.model, "input": texts}
+        response = await get_async_transport().post(self.api_endpoint, json=payload, timeout=config.PLAT_EMBEDDING_TIMEOUT)
+        response.raise_for_status()
+        vectors = response.json()["embeddings"]
+        return np.array(vectors)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Coroutine version of embed_query()."""
+        return (await self.aembed_documents([text]))[0]
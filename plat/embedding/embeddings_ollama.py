@@ -1,23 +1,47 @@
+import asyncio
+import httpx
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from config import config
+from plat.http_transport import get_transport, get_async_transport
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# statuses with which the server rejects what is in a batch, e.g. an input over the context length
+_REJECTED_STATUSES = (400, 413)
+
+
+class _BatchRejected(Exception):
+    """The server rejected the inputs of a batch; the same inputs in smaller batches may pass."""
 
 
 class OllamaEmbeddings:
     """
     Pure Python implementation of Ollama embeddings without LangChain.
+
+    embed_documents() sends OLLAMA_EMBEDDING_BATCH_SIZE texts per /api/embed request and
+    keeps up to OLLAMA_EMBEDDING_CONCURRENCY requests in flight. A batch the server
+    rejects with 400 or 413 is split in halves and retried, so one bad input only fails
+    on its own; timeouts, other errors and bad responses fail the call at once.
+    aembed_documents() does the same on the shared async connection pool.
     """
 
     def __init__(self, model: str):
         self.model = model
         self.api_url = config.EMBEDDING_API_URL.rstrip('/') + "/api/embed"
+        self.batch_size = max(1, config.OLLAMA_EMBEDDING_BATCH_SIZE)
+        self.concurrency = max(1, config.OLLAMA_EMBEDDING_CONCURRENCY)
 
     def embed_documents(self, texts: list[str]):
-        """Embed multiple documents."""
-        embeddings = []
-        for text in texts:
-            embedding = self.embed_query(text)
-            embeddings.append(embedding)
-        return embeddings
+        """Embed multiple documents in batched requests."""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.concurrency == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        return [embedding for result in results for embedding in result]
 
     def embed_query(self, text: str):
         """Embed a single query."""
@@ -27,11 +51,89 @@ class OllamaEmbeddings:
         }
 
         try:
-            response = requests.post(self.api_url, json=payload, timeout=config.OLLAMA_EMBEDDING_TIMEOUT)
+            response = get_transport().post(self.api_url, json=payload, timeout=config.OLLAMA_EMBEDDING_TIMEOUT)
             response.raise_for_status()
             result = response.json()
             return result["embeddings"][0]
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama embedding API request failed: {e}")
         except (KeyError, IndexError) as e:
-            raise Exception(f"Invalid response from Ollama embedding API: {e}")
\ No newline at end of file
+            raise Exception(f"Invalid response from Ollama embedding API: {e}")
+
+    def _embed_batch(self, texts: list[str]):
+        """Embed one batch, splitting it in halves when the server rejects its inputs."""
+        try:
+            return self._post_batch(texts)
+        except _BatchRejected as e:
+            if len(texts) == 1:
+                raise Exception(f"Ollama embedding API request failed: {e}")
+            logger.warning(f"Ollama rejected an embedding batch of {len(texts)}, retrying in halves: {e}")
+            middle = len(texts) // 2
+            return self._embed_batch(texts[:middle]) + self._embed_batch(texts[middle:])
+
+    def _post_batch(self, texts: list[str]):
+        payload = {
+            "model": self.model,
+            "input": texts
+        }
+
+        try:
+            response = get_transport().post(self.api_url, json=payload, timeout=config.OLLAMA_EMBEDDING_TIMEOUT)
+            if response.status_code in _REJECTED_STATUSES:
+                raise _BatchRejected(f"{response.status_code} {response.text}")
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Ollama embedding API request failed: {e}")
+        except (KeyError, ValueError) as e:
+            raise Exception(f"Invalid response from Ollama embedding API: {e}")
+
+        if len(embeddings) != len(texts):
+            raise Exception(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs")
+        return embeddings
+
+    async def aembed_documents(self, texts: list[str]):
+        """Coroutine version of embed_documents(), with the same batching and concurrency."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._aembed_batch(batch, semaphore) for batch in batches))
+        return [embedding for result in results for embedding in result]
+
+    async def aembed_query(self, text: str):
+        """Coroutine version of embed_query()."""
+        return (await self._aembed_batch([text], asyncio.Semaphore(1)))[0]
+
+    async def _aembed_batch(self, texts: list[str], semaphore: asyncio.Semaphore):
+        try:
+            async with semaphore:
+                return await self._apost_batch(texts)
+        except _BatchRejected as e:
+            if len(texts) == 1:
+                raise Exception(f"Ollama embedding API request failed: {e}")
+            logger.warning(f"Ollama rejected an embedding batch of {len(texts)}, retrying in halves: {e}")
+            middle = len(texts) // 2
+            halves = await asyncio.gather(
+                self._aembed_batch(texts[:middle], semaphore), self._aembed_batch(texts[middle:], semaphore)
+            )
+            return halves[0] + halves[1]
+
+    async def _apost_batch(self, texts: list[str]):
+        payload = {
+            "model": self.model,
+            "input": texts
+        }
+
+        try:
+            response = await get_async_transport().post(self.api_url, json=payload, timeout=config.OLLAMA_EMBEDDING_TIMEOUT)
+            if response.status_code in _REJECTED_STATUSES:
+                raise _BatchRejected(f"{response.status_code} {response.text}")
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama embedding API request failed: {e}")
+        except (KeyError, ValueError) as e:
+            raise Exception(f"Invalid response from Ollama embedding API: {e}")
+
+        if len(embeddings) != len(texts):
+            raise Exception(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs")
+        return embeddings
@@ -1,19 +1,238 @@
-from openai import OpenAI
+import re
+import time
+import random
+import asyncio
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from openai import OpenAI, AsyncOpenAI
+from config import config
+from logger import get_logger
+from plat.http_transport import get_async_transport
+
+logger = get_logger(__name__)
+
+# Rough tokens-per-character ratio used to pack requests without a tokenizer; it
+# overestimates English text, so packed requests stay under the token budget
+_CHARS_PER_TOKEN = 3
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def _parse_duration(value: str):
+    """Parse a rate-limit reset header such as "1s", "6m0s" or "20ms" into seconds."""
+    if not value:
+        return None
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class _RateLimitScheduler:
+    """
+    Shared pacing for concurrent embedding requests.
+
+    Tracks the remaining requests and tokens reported in the x-ratelimit-* response
+    headers and holds new requests back until the window resets once either runs out.
+    A 429 pauses every request for the server's retry-after delay.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self._remaining_requests = None
+        self._remaining_tokens = None
+        self._requests_reset_at = 0.0
+        self._tokens_reset_at = 0.0
+
+    def acquire(self, tokens: int):
+        """Wait until a request of about `tokens` tokens may be sent, then account for it."""
+        while (delay := self._reserve(tokens)) > 0:
+            time.sleep(delay)
+
+    async def aacquire(self, tokens: int):
+        """Coroutine version of acquire()."""
+        while (delay := self._reserve(tokens)) > 0:
+            await asyncio.sleep(delay)
+
+    def _reserve(self, tokens: int) -> float:
+        """Account for the request and return 0, or return how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._resume_at - now
+            if delay <= 0 and self._remaining_requests is not None and self._remaining_requests <= 0:
+                delay = self._requests_reset_at - now
+            if delay <= 0 and self._remaining_tokens is not None and self._remaining_tokens < tokens:
+                delay = self._tokens_reset_at - now
+            if delay <= 0:
+                if self._remaining_requests is not None:
+                    self._remaining_requests -= 1
+                if self._remaining_tokens is not None:
+                    self._remaining_tokens -= tokens
+                return 0
+            return delay
+
+    def update(self, headers):
+        """Refresh the limits from a response's rate-limit headers."""
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_requests = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+        reset_tokens = _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        with self._lock:
+            now = time.monotonic()
+            if remaining_requests is not None and reset_requests is not None:
+                self._remaining_requests = int(remaining_requests)
+                self._requests_reset_at = now + reset_requests
+            if remaining_tokens is not None and reset_tokens is not None:
+                self._remaining_tokens = int(remaining_tokens)
+                self._tokens_reset_at = now + reset_tokens
+
+    def pause(self, seconds: float):
+        """Hold back every request for the given number of seconds."""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            # the counters are stale after a 429; trust the next response's headers
+            self._remaining_requests = None
+            self._remaining_tokens = None
+
 
 class OpenAIEmbeddings:
     """
     class that implements two methods to be called from Chroma
+
+    embed_documents() packs texts into requests of at most OPENAI_EMBEDDING_BATCH_SIZE
+    inputs and OPENAI_EMBEDDING_MAX_TOKENS estimated tokens, sends up to
+    OPENAI_EMBEDDING_CONCURRENCY of them at a time, paces them by the rate-limit headers
+    and retries 429s and transient errors with backoff. aembed_documents() does the same
+    with coroutines on the shared async connection pool.
     """
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, model: str = None, base_url: str = None):
+        self.model = model or config.EMBEDDING_MODEL_NAME
+        # retries are handled here, where they can be paced with the other requests
+        self.api_key = api_key
+        self.base_url = base_url or config.OPENAI_EMBEDDING_BASE_URL
+        self.client = OpenAI(api_key=api_key, base_url=self.base_url, max_retries=0)
+        self._async_clients = weakref.WeakKeyDictionary()  # AsyncHttpTransport -> AsyncOpenAI
+        self.batch_size = max(1, config.OPENAI_EMBEDDING_BATCH_SIZE)
+        self.max_tokens = max(1, config.OPENAI_EMBEDDING_MAX_TOKENS)
+        self.concurrency = max(1, config.OPENAI_EMBEDDING_CONCURRENCY)
+        self.max_retries = max(0, config.OPENAI_EMBEDDING_MAX_RETRIES)
+        self.scheduler = _RateLimitScheduler()
 
     def embed_documents(self, texts: list[str]):
-        embeddings = []
-        for text in texts:
-            response = self.client.embeddings.create(input=text, model="text-embedding-3-small")
-            embeddings.append(response.data[0].embedding)
-        return embeddings
+        batches = self._pack(texts)
+        if len(batches) <= 1 or self.concurrency == 1:
+            results = [self._embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                results = list(pool.map(self._embed_batch, batches))
+        return [embedding for result in results for embedding in result]
 
     def embed_query(self, text: str):
-        response = self.client.embeddings.create(input=text, model="text-embedding-3-small")
-        return response.data[0].embedding
\ No newline at end of file
+        return self._embed_batch([text])[0]
+
+    async def aembed_documents(self, texts: list[str]):
+        """Coroutine version of embed_documents(), with the same packing, pacing and retries."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def embed(batch):
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(embed(batch) for batch in self._pack(texts)))
+        return [embedding for result in results for embedding in result]
+
+    async def aembed_query(self, text: str):
+        return (await self._aembed_batch([text]))[0]
+
+    def _pack(self, texts: list[str]):
+        """Split texts into consecutive batches within the input count and token budget."""
+        batches, batch, batch_tokens = [], [], 0
+        for text in texts:
+            tokens = _estimate_tokens(text)
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, texts: list[str]):
+        """Embed one packed batch, waiting for the rate limit and retrying throttled requests."""
+        tokens = sum(_estimate_tokens(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            self.scheduler.acquire(tokens)
+            try:
+                raw = self.client.embeddings.with_raw_response.create(input=texts, model=self.model)
+            except _RETRYABLE as e:
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+            return self._parse(raw)
+
+    async def _aembed_batch(self, texts: list[str]):
+        """Coroutine version of _embed_batch()."""
+        tokens = sum(_estimate_tokens(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.aacquire(tokens)
+            try:
+                raw = await self._async_client().embeddings.with_raw_response.create(input=texts, model=self.model)
+            except _RETRYABLE as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            return self._parse(raw)
+
+    def _async_client(self) -> AsyncOpenAI:
+        """The AsyncOpenAI client on the running event loop's shared connection pool."""
+        transport = get_async_transport()
+        client = self._async_clients.get(transport)
+        if client is None:
+            client = self._async_clients[transport] = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, http_client=transport.client
+            )
+        return client
+
+    def _parse(self, raw):
+        self.scheduler.update(raw.headers)
+        response = raw.parse()
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to sleep before retrying a failed request; re-raises once retries run out."""
+        if attempt == self.max_retries:
+            raise error
+        if isinstance(error, openai.RateLimitError):
+            delay = self._retry_after(error.response.headers) or self._backoff(attempt)
+            logger.warning(f"OpenAI embeddings rate limited, retrying in {delay:.2f}s")
+            # every request waits out the pause in acquire()
+            self.scheduler.pause(delay)
+            return 0
+        delay = self._backoff(attempt)
+        logger.warning(f"OpenAI embeddings request failed ({error}), retrying in {delay:.2f}s")
+        return delay
+
+    @staticmethod
+    def _retry_after(headers):
+        """Delay requested by a 429 response, in seconds, if it gave one."""
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        return _parse_duration(headers.get("retry-after"))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff with full jitter: up to 0.5s, 1s, 2s ... capped at 30s."""
+        return random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
@@ -0,0 +1,214 @@
+"""
+Query embedding cache in front of embed_query().
+
+Every /query embeds the question before searching, and repeated questions are common.
+CachedQueryEmbeddings keeps the query vectors of each model in a bounded in-process LRU
+(QUERY_CACHE_SIZE entries, each valid for QUERY_CACHE_TTL_SECONDS), keyed by model name
+and normalized query text, so a repeated question skips the embedding round trip.
+
+With QUERY_CACHE_DB set, misses fall back to a SQLite file shared by every process
+serving queries (e.g. several web workers) before calling the provider, and new vectors
+are written to it; it is kept under QUERY_CACHE_DB_MAX_ENTRIES by dropping the oldest.
+A failing database only costs the provider call, never the query.
+
+The LRU lives at module level, one per model, so it outlives the accessors that
+initialize_components() creates on every page load. query_cache_stats() reports the hit
+rates.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from plat.embedding.embedding_cache import _normalize_text
+from plat.embedding.embedding_async import aembed_documents, aembed_query
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# inserts between two prunings of the database
+_PRUNE_EVERY = 256
+
+
+class _QueryStore:
+    """The LRU (and optional SQLite store) of one model's query vectors."""
+
+    def __init__(self, model_name: str, max_entries: int, ttl: float, db_path: str = None, db_max_entries: int = 0):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+        self.stats = {"hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._entries = OrderedDict()  # key -> (expires, vector)
+        self._lock = threading.Lock()
+        self._db = None
+        self._inserts = 0
+
+    def key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(_normalize_text(text).encode("utf-8"))
+        return digest.digest()
+
+    def get(self, key: bytes):
+        """Return the cached vector for the key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self.stats["expired"] += 1
+            if self.db_path:
+                found = self._db_get(key, now)
+                if found is not None:
+                    self._remember(key, *found)
+                    self.stats["db_hits"] += 1
+                    return found[1]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: bytes, vector):
+        vector = np.array(vector, dtype=np.float32)
+        expires = time.time() + self.ttl if self.ttl > 0 else float("inf")
+        with self._lock:
+            self._remember(key, expires, vector)
+            if self.db_path:
+                self._db_put(key, expires, vector)
+        return vector
+
+    def summary(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["db_hits"] + self.stats["misses"]
+            hits = self.stats["hits"] + self.stats["db_hits"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, key: bytes, expires: float, vector):
+        self._entries[key] = (expires, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # --- shared SQLite store; errors are logged and treated as misses ---
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, expires REAL NOT NULL, created REAL NOT NULL)"
+            )
+        return self._db
+
+    def _db_get(self, key: bytes, now: float):
+        try:
+            row = self._connect().execute(
+                "SELECT expires, vector FROM query_embeddings WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache database lookup failed: {e}")
+            return None
+        if row is None:
+            return None
+        return row[0], np.frombuffer(row[1], dtype=np.float32)
+
+    def _db_put(self, key: bytes, expires: float, vector):
+        try:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, expires, created) VALUES (?, ?, ?, ?)",
+                (key, vector.tobytes(), expires, time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % _PRUNE_EVERY == 0:
+                db.execute("DELETE FROM query_embeddings WHERE expires <= ?", (time.time(),))
+                if self.db_max_entries > 0:
+                    db.execute(
+                        "DELETE FROM query_embeddings WHERE key IN (SELECT key FROM query_embeddings "
+                        "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.db_max_entries,),
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache database update failed: {e}")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(model_name: str) -> _QueryStore:
+    with _stores_lock:
+        store = _stores.get(model_name)
+        if store is None:
+            store = _stores[model_name] = _QueryStore(
+                model_name,
+                max_entries=config.QUERY_CACHE_SIZE,
+                ttl=config.QUERY_CACHE_TTL_SECONDS,
+                db_path=config.QUERY_CACHE_DB or None,
+                db_max_entries=config.QUERY_CACHE_DB_MAX_ENTRIES,
+            )
+        return store
+
+
+def query_cache_stats() -> dict:
+    """Hit/miss counts, entries and hit rate of each model's query cache in this process."""
+    with _stores_lock:
+        stores = list(_stores.values())
+    return {store.model_name: store.summary() for store in stores}
+
+
+class CachedQueryEmbeddings:
+    """
+    Embedding accessor that answers repeated queries from the query cache.
+
+    Documents are passed straight to the wrapped accessor.
+
+    Args:
+        embedding_accessor: The accessor to wrap
+        model_name: Name of the embedding model, part of every cache key
+    """
+
+    def __init__(self, embedding_accessor, model_name: str):
+        self.embedding_accessor = embedding_accessor
+        self.store = _get_store(model_name)
+
+    def embed_documents(self, texts: list[str]):
+        return self.embedding_accessor.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        """Embed a query, calling the provider only if it is not cached."""
+        key = self.store.key(text)
+        vector = self.store.get(key)
+        if vector is None:
+            vector = self.store.put(key, self.embedding_accessor.embed_query(text))
+        return vector.copy()
+
+    async def aembed_documents(self, texts: list[str]):
+        return await aembed_documents(self.embedding_accessor, texts)
+
+    async def aembed_query(self, text: str):
+        key = self.store.key(text)
+        vector = self.store.get(key)
+        if vector is None:
+            vector = self.store.put(key, await aembed_query(self.embedding_accessor, text))
+        return vector.copy()
+
+    def close(self):
+        if hasattr(self.embedding_accessor, "close"):
+            self.embedding_accessor.close()
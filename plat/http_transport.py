@@ -0,0 +1,231 @@
+"""
+Shared HTTP transport for the plat and Ollama embedding and LLM clients.
+
+Every request to a host goes through one requests.Session with a pooled, keep-alive
+HTTPAdapter, so consecutive embedding and generation calls reuse their TCP (and TLS)
+connections instead of opening a new one each time. Sessions are kept per host and per
+process; a forked worker opens its own rather than sharing sockets with its parent.
+
+Coroutine callers use AsyncHttpTransport instead: one httpx.AsyncClient per event loop,
+whose pool of up to HTTP_ASYNC_MAX_CONNECTIONS connections is shared by every async
+accessor (the OpenAI and Anthropic SDK clients included), so hundreds of concurrent
+provider calls need neither hundreds of threads nor hundreds of handshakes.
+
+Each call's latency is recorded per host and path; stats() returns the counts, errors
+and latency percentiles for instrumentation, async calls included.
+"""
+
+import os
+import time
+import weakref
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# latency samples kept per endpoint for the percentiles
+_SAMPLES = 1024
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = deque(maxlen=_SAMPLES)
+
+    def record(self, seconds: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "mean_ms": round(1000 * self.total_seconds / self.calls, 1) if self.calls else 0.0,
+            "p50_ms": round(1000 * percentile(0.5), 1),
+            "p95_ms": round(1000 * percentile(0.95), 1),
+            "max_ms": round(1000 * self.max_seconds, 1),
+        }
+
+
+class HttpTransport:
+    """
+    Pooled keep-alive sessions, one per host, with per-call latency statistics.
+
+    Args:
+        pool_maxsize: Connections kept open per host; match it to the requests in flight
+        connect_timeout: Seconds to wait for a connection before failing the call
+    """
+
+    def __init__(self, pool_maxsize: int = None, connect_timeout: float = None):
+        self.pool_maxsize = max(1, pool_maxsize if pool_maxsize is not None else config.HTTP_POOL_MAXSIZE)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def post(self, url: str, timeout: float = None, **kwargs) -> requests.Response:
+        """
+        POST through the host's pooled session.
+
+        Args:
+            url: Request URL
+            timeout: Seconds to wait for the response once connected
+            **kwargs: Passed on to requests (json, headers ...)
+
+        Raises:
+            requests.exceptions.RequestException: As requests.post would
+        """
+        return self.request("POST", url, timeout=timeout, **kwargs)
+
+    def request(self, method: str, url: str, timeout: float = None, **kwargs) -> requests.Response:
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = self._session(host)
+        failed = True
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=(self.connect_timeout, timeout), **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self._record(host + parts.path, time.perf_counter() - start, failed)
+
+    def stats(self) -> dict:
+        """Per-endpoint call counts, errors and latency percentiles in milliseconds."""
+        with self._lock:
+            return {endpoint: stats.summary() for endpoint, stats in self._stats.items()}
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def _record(self, endpoint: str, seconds: float, failed: bool):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = _EndpointStats()
+            stats.record(seconds, failed)
+        logger.debug(f"{endpoint} {'failed' if failed else 'ok'} in {seconds * 1000:.1f} ms")
+
+
+class AsyncHttpTransport:
+    """
+    Pooled keep-alive httpx.AsyncClient for coroutine callers, bound to one event loop.
+
+    Args:
+        max_connections: Connections open at once across all hosts
+        connect_timeout: Seconds to wait for a connection before failing the call
+        recorder: HttpTransport whose statistics the calls are recorded in
+    """
+
+    def __init__(self, max_connections: int = None, connect_timeout: float = None, recorder: HttpTransport = None):
+        max_connections = max(1, max_connections or config.HTTP_ASYNC_MAX_CONNECTIONS)
+        self.connect_timeout = connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT
+        self.recorder = recorder or get_transport()
+        self._started = weakref.WeakKeyDictionary()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(None, connect=self.connect_timeout),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+
+    async def post(self, url: str, timeout: float = None, **kwargs) -> httpx.Response:
+        """
+        POST through the shared async client.
+
+        Args:
+            url: Request URL
+            timeout: Seconds to wait for the response once connected
+            **kwargs: Passed on to httpx (json, headers ...)
+
+        Raises:
+            httpx.HTTPError: If the request could not be completed
+        """
+        start = time.perf_counter()
+        try:
+            return await self.client.post(url, timeout=httpx.Timeout(timeout, connect=self.connect_timeout), **kwargs)
+        except httpx.HTTPError:
+            parts = urlsplit(url)
+            self.recorder._record(f"{parts.scheme}://{parts.netloc}{parts.path}", time.perf_counter() - start, True)
+            raise
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    # the hooks time every request made through the client, SDK calls included
+
+    async def _on_request(self, request: httpx.Request):
+        self._started[request] = time.perf_counter()
+
+    async def _on_response(self, response: httpx.Response):
+        start = self._started.pop(response.request, None)
+        if start is not None:
+            url = response.request.url
+            self.recorder._record(
+                f"{url.scheme}://{url.netloc.decode('ascii')}{url.path}",
+                time.perf_counter() - start,
+                response.status_code >= 400,
+            )
+
+
+_transport = None
+_transport_pid = None
+_transport_lock = threading.Lock()
+_async_transports = weakref.WeakKeyDictionary()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide HttpTransport."""
+    global _transport, _transport_pid
+    with _transport_lock:
+        if _transport is None or _transport_pid != os.getpid():
+            _transport = HttpTransport()
+            _transport_pid = os.getpid()
+        return _transport
+
+
+def get_async_transport() -> AsyncHttpTransport:
+    """Return the AsyncHttpTransport of the running event loop; call it from a coroutine."""
+    loop = asyncio.get_running_loop()
+    transport = _async_transports.get(loop)
+    if transport is None:
+        transport = _async_transports[loop] = AsyncHttpTransport()
+    return transport
+
+
+async def close_async_transport():
+    """Close the running event loop's AsyncHttpTransport, if it has one."""
+    transport = _async_transports.pop(asyncio.get_running_loop(), None)
+    if transport is not None:
+        await transport.aclose()
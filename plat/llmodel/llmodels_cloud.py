@@ -1,9 +1,13 @@
 from prompt.llm_context_prompt import generate_llm_prompt
 from abc import ABC, abstractmethod
+import asyncio
+import weakref
+import httpx
 import requests
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import anthropic
 from config import config
+from plat.http_transport import get_transport, get_async_transport
 
 # from dotenv import load_dotenv
 
@@ -22,11 +26,20 @@ class LLM(ABC):
     def invoke(self, prompt: str) -> str:
         pass
 
+    async def ainvoke(self, prompt: str) -> str:
+        """Coroutine version of invoke(); runs invoke() on a worker thread unless overridden."""
+        return await asyncio.to_thread(self.invoke, prompt)
+
     def generate_response(self, context: str, question: str) -> str:
         prompt = generate_llm_prompt(context, question)
         response_text = self.invoke(prompt)
         return response_text
 
+    async def agenerate_response(self, context: str, question: str) -> str:
+        prompt = generate_llm_prompt(context, question)
+        response_text = await self.ainvoke(prompt)
+        return response_text
+
 
 class OllamaModel(LLM):
     def __init__(self, model_name: str):
@@ -41,25 +54,54 @@ class OllamaModel(LLM):
         }
 
         try:
-            response = requests.post(self.api_url, json=payload, timeout=config.OLLAMA_LLM_TIMEOUT)
+            response = get_transport().post(self.api_url, json=payload, timeout=config.OLLAMA_LLM_TIMEOUT)
             response.raise_for_status()
             result = response.json()
             return result.get("response", "")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama API request failed: {e}")
 
+    async def ainvoke(self, prompt: str) -> str:
+        payload = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": False
+        }
+
+        try:
+            response = await get_async_transport().post(self.api_url, json=payload, timeout=config.OLLAMA_LLM_TIMEOUT)
+            response.raise_for_status()
+            result = response.json()
+            return result.get("response", "")
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API request failed: {e}")
+
 
 class GPTModel(LLM):
     def __init__(self, model_name: str, api_key: str):
         super().__init__(model_name)
+        self.api_key = api_key
         self.client = OpenAI(api_key=api_key)
+        self._async_clients = weakref.WeakKeyDictionary()  # AsyncHttpTransport -> AsyncOpenAI
 
     def invoke(self, prompt: str) -> str:
+        response = self.client.chat.completions.create(**self._request(prompt))
+        return response.choices[0].message.content.strip()
+
+    async def ainvoke(self, prompt: str) -> str:
+        transport = get_async_transport()
+        client = self._async_clients.get(transport)
+        if client is None:
+            client = self._async_clients[transport] = AsyncOpenAI(api_key=self.api_key, http_client=transport.client)
+        response = await client.chat.completions.create(**self._request(prompt))
+        return response.choices[0].message.content.strip()
+
+    def _request(self, prompt: str) -> dict:
         messages = [
             # {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": prompt}
         ]
-        response = self.client.chat.completions.create(
+        return dict(
             model=self.model_name,
             messages=messages,
             max_tokens=150,
@@ -67,19 +109,37 @@ class GPTModel(LLM):
             stop=None,
             temperature=0.7,
         )
-        return response.choices[0].message.content.strip()
 
 
 class AnthropicModel(LLM):
     def __init__(self, model_name: str, api_key: str):
         super().__init__(model_name)
+        self.api_key = api_key
         self.client = anthropic.Anthropic(api_key=api_key)
+        self._async_clients = weakref.WeakKeyDictionary()  # AsyncHttpTransport -> AsyncAnthropic
 
     def invoke(self, prompt: str) -> str:
         messages = [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
         response = self.client.messages.create(
             model=self.model_name, max_tokens=1000, temperature=0.7, messages=messages
         )
+        return self._text(response)
+
+    async def ainvoke(self, prompt: str) -> str:
+        transport = get_async_transport()
+        client = self._async_clients.get(transport)
+        if client is None:
+            client = self._async_clients[transport] = anthropic.AsyncAnthropic(
+                api_key=self.api_key, http_client=transport.client
+            )
+        messages = [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
+        response = await client.messages.create(
+            model=self.model_name, max_tokens=1000, temperature=0.7, messages=messages
+        )
+        return self._text(response)
+
+    @staticmethod
+    def _text(response) -> str:
         # Extract the plain text from the response content
         text_blocks = response.content
         plain_text = "\n".join(
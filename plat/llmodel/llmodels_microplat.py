@@ -1,8 +1,9 @@
 import os
-import requests
 import numpy as np
 from prompt.llm_context_prompt import generate_llm_prompt
 from dotenv import load_dotenv
+from config import config
+from plat.http_transport import get_transport, get_async_transport
 
 load_dotenv()
 # LLM_MODEL_PROVIDER = os.getenv("LLM_MODEL_PROVIDER")
@@ -23,8 +24,21 @@ class PlatServedModels:
 
     def generate_response(self, context, question):
         prompt = generate_llm_prompt(context, question)
-        response = requests.post(
+        response = get_transport().post(
             self.api_endpoint,
             json={"model": self.model_name, "prompt": prompt, "stream": False},
+            timeout=config.PLAT_LLM_TIMEOUT,
         )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def agenerate_response(self, context, question):
+        """Coroutine version of generate_response(), on the shared async connection pool."""
+        prompt = generate_llm_prompt(context, question)
+        response = await get_async_transport().post(
+            self.api_endpoint,
+            json={"model": self.model_name, "prompt": prompt, "stream": False},
+            timeout=config.PLAT_LLM_TIMEOUT,
+        )
+        response.raise_for_status()
         return response.json()["response"]
@@ -0,0 +1,599 @@
+"""
+Columnar chunk metadata for PlatServedFaissDb, memory-mapped from the store directory.
+
+Rows are kept in the order chunks were added. Each column is a flat file under chunks/:
+
+- vid: the chunk's vector id, a 64-bit id assigned in increasing order and never reused,
+  under which the FAISS index stores its vector; rows stay sorted by it, so the chunks
+  of search results are found by binary search whatever was deleted before them
+- file, page, count: int32 per chunk; file numbers index the file names in chunks.json
+- id_hash: 64-bit hash of the chunk id; chunk ids are looked up in (id_hash, position)
+  runs sorted by hash, one per persist, merged as they pile up like an LSM tree
+- id, line, text: (offset, length) per chunk into a blob of UTF-8 strings
+
+Columns and blobs are opened with np.memmap, so opening a store costs a few syscalls
+whatever its size, worker processes serving the same store share the pages through the
+page cache, and a search only decodes the strings of the rows it returns.
+
+A manifest names the files and records how many rows and blob bytes are committed. It
+is written last and renamed into place, as chunks.json or inside the manifest of the
+caller (PlatServedFaissDb commits it with its segments): new rows are appended to the
+files in place, past the committed sizes, and files that change otherwise are written
+under new names. A persist that dies half way leaves the previous state readable, and the
+bytes it appended are overwritten by the next one. A persist writes in proportion to the
+rows added and deleted since the previous one.
+
+Deleting rows marks their vector ids as deleted (tombstones) and leaves the files alone:
+deleted rows drop out of every lookup at once, and the next persist commits the sorted
+tombstones as one small file. Once the committed tombstones exceed a share of the rows,
+a compaction rewrites the committed rows without them, with a fresh id run, from the
+committed files, so it can run in the background while rows are read, added and deleted;
+its result is swapped in if nothing was persisted meanwhile (see compaction()). Rows move
+down to close the gaps then, so positions are only stable until a compaction.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "chunks.json"
+
+_SPAN = np.dtype([("off", "<u8"), ("len", "<u4")])
+_COLUMNS = {
+    "vid": np.dtype("<i8"),
+    "file": np.dtype("<i4"),
+    "page": np.dtype("<i4"),
+    "count": np.dtype("<i4"),
+    "id_hash": np.dtype("<u8"),
+    "id": _SPAN,
+    "line": _SPAN,
+    "text": _SPAN,
+}
+_STRINGS = ("id", "line", "text")
+_ID_INDEX = np.dtype([("hash", "<u8"), ("pos", "<i8")])
+_VIDS = np.dtype("<i8")
+_NO_VIDS = np.empty(0, dtype=np.int64)
+
+
+def id_hash(chunk_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _map(path: str, dtype, count: int):
+    """Read-only view of the first count items of a file; an empty array for none."""
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def _append(path: str, offset: int, data: bytes):
+    """Write data at offset, dropping whatever an interrupted persist left past it."""
+    with open(path, "ab"):
+        pass
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write(path: str, data):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ChunkStore:
+    """
+    Chunk metadata of a FAISS store, by FAISS position.
+
+    Rows appended since the last persist() are held in memory; everything else is read
+    from the memory-mapped files.
+
+    Args:
+        directory: Directory holding the columns (created on the first persist)
+        load: Open the committed rows; False starts empty, as if the directory were
+        manifest: Manifest committed by the caller, read from chunks.json if not given
+    """
+
+    def __init__(self, directory: str, load: bool = True, manifest: dict = None):
+        self.directory = directory
+        self._compacting = False  # a compaction is writing its .tmp files
+        path = os.path.join(directory, MANIFEST_FILE)
+        if not load:
+            manifest = None
+        elif manifest is None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        self._open(manifest)
+
+    def _open(self, manifest):
+        self._manifest = manifest or {
+            "sequence": 0, "rows": 0, "next_vid": 0, "files": [], "paths": {}, "blobs": {}, "id_runs": [],
+        }
+        rows = self._manifest["rows"]
+        paths = self._manifest["paths"]
+        self.files = list(self._manifest["files"])
+        self._file_numbers = {name: i for i, name in enumerate(self.files)}
+        self._columns = {
+            name: _map(os.path.join(self.directory, paths.get(name, "")), dtype, rows)
+            for name, dtype in _COLUMNS.items() if name in paths or not rows
+        }
+        if "vid" not in self._columns:
+            # stores persisted before vector ids: a row's id is its position, as in their FAISS index
+            self._columns["vid"] = np.arange(rows, dtype=np.int64)
+        self._next_vid = self._manifest.get("next_vid", rows)
+        self._blobs = {
+            name: _map(os.path.join(self.directory, paths.get(name + "_blob", "")), np.uint8,
+                       self._manifest["blobs"].get(name, 0))
+            for name in _STRINGS
+        }
+        # stores persisted before id runs kept one id index: rebuilt when first needed
+        self._id_runs = [
+            _map(os.path.join(self.directory, run["file"]), _ID_INDEX, run["rows"])
+            for run in self._manifest["id_runs"]
+        ] if "id_runs" in self._manifest else None
+        self._new = {name: [] for name in _COLUMNS}
+        self._new_blobs = {name: bytearray() for name in _STRINGS}
+        self._new_ids = {}  # chunk id -> position, for the rows not persisted yet
+        self._file_index = None
+        # vector ids of the deleted rows, sorted, and their positions
+        deleted = self._manifest.get("deleted")
+        self._committed_deleted = np.array(
+            _map(os.path.join(self.directory, deleted["file"]), _VIDS, deleted["rows"]), dtype=np.int64,
+        ) if deleted else _NO_VIDS
+        self._deleted = self._committed_deleted
+        self._dead = np.sort(self._find(self._deleted))
+
+    def exists(self) -> bool:
+        """True if the rows were loaded from (or persisted to) the directory."""
+        return self._manifest["sequence"] > 0
+
+    def __len__(self):
+        """The number of rows, deleted ones included until a compaction removes them."""
+        return len(self._columns["file"]) + len(self._new["file"])
+
+    # --- reading ---
+
+    def _value(self, name: str, pos: int):
+        column = self._columns[name]
+        if pos < len(column):
+            return column[pos].item()
+        return self._new[name][pos - len(column)]
+
+    def _read(self, name: str, off: int, length: int) -> bytes:
+        blob = self._blobs[name]
+        if off < len(blob):
+            return bytes(blob[off:off + length])
+        start = off - len(blob)
+        return bytes(self._new_blobs[name][start:start + length])
+
+    def _string(self, name: str, pos: int) -> str:
+        return self._read(name, *self._value(name, pos)).decode("utf-8")
+
+    def _column(self, name: str) -> np.ndarray:
+        """A whole column; the rows not persisted yet are copied in."""
+        if not self._new[name]:
+            return self._columns[name]
+        return np.concatenate([self._columns[name], np.array(self._new[name], dtype=_COLUMNS[name])])
+
+    def get(self, pos: int) -> dict:
+        """The chunk at a position, text included."""
+        return {
+            "id": self._string("id", pos),
+            "file": self.files[self._value("file", pos)],
+            "page": self._value("page", pos),
+            "line": self._string("line", pos),
+            "count": self._value("count", pos),
+            "text": self._string("text", pos),
+        }
+
+    def chunk_ids(self, positions) -> list:
+        return [self._string("id", pos) for pos in positions]
+
+    def vector_ids(self, positions) -> np.ndarray:
+        return np.array([self._value("vid", pos) for pos in positions], dtype=np.int64)
+
+    def positions_of(self, vector_ids) -> np.ndarray:
+        """Positions of the rows with the given vector ids, -1 for ids not in the store or deleted."""
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        positions = self._find(vector_ids)
+        if len(self._deleted):
+            positions[np.isin(vector_ids, self._deleted)] = -1
+        return positions
+
+    def _find(self, vector_ids: np.ndarray) -> np.ndarray:
+        """Positions of the rows with the given vector ids, deleted ones included; -1 for others."""
+        committed = self._columns["vid"]
+        new = np.array(self._new["vid"], dtype=np.int64)
+        positions = np.full(len(vector_ids), -1, dtype=np.int64)
+        for column, base in ((committed, 0), (new, len(committed))):
+            if len(column):
+                found = np.minimum(np.searchsorted(column, vector_ids), len(column) - 1)
+                hit = column[found] == vector_ids
+                positions[hit] = found[hit] + base
+        return positions
+
+    def positions(self, chunk_ids) -> list:
+        """Positions of the given chunk ids; ids not in the store are skipped."""
+        found = []
+        wanted = []
+        for chunk_id in chunk_ids:
+            if chunk_id in self._new_ids:
+                found.append(self._new_ids[chunk_id])
+            else:
+                wanted.append(chunk_id)
+        if not wanted or not len(self._columns["id_hash"]):
+            return found
+
+        if self._id_runs is None:
+            self._id_runs = [self._build_id_run(self._columns["id_hash"])]
+        hashes = np.array([id_hash(chunk_id) for chunk_id in wanted], dtype=np.uint64)
+        matched = set()
+        for run in self._id_runs:
+            lows = np.searchsorted(run["hash"], hashes, side="left")
+            highs = np.searchsorted(run["hash"], hashes, side="right")
+            for chunk_id, low, high in zip(wanted, lows, highs):
+                # distinct ids sharing a hash are told apart by the id itself
+                for pos in run["pos"][low:high]:
+                    if chunk_id in matched or self._is_dead(int(pos)):
+                        continue
+                    if self._string("id", int(pos)) == chunk_id:
+                        matched.add(chunk_id)
+                        found.append(int(pos))
+                        break
+        return found
+
+    def _is_dead(self, pos: int) -> bool:
+        i = np.searchsorted(self._dead, pos)
+        return i < len(self._dead) and self._dead[i] == pos
+
+    @staticmethod
+    def _build_id_run(hashes: np.ndarray, first: int = 0) -> np.ndarray:
+        """The (hash, position) pairs of rows first, first + 1, ... sorted by hash."""
+        order = np.argsort(hashes, kind="stable")
+        run = np.empty(len(hashes), dtype=_ID_INDEX)
+        run["hash"] = hashes[order]
+        run["pos"] = order + first
+        return run
+
+    @staticmethod
+    def _merge_id_runs(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        merged = np.concatenate([first, second])
+        return merged[np.argsort(merged["hash"], kind="stable")]
+
+    @property
+    def file_index(self) -> dict:
+        """File name -> {"ranges": [[start, end), ...], "count": n} of its positions."""
+        if self._file_index is None:
+            self._file_index = {}
+            numbers = self._column("file")
+            if len(numbers):
+                # deleted rows split the runs of their file and are left out
+                numbers = numbers.astype(np.int64)
+                numbers[self._dead] = -1
+                bounds = np.concatenate(([0], np.flatnonzero(np.diff(numbers)) + 1, [len(numbers)]))
+                for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                    if numbers[start] >= 0:
+                        self._add_to_file_index(self.files[numbers[start]], start, end)
+        return self._file_index
+
+    def _add_to_file_index(self, file_name, start, end):
+        """Record positions [start, end) for a file, merging with its last range when contiguous."""
+        entry = self._file_index.setdefault(file_name, {"ranges": [], "count": 0})
+        ranges = entry["ranges"]
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+        entry["count"] += end - start
+
+    def _drop_from_file_index(self, positions: np.ndarray):
+        """Take deleted positions out of the ranges of their files."""
+        numbers = np.array([self._value("file", pos) for pos in positions.tolist()], dtype=np.int64)
+        for number in np.unique(numbers).tolist():
+            file_name = self.files[number]
+            entry = self._file_index.get(file_name)
+            if entry is None:
+                continue
+            live = np.concatenate([np.arange(start, end) for start, end in entry["ranges"]])
+            live = np.setdiff1d(live, positions[numbers == number])
+            if not len(live):
+                del self._file_index[file_name]
+                continue
+            bounds = np.concatenate(([0], np.flatnonzero(np.diff(live) != 1) + 1, [len(live)]))
+            entry["ranges"] = [[int(live[start]), int(live[end - 1]) + 1]
+                               for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+            entry["count"] = len(live)
+
+    # --- writing ---
+
+    def append(self, chunks) -> np.ndarray:
+        """
+        Add chunks (dicts with id, file, page, line, count and text) after the last position.
+
+        Returns:
+            The vector ids assigned to them
+        """
+        start = len(self)
+        first_vid = self._next_vid
+        for i, chunk in enumerate(chunks):
+            self._new["vid"].append(self._next_vid)
+            self._next_vid += 1
+            number = self._file_numbers.get(chunk["file"])
+            if number is None:
+                number = self._file_numbers[chunk["file"]] = len(self.files)
+                self.files.append(chunk["file"])
+            self._new["file"].append(number)
+            self._new["page"].append(int(chunk["page"]))
+            self._new["count"].append(int(chunk["count"]))
+            self._new["id_hash"].append(id_hash(chunk["id"]))
+            for name in _STRINGS:
+                data = str(chunk[name]).encode("utf-8")
+                blob = self._new_blobs[name]
+                self._new[name].append((len(self._blobs[name]) + len(blob), len(data)))
+                blob += data
+            self._new_ids[chunk["id"]] = start + i
+            if self._file_index is not None:
+                self._add_to_file_index(chunk["file"], start + i, start + i + 1)
+        return np.arange(first_vid, self._next_vid, dtype=np.int64)
+
+    def delete(self, positions):
+        """
+        Mark rows deleted: they drop out of every lookup at once and keep their positions
+        until a compaction removes them. The next persist commits the deletion.
+        """
+        positions = np.setdiff1d(np.asarray(list(positions), dtype=np.int64), self._dead)
+        if not len(positions):
+            return
+        committed = len(self._columns["file"])
+        for pos in positions[positions >= committed].tolist():
+            self._new_ids.pop(self._string("id", pos), None)
+        if self._file_index is not None:
+            self._drop_from_file_index(positions)
+        self._deleted = np.union1d(self._deleted, self.vector_ids(positions))
+        self._dead = np.union1d(self._dead, positions)
+
+    def persist(self):
+        """Write the rows added or changed since the last persist and commit them to chunks.json."""
+        self.commit(self.prepare())
+
+    def prepare(self) -> dict:
+        """
+        Write the rows added and the tombstones changed since the last persist, without committing them.
+
+        Returns:
+            The manifest to pass to commit() once it is stored
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        old = self._manifest
+        deleted_changed = not np.array_equal(self._deleted, self._committed_deleted)
+        if not deleted_changed and not self._new["file"] and old["sequence"] > 0 and "vid" in old["paths"]:
+            return old
+        sequence = old["sequence"] + 1
+        paths = dict(old["paths"])
+        blob_sizes = dict(old["blobs"])
+        paths.pop("id_index", None)
+        id_runs = list(old.get("id_runs", []))
+
+        def new_path(name, ext):
+            paths[name] = f"{name}.{sequence}.{ext}"
+            return os.path.join(self.directory, paths[name])
+
+        for name in _STRINGS:
+            committed = len(self._blobs[name])
+            if self._new_blobs[name] or name + "_blob" not in paths:
+                path = os.path.join(self.directory, paths.get(name + "_blob") or new_path(name + "_blob", "blob"))
+                _append(path, committed, self._new_blobs[name])
+                blob_sizes[name] = committed + len(self._new_blobs[name])
+
+        rows = old["rows"]
+        for name, dtype in _COLUMNS.items():
+            if name not in paths:
+                # a column the store was persisted without
+                _write(new_path(name, "col"), np.ascontiguousarray(self._column(name), dtype=dtype).tobytes())
+            elif self._new[name]:
+                path = os.path.join(self.directory, paths[name])
+                _append(path, rows * dtype.itemsize, np.array(self._new[name], dtype=dtype).tobytes())
+
+        if "id_runs" not in old:
+            runs = [self._build_id_run(self._column("id_hash"))]
+            id_runs = []
+        elif not self._new["id_hash"]:
+            runs = []
+        else:
+            runs = [self._build_id_run(np.array(self._new["id_hash"], dtype=np.uint64), rows)]
+            # merge the newest runs while they are of comparable size, so a store of n rows
+            # has O(log n) runs and each row is rewritten O(log n) times
+            while id_runs and id_runs[-1]["rows"] <= 2 * len(runs[-1]):
+                previous = id_runs.pop()
+                stored = _map(os.path.join(self.directory, previous["file"]), _ID_INDEX, previous["rows"])
+                runs[-1] = self._merge_id_runs(stored, runs[-1])
+        for i, run in enumerate(runs):
+            id_runs.append({"file": f"id_run.{sequence}.{i}.col", "rows": len(run)})
+            _write(os.path.join(self.directory, id_runs[-1]["file"]), run.tobytes())
+
+        deleted = old.get("deleted")
+        if deleted_changed:
+            deleted = None
+            if len(self._deleted):
+                deleted = {"file": f"deleted.{sequence}.col", "rows": len(self._deleted)}
+                _write(os.path.join(self.directory, deleted["file"]), self._deleted.astype(_VIDS).tobytes())
+
+        return {
+            "sequence": sequence, "rows": len(self), "next_vid": self._next_vid, "files": self.files,
+            "paths": paths, "blobs": blob_sizes, "id_runs": id_runs, "deleted": deleted,
+        }
+
+    def commit(self, manifest: dict, write_manifest: bool = True):
+        """
+        Make a manifest from prepare() the current state.
+
+        Args:
+            manifest: The manifest returned by prepare()
+            write_manifest: Write it to chunks.json; False when the caller has stored it
+        """
+        if write_manifest:
+            manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+            with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(manifest_path + ".tmp", manifest_path)
+
+        # files of earlier states stay readable by processes that still map them
+        keep = set(manifest["paths"].values()) | {run["file"] for run in manifest["id_runs"]}
+        if manifest.get("deleted"):
+            keep.add(manifest["deleted"]["file"])
+        if write_manifest:
+            keep.add(MANIFEST_FILE)
+        for name in os.listdir(self.directory):
+            # a compaction in progress writes its files as .tmp
+            if name not in keep and not (self._compacting and name.endswith(".tmp")):
+                os.remove(os.path.join(self.directory, name))
+        if manifest is not self._manifest:
+            self._open(manifest)
+
+    # --- compaction ---
+
+    def compaction(self, max_deleted_ratio: float):
+        """
+        Start a compaction once the committed tombstones exceed max_deleted_ratio of the rows.
+
+        A compaction runs in three steps: compaction() takes a snapshot of the committed
+        state, write_compaction() writes the committed rows without the deleted ones (the
+        slow part, which needs no lock) and finish_compaction() swaps the result in; the
+        caller commits its manifest then. The first and last step must not overlap other
+        calls, as for any change.
+
+        Returns:
+            The snapshot to pass to write_compaction(), or None if no compaction is due
+        """
+        rows = self._manifest["rows"]
+        purged = self._committed_deleted
+        if self._compacting or not len(purged) or len(purged) <= max_deleted_ratio * rows:
+            return None
+        self._compacting = True
+        return {
+            "manifest": self._manifest,
+            "columns": {name: self._columns[name] for name in _COLUMNS},
+            "blobs": dict(self._blobs),
+            "dead": np.sort(self._find(purged)),
+            "purged": purged,
+        }
+
+    def write_compaction(self, snapshot: dict) -> dict:
+        """
+        Write the committed rows of a snapshot without its deleted ones, as .tmp files.
+
+        The rows are copied one column at a time; blobs are rewritten when they hold more
+        dead bytes than live ones, as their strings are read by offset.
+
+        Returns:
+            The manifest to pass to finish_compaction()
+        """
+        old = snapshot["manifest"]
+        sequence = old["sequence"] + 1
+        keep = np.ones(old["rows"], dtype=bool)
+        keep[snapshot["dead"]] = False
+        paths = dict(old["paths"])
+        blob_sizes = dict(old["blobs"])
+
+        def new_path(name, ext):
+            paths[name] = f"{name}.{sequence}c.{ext}"
+            return os.path.join(self.directory, paths[name] + ".tmp")
+
+        # drop the names of files that lost all their chunks
+        numbers, file_column = np.unique(snapshot["columns"]["file"][keep], return_inverse=True)
+        files = [old["files"][number] for number in numbers.tolist()]
+        _write(new_path("file", "col"), file_column.astype(_COLUMNS["file"]).tobytes())
+        del file_column
+
+        for name, dtype in _COLUMNS.items():
+            if name == "file":
+                continue
+            column = np.ascontiguousarray(snapshot["columns"][name][keep], dtype=dtype)
+            if name in _STRINGS:
+                live = int(column["len"].sum())
+                if old["blobs"][name] - live > live:
+                    blob_path = new_path(name + "_blob", "blob")
+                    column = self._compact_blob(snapshot["blobs"][name], column, blob_path)
+                    blob_sizes[name] = live
+            _write(new_path(name, "col"), column.tobytes())
+            if name == "id_hash":
+                id_run = {"file": f"id_run.{sequence}c.0.col", "rows": len(column)}
+                _write(os.path.join(self.directory, id_run["file"] + ".tmp"), self._build_id_run(column).tobytes())
+            del column
+
+        return {
+            "sequence": sequence, "rows": int(keep.sum()), "next_vid": old["next_vid"], "files": files,
+            "paths": paths, "blobs": blob_sizes, "id_runs": [id_run], "deleted": None,
+        }
+
+    def finish_compaction(self, snapshot: dict, manifest: dict = None) -> bool:
+        """
+        Swap a compaction in, keeping the rows added and deleted since its snapshot.
+
+        Args:
+            snapshot: The snapshot from compaction()
+            manifest: The manifest from write_compaction(); None drops a failed compaction
+
+        Returns:
+            False if it was dropped, because a persist committed since the snapshot or it
+            failed; True if the caller is to commit the manifest now
+        """
+        self._compacting = False
+        written = []
+        if manifest is not None:
+            written = [path for path in manifest["paths"].values() if path not in snapshot["manifest"]["paths"].values()]
+            written.append(manifest["id_runs"][0]["file"])
+        if manifest is None or self._manifest is not snapshot["manifest"]:
+            for path in written:
+                try:
+                    os.remove(os.path.join(self.directory, path + ".tmp"))
+                except FileNotFoundError:
+                    pass
+            return False
+        for path in written:
+            os.replace(os.path.join(self.directory, path + ".tmp"), os.path.join(self.directory, path))
+
+        rows, files, next_vid = self._manifest["rows"], self.files, self._next_vid
+        new, new_blobs, new_ids = self._new, self._new_blobs, self._new_ids
+        blob_sizes = {name: len(blob) for name, blob in self._blobs.items()}
+        deleted = np.setdiff1d(self._deleted, snapshot["purged"])
+        self._open(manifest)
+
+        # the rows added since the snapshot follow the compacted ones
+        shift = manifest["rows"] - rows
+        for number in dict.fromkeys(new["file"]):
+            if files[number] not in self._file_numbers:
+                self._file_numbers[files[number]] = len(self.files)
+                self.files.append(files[number])
+        new["file"] = [self._file_numbers[files[number]] for number in new["file"]]
+        for name in _STRINGS:
+            moved = manifest["blobs"][name] - blob_sizes[name]
+            if moved:
+                new[name] = [(off + moved, length) for off, length in new[name]]
+        self._new, self._new_blobs, self._next_vid = new, new_blobs, next_vid
+        self._new_ids = {chunk_id: pos + shift for chunk_id, pos in new_ids.items()}
+        self._deleted = deleted
+        self._dead = np.sort(self._find(deleted))
+        return True
+
+    @staticmethod
+    def _compact_blob(blob: np.ndarray, spans: np.ndarray, path: str) -> np.ndarray:
+        """Write the live strings of a blob to a new file; returns their new spans."""
+        with open(path, "wb") as f:
+            for off, length in spans.tolist():
+                f.write(bytes(blob[off:off + length]))
+            f.flush()
+            os.fsync(f.fileno())
+        compacted = spans.copy()
+        compacted["off"] = np.cumsum(spans["len"], dtype=np.uint64) - spans["len"]
+        return compacted
@@ -0,0 +1,258 @@
+"""
+FAISS index families for PlatServedFaissDb.
+
+A store's index type and parameters are chosen from the FAISS_* settings when the
+store is created and saved next to index.faiss in index_config.json; from then on the
+saved configuration wins, and `python -m indexer.faiss_rebuild` converts the store to
+another one. The families:
+
+- flat: exact brute-force search (IndexFlatL2), cost linear in the corpus size
+- ivf: inverted file over nlist k-means cells (IndexIVFFlat); a query scans nprobe cells
+- hnsw: navigable small-world graph with M links per node (IndexHNSWFlat); a query
+  explores efSearch candidates. Needs no training, but vectors cannot be removed from the
+  graph, so removing them rebuilds it from the vectors that remain
+- ivfpq: ivf with the vectors compressed to pq_m codes of pq_bits bits (IndexIVFPQ),
+  for corpora that do not fit in memory as float32; distances become approximate
+
+ivf and ivfpq must be trained before the first vector is added; the store buffers
+vectors until it has FAISS_TRAIN_SIZE of them (default 40 per cell) and trains on those.
+A corpus smaller than that is trained on what there is, with fewer cells if needed.
+
+Vectors are stored under the stable 64-bit ids the chunk store assigns to chunks, so
+search results name chunks whatever was added or removed before them: ivf types keep
+the ids in their inverted lists, flat and hnsw indexes are wrapped in an IndexIDMap2.
+
+nprobe and efSearch trade recall for latency at query time. The store's saved values
+apply unless FAISS_NPROBE / FAISS_EF_SEARCH or the caller of search_similar_chunks
+override them.
+"""
+
+import os
+import json
+import numpy as np
+import faiss
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+# training vectors per IVF cell; faiss wants at least 39
+_TRAIN_PER_CELL = 40
+# PQ codebooks have 2**bits centroids, each needs training vectors
+_TRAIN_PER_PQ_CENTROID = 4
+_RECONSTRUCT_BATCH = 65536
+
+
+def index_config_from_settings() -> dict:
+    """Index configuration for a new store, from the FAISS_* settings."""
+    index_type = config.FAISS_INDEX_TYPE.lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported FAISS index type: {config.FAISS_INDEX_TYPE}")
+    return {
+        "type": index_type,
+        "nlist": config.FAISS_NLIST,
+        "hnsw_m": config.FAISS_HNSW_M,
+        "ef_construction": config.FAISS_HNSW_EF_CONSTRUCTION,
+        "pq_m": config.FAISS_PQ_M,
+        "pq_bits": config.FAISS_PQ_BITS,
+        "nprobe": DEFAULT_NPROBE,
+        "ef_search": DEFAULT_EF_SEARCH,
+    }
+
+
+def load_index_config(store_dir: str):
+    """Return the index configuration saved with the store, or None for stores that predate it (flat)."""
+    path = os.path.join(store_dir, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_index_config(path: str, index_config: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(index_config, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def needs_training(index_config: dict) -> bool:
+    return index_config["type"] in ("ivf", "ivfpq")
+
+
+def train_size(index_config: dict) -> int:
+    """Vectors to buffer before training the index."""
+    if not needs_training(index_config):
+        return 0
+    if config.FAISS_TRAIN_SIZE > 0:
+        return config.FAISS_TRAIN_SIZE
+    size = _TRAIN_PER_CELL * index_config["nlist"]
+    if index_config["type"] == "ivfpq":
+        size = max(size, _TRAIN_PER_PQ_CENTROID << index_config["pq_bits"])
+    return size
+
+
+def create_index(index_config: dict, dim: int):
+    """Create an empty (for ivf and ivfpq, untrained) index of the configured type, taking ids."""
+    index_type = index_config["type"]
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, index_config["hnsw_m"])
+        index.hnsw.efConstruction = index_config["ef_construction"]
+        return faiss.IndexIDMap2(index)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dim, index_config["nlist"])
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, index_config["nlist"], _pq_m(index_config, dim), index_config["pq_bits"])
+    return index
+
+
+def _pq_m(index_config: dict, dim: int) -> int:
+    """Sub-quantizers for PQ: the configured count, or dim / 8, lowered to a divisor of dim."""
+    pq_m = min(index_config["pq_m"] or max(1, dim // 8), dim)
+    while dim % pq_m:
+        pq_m -= 1
+    return pq_m
+
+
+def train_index(index_config: dict, dim: int, vectors: np.ndarray):
+    """
+    Create an index of the configured type trained on the given vectors.
+
+    With fewer vectors than the configuration needs, nlist is lowered to fit them, and an
+    ivfpq index falls back to ivf when there are too few to train the PQ codebooks.
+
+    Returns:
+        The trained index and the configuration it was created with
+    """
+    index_config = dict(index_config)
+    count = len(vectors)
+    if needs_training(index_config):
+        nlist = max(1, min(index_config["nlist"], count // _TRAIN_PER_CELL))
+        if nlist < index_config["nlist"]:
+            logger.warning(f"{count} vectors to train {index_config['nlist']} IVF cells, using {nlist}")
+            index_config["nlist"] = nlist
+        if index_config["type"] == "ivfpq" and count < (_TRAIN_PER_PQ_CENTROID << index_config["pq_bits"]):
+            logger.warning(f"{count} vectors are too few to train PQ codebooks, using an ivf index")
+            index_config["type"] = "ivf"
+    index = create_index(index_config, dim)
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    if index_config["type"] == "ivfpq":
+        index_config["pq_m"] = _pq_m(index_config, dim)
+    return index, index_config
+
+
+def search_parameters(index, index_config: dict, nprobe: int = None, ef_search: int = None, sel=None):
+    """
+    Per-call search parameters for the index (thread-safe, unlike setting them on the index).
+
+    Args:
+        sel: Optional faiss IDSelector; only the ids it accepts are returned
+    """
+    index_type = index_config["type"]
+    if index_type in ("ivf", "ivfpq"):
+        nprobe = nprobe or config.FAISS_NPROBE or index_config.get("nprobe") or DEFAULT_NPROBE
+        return faiss.SearchParametersIVF(nprobe=min(nprobe, index.nlist), sel=sel)
+    if index_type == "hnsw":
+        ef_search = ef_search or config.FAISS_EF_SEARCH or index_config.get("ef_search") or DEFAULT_EF_SEARCH
+        return faiss.SearchParametersHNSW(efSearch=ef_search, sel=sel)
+    return faiss.SearchParameters(sel=sel) if sel is not None else None
+
+
+def with_ids(index, index_config: dict, first_id: int):
+    """
+    Give the vectors of an index from before stable ids the ids first_id, first_id + 1, ...
+    in position order. ivf indexes are renumbered in place; others are wrapped, not copied.
+    """
+    count = index.ntotal
+    if needs_training(index_config):
+        ivf = faiss.extract_index_ivf(index)
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+                ids += first_id
+        return index
+    wrapped = create_index(index_config, index.d)
+    wrapped.index = index
+    wrapped.referenced_objects.append(index)
+    wrapped.ntotal = count
+    faiss.copy_array_to_vector(np.arange(first_id, first_id + count, dtype=np.int64), wrapped.id_map)
+    wrapped.construct_rev_map()
+    return wrapped
+
+
+def stored_ids(index) -> np.ndarray:
+    """The ids of an index's vectors, in storage order."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    ids = [
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist) if invlists.list_size(list_no)
+    ]
+    return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+
+
+def reconstruct_all(index):
+    """Yield (ids, vectors) batches of the index's stored vectors, in id order."""
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        ids = faiss.vector_to_array(index.id_map)
+        for first in range(0, len(ids), _RECONSTRUCT_BATCH):
+            count = min(_RECONSTRUCT_BATCH, len(ids) - first)
+            yield ids[first:first + count], inner.reconstruct_n(first, count)
+        return
+    ids = np.sort(stored_ids(index))
+    ivf = faiss.extract_index_ivf(index)
+    # the id lookup is only built for the copy; it costs a hash table entry per vector
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    try:
+        for first in range(0, len(ids), _RECONSTRUCT_BATCH):
+            batch = ids[first:first + _RECONSTRUCT_BATCH]
+            yield batch, index.reconstruct_batch(batch)
+    finally:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+
+
+def append_index(index, other, index_config: dict):
+    """Move the vectors of other, with their ids, into index (other is left empty for all but hnsw)."""
+    if index_config["type"] == "flat":
+        index.merge_from(other)
+    elif index_config["type"] == "hnsw":
+        # graphs cannot be merged: the vectors of other are inserted into index's graph
+        for ids, vectors in reconstruct_all(other):
+            index.add_with_ids(vectors, ids)
+    else:
+        # both share the trained quantizer; other's entries keep their ids
+        index.merge_from(other, 0)
+    return index
+
+
+def remove_ids(index, index_config: dict, ids) -> object:
+    """
+    Remove vectors by id; ids the index does not hold are ignored.
+
+    Returns:
+        The index, which for hnsw is a rebuilt one
+    """
+    removed = np.unique(np.asarray(ids, dtype=np.int64))
+    if index_config["type"] != "hnsw":
+        index.remove_ids(removed)
+        return index
+    # graph nodes cannot be removed: rebuild the graph from the vectors that remain
+    rebuilt = create_index(index_config, index.d)
+    for batch, vectors in reconstruct_all(index):
+        keep = ~np.isin(batch, removed)
+        rebuilt.add_with_ids(vectors[keep], batch[keep])
+    return rebuilt
@@ -0,0 +1,474 @@
+"""
+Segmented FAISS index for PlatServedFaissDb.
+
+The vectors of a store are split into segments, each a FAISS index of the store's type
+over a run of the stable ids the chunk store assigns: segment i holds ids greater than
+those of segments 0..i-1. Vectors added since the last persist go to an in-memory tail
+segment, which the next persist writes as a new file under segments/; the files of
+earlier segments are never rewritten, so adding 100 chunks to a store of millions writes
+100 chunks' worth of index. segments.json lists the segment files and the id range of
+each, the trained empty index that new ivf segments are cloned from, the vectors still
+waiting for training, the deleted ids and the manifest of the chunk store. It is written
+to a temporary file and renamed into place, so one rename commits the vectors and the
+chunk metadata together, and a crash leaves the previous commit intact.
+
+Deleting vectors marks their ids as deleted (tombstones) without touching any segment,
+which is cheap, safe while other threads search, and takes effect at once: searches
+pass every segment an IDSelector that skips them. A persist commits the tombstones with
+the rest.
+
+A search queries every segment and merges their top k. A background thread keeps the
+segments in shape from their committed files, so segments being searched are never
+changed in place: a segment whose tombstones exceed FAISS_MAX_DELETED_RATIO of its
+vectors is rewritten without them (remove_ids; hnsw graphs are rebuilt), and while a
+persist leaves more than FAISS_MAX_SEGMENTS segments the smallest pair of neighbouring
+ones is merged, dropping their deleted vectors too. Each result is committed with a
+segments.json listing it instead of the segments it replaces, and the deleted vectors
+stop taking memory once it is swapped in.
+
+Stores written before stable ids (including a single index.faiss) are read with ids
+equal to their positions, which is what the chunk store assigns them too, and their
+segments are rewritten by the next persist.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+import faiss
+from plat.vectordb.faiss_index import (
+    needs_training, create_index, train_index, search_parameters, reconstruct_all,
+    remove_ids, append_index, with_ids, stored_ids,
+)
+from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+SEGMENTS_FILE = "segments.json"
+SEGMENTS_DIR = "segments"
+# files of stores persisted before segments existed
+LEGACY_INDEX_FILE = "index.faiss"
+LEGACY_PENDING_FILE = "pending.npy"
+
+_NO_IDS = np.empty(0, dtype=np.int64)
+
+
+def _between(ids: np.ndarray, first: int, last: int) -> np.ndarray:
+    """The ids of a sorted array in [first, last]."""
+    return ids[np.searchsorted(ids, first, side="left"):np.searchsorted(ids, last, side="right")]
+
+
+def _save_array(path: str, **arrays):
+    with open(path, "wb") as f:
+        if len(arrays) == 1:
+            np.save(f, *arrays.values())
+        else:
+            np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Segment:
+    """
+    A FAISS index over a run of ids, and the file it is stored in (None until written).
+
+    first and last bound the ids added to it, deleted ones included; None while it is empty.
+    """
+
+    def __init__(self, index, file: str = None, first: int = None, last: int = None):
+        self.index = index
+        self.file = file
+        self.first = first
+        self.last = last
+
+    def entry(self) -> dict:
+        return {"file": self.file, "count": self.index.ntotal, "first": self.first, "last": self.last}
+
+
+class SegmentedIndex:
+    """
+    The segments of a FAISS store, searched and updated as one index.
+
+    Args:
+        directory: Store directory
+        index_config: Index configuration, as in plat/vectordb/faiss_index.py
+        dim: Vector dimension
+        segments: Segments in id order
+        template: Empty index new segments are cloned from; None for an ivf store read
+            from a single index.faiss, whose first segment is emptied for it when needed
+        manifest: The committed segments.json
+        deleted: Sorted ids of the deleted vectors the segments still hold
+    """
+
+    def __init__(self, directory: str, index_config: dict, dim: int, segments=None, template=None, manifest=None,
+                 deleted=None):
+        self.directory = directory
+        self.index_config = index_config
+        self.d = dim
+        self.segments = list(segments or [])
+        self.template = create_index(index_config, dim) if template is None and not segments else template
+        self.template_file = None
+        self.manifest = manifest or {"sequence": 0, "segments": []}
+        self.deleted = _NO_IDS if deleted is None else deleted
+        self._committed_deleted = self.deleted
+        self._selector = None
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    @classmethod
+    def load(cls, directory: str, index_config: dict):
+        """
+        Read the committed state of a store.
+
+        Returns:
+            The index (None if the store has none), the (vectors, ids) waiting for training
+            (or None) and the committed chunk store manifest (None for older stores)
+        """
+        path = os.path.join(directory, SEGMENTS_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            stable_ids = manifest.get("stable_ids", False)
+            segments = []
+            position = 0
+            for entry in manifest["segments"]:
+                segment_index = faiss.read_index(os.path.join(directory, entry["file"]))
+                if stable_ids:
+                    segments.append(Segment(segment_index, entry["file"], entry["first"], entry["last"]))
+                else:
+                    # ids are the positions; the segment is written again under its ids
+                    count = segment_index.ntotal
+                    segments.append(Segment(with_ids(segment_index, index_config, position), None,
+                                            position, position + count - 1))
+                    position += count
+            template = None
+            if manifest.get("template"):
+                template = faiss.read_index(os.path.join(directory, manifest["template"]))
+            pending = None
+            if manifest.get("pending"):
+                pending = np.load(os.path.join(directory, manifest["pending"]))
+                if stable_ids:
+                    pending = (pending["vectors"], pending["ids"])
+                else:
+                    pending = (pending, np.arange(position, position + len(pending), dtype=np.int64))
+            deleted = None
+            if manifest.get("tombstones"):
+                deleted = np.load(os.path.join(directory, manifest["tombstones"]))
+            index = cls(directory, index_config, manifest["dim"], segments, template, manifest, deleted)
+            index.template_file = manifest.get("template")
+            if index.template is None and not needs_training(index_config):
+                index.template = create_index(index_config, manifest["dim"])
+            return index, pending, manifest.get("chunks")
+
+        legacy = os.path.join(directory, LEGACY_INDEX_FILE)
+        if not os.path.exists(legacy):
+            return None, None, None
+        first = faiss.read_index(legacy)
+        count = first.ntotal
+        pending_path = os.path.join(directory, LEGACY_PENDING_FILE)
+        pending = None
+        if os.path.exists(pending_path):
+            pending = np.load(pending_path)
+            pending = (pending, np.arange(count, count + len(pending), dtype=np.int64))
+        segments = [Segment(with_ids(first, index_config, 0), None, 0, count - 1)] if count else []
+        template = None if segments and needs_training(index_config) else create_index(index_config, first.d)
+        if not segments and first.is_trained:
+            template = first
+        return cls(directory, index_config, first.d, segments, template), pending, None
+
+    @property
+    def ntotal(self) -> int:
+        """Vectors held and not deleted."""
+        return sum(segment.index.ntotal for segment in self.segments) - len(self.deleted)
+
+    @property
+    def is_trained(self) -> bool:
+        return bool(self.segments) or self.template.is_trained
+
+    def train(self, vectors: np.ndarray):
+        """Train the template of an ivf store; fewer vectors than configured lower nlist."""
+        self.template, self.index_config = train_index(self.index_config, self.d, vectors)
+        self.template_file = None
+
+    def _empty_segment(self):
+        if self.template is None:
+            # a store read from a single ivf index.faiss: empty a copy of it, once
+            self.template = faiss.clone_index(self.segments[0].index)
+            self.template.reset()
+        return faiss.clone_index(self.template)
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """Add vectors under ids greater than any held, to the tail segment."""
+        if not len(ids):
+            return
+        with self._lock:
+            if not self.segments or self.segments[-1].file is not None:
+                self.segments = self.segments + [Segment(self._empty_segment())]
+            tail = self.segments[-1]
+        tail.index.add_with_ids(vectors, ids)
+        if tail.first is None:
+            tail.first = int(ids[0])
+        tail.last = int(ids[-1])
+
+    def delete(self, ids) -> int:
+        """
+        Mark vectors deleted; searches skip them from now on. Ids the segments do not hold are ignored.
+
+        Returns:
+            The number of vectors newly marked
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        with self._lock:
+            held = [
+                _between(ids, segment.first, segment.last) for segment in self.segments if segment.first is not None
+            ]
+            held = np.setdiff1d(np.concatenate(held), self.deleted) if held else _NO_IDS
+            if len(held):
+                self.deleted = np.union1d(self.deleted, held)
+        return len(held)
+
+    def replace(self, index, index_config: dict, template):
+        """Make a single index, of another configuration and without deleted vectors, the only segment."""
+        ids = stored_ids(index)
+        with self._lock:
+            self.index_config = index_config
+            self.template = template
+            self.template_file = None
+            self.segments = [Segment(index, None, int(ids.min()), int(ids.max()))] if len(ids) else []
+            self.deleted = _NO_IDS
+
+    def _exclusion(self):
+        """(deleted ids, IDSelectorBatch, IDSelectorNot) skipping the deleted ids, or None if there are none."""
+        deleted = self.deleted
+        if not len(deleted):
+            return None
+        selector = self._selector
+        if selector is None or selector[0] is not deleted:
+            # the selectors only point at each other: the tuple keeps them alive together
+            batch = faiss.IDSelectorBatch(deleted)
+            selector = self._selector = (deleted, batch, faiss.IDSelectorNot(batch))
+        return selector
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None, ef_search: int = None):
+        """
+        The k nearest ids to one query vector, over every segment, deleted vectors excluded.
+
+        Returns:
+            Distances and ids, nearest first
+        """
+        # read the tombstones before the segments: a compaction swaps purged segments in first
+        exclusion = self._exclusion()
+        segments = self.segments
+        found_distances = []
+        found_ids = []
+        for segment in segments:
+            count = segment.index.ntotal
+            if count:
+                params = search_parameters(segment.index, self.index_config, nprobe, ef_search,
+                                           exclusion[2] if exclusion else None)
+                distances, ids = segment.index.search(query, min(k, count), params=params)
+                # ANN indexes and selectors pad with -1 when they find fewer than k neighbours
+                hits = ids[0] >= 0
+                found_distances.append(distances[0][hits])
+                found_ids.append(ids[0][hits])
+        if not found_distances:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        distances = np.concatenate(found_distances)
+        ids = np.concatenate(found_ids)
+        nearest = np.argsort(distances, kind="stable")[:k]
+        return distances[nearest], ids[nearest]
+
+    def reconstruct_all(self):
+        """Yield (ids, vectors) batches of every segment's vectors, deleted ones excluded, in id order."""
+        deleted = self.deleted
+        for segment in self.segments:
+            for ids, vectors in reconstruct_all(segment.index):
+                if len(deleted):
+                    keep = ~np.isin(ids, deleted)
+                    ids, vectors = ids[keep], vectors[keep]
+                yield ids, vectors
+
+    # --- persistence ---
+
+    def save(self, pending, chunks_manifest: dict):
+        """
+        Write the new and changed segments and commit them with a new segments.json.
+
+        Args:
+            pending: (vectors, ids) waiting for training, or None
+            chunks_manifest: Manifest of the chunk store, committed in the same file
+        """
+        with self._lock:
+            sequence = self.manifest["sequence"] + 1
+            os.makedirs(os.path.join(self.directory, SEGMENTS_DIR), exist_ok=True)
+            self.segments = [segment for segment in self.segments if segment.index.ntotal]
+            for number, segment in enumerate(self.segments):
+                if segment.file is None:
+                    segment.file = self._write_index(segment.index, f"seg-{sequence}-{number}.faiss")
+            if self.template_file is None and self.template is not None and needs_training(self.index_config):
+                self.template_file = self._write_index(self.template, f"trained-{sequence}.faiss")
+
+            pending_file = None
+            if pending is not None:
+                pending_file = f"pending-{sequence}.npz"
+                _save_array(os.path.join(self.directory, pending_file), vectors=pending[0], ids=pending[1])
+
+            deleted = self.deleted
+            tombstones_file = self.manifest.get("tombstones")
+            if not np.array_equal(deleted, self._committed_deleted):
+                tombstones_file = self._write_tombstones(deleted, sequence)
+
+            self._commit({
+                "sequence": sequence,
+                "dim": self.d,
+                "stable_ids": True,
+                "segments": [segment.entry() for segment in self.segments],
+                "template": self.template_file if needs_training(self.index_config) else None,
+                "pending": pending_file,
+                "tombstones": tombstones_file,
+                "chunks": chunks_manifest,
+            })
+            self._committed_deleted = deleted
+
+    def commit_chunks(self, chunks_manifest: dict):
+        """Commit a new manifest of the chunk store (after its compaction) with the committed segments."""
+        with self._lock:
+            self._commit({**self.manifest, "sequence": self.manifest["sequence"] + 1, "chunks": chunks_manifest})
+
+    def _write_index(self, index, name: str) -> str:
+        file = os.path.join(SEGMENTS_DIR, name)
+        path = os.path.join(self.directory, file)
+        faiss.write_index(index, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return file
+
+    def _write_tombstones(self, deleted: np.ndarray, sequence: int):
+        if not len(deleted):
+            return None
+        file = os.path.join(SEGMENTS_DIR, f"tombstones-{sequence}.npy")
+        _save_array(os.path.join(self.directory, file), deleted=deleted)
+        return file
+
+    def _commit(self, manifest: dict):
+        """Write segments.json, then remove the files no longer listed; call with the lock held."""
+        path = os.path.join(self.directory, SEGMENTS_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.manifest = manifest
+
+        listed = {entry["file"] for entry in manifest["segments"]}
+        listed.update(name for name in (manifest["template"], manifest["pending"], manifest["tombstones"]) if name)
+        compacting = self._compactor is not None and self._compactor.is_alive()
+        for name in os.listdir(os.path.join(self.directory, SEGMENTS_DIR)):
+            file = os.path.join(SEGMENTS_DIR, name)
+            # a compaction in progress writes its segment to a .tmp file
+            if file not in listed and not (compacting and name.endswith(".tmp")):
+                os.remove(os.path.join(self.directory, file))
+        for name in os.listdir(self.directory):
+            stale_pending = name.startswith("pending-") and name.endswith((".npy", ".npz"))
+            if (stale_pending or name in (LEGACY_INDEX_FILE, LEGACY_PENDING_FILE)) and name not in listed:
+                os.remove(os.path.join(self.directory, name))
+
+    # --- compaction ---
+
+    def _next_compaction(self):
+        """
+        The committed segment entries to rewrite as one next, or None; call with the lock held.
+
+        A segment with too many deleted vectors comes first, then the smallest pair of
+        neighbours while there are too many segments.
+        """
+        entries = self.manifest["segments"]
+        deleted = self._committed_deleted
+        if len(deleted):
+            for entry in entries:
+                dead = len(_between(deleted, entry["first"], entry["last"]))
+                if dead > config.FAISS_MAX_DELETED_RATIO * entry["count"]:
+                    return [entry]
+        if 0 < config.FAISS_MAX_SEGMENTS < len(entries):
+            i = min(range(len(entries) - 1), key=lambda j: entries[j]["count"] + entries[j + 1]["count"])
+            return entries[i:i + 2]
+        return None
+
+    def maybe_compact(self):
+        """Start compacting segments in the background if some have too many deleted vectors or there are too many."""
+        with self._lock:
+            if self._next_compaction() is None:
+                return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact, name="faiss-compaction")
+        self._compactor.start()
+
+    def wait_for_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def _compact(self):
+        try:
+            while True:
+                with self._lock:
+                    run = self._next_compaction()
+                    if run is None:
+                        return
+                    first, last = run[0]["first"], run[-1]["last"]
+                    purged = _between(self._committed_deleted, first, last)
+                    file = os.path.join(SEGMENTS_DIR, f"seg-{self.manifest['sequence']}-merged.faiss")
+
+                # rewrite from the committed files, so segments being searched or changed are not touched
+                indexes = [faiss.read_index(os.path.join(self.directory, entry["file"])) for entry in run]
+                merged = indexes[0]
+                for other in indexes[1:]:
+                    merged = append_index(merged, other, self.index_config)
+                if len(purged):
+                    merged = remove_ids(merged, self.index_config, purged)
+                replacement = Segment(merged, file, first, last) if merged.ntotal else None
+                path = os.path.join(self.directory, file)
+                if replacement is not None:
+                    faiss.write_index(merged, path + ".tmp")
+
+                with self._lock:
+                    if not self._swap_in(run, replacement):
+                        # the segments were replaced meanwhile: pick again
+                        if replacement is not None:
+                            os.remove(path + ".tmp")
+                        continue
+                    if replacement is not None:
+                        os.replace(path + ".tmp", path)
+                    # the purged ids are gone from the segments searched from now on
+                    self.deleted = np.setdiff1d(self.deleted, purged)
+                    self._committed_deleted = np.setdiff1d(self._committed_deleted, purged)
+                    sequence = self.manifest["sequence"] + 1
+                    entries = self.manifest["segments"]
+                    i = entries.index(run[0])
+                    self._commit({
+                        **self.manifest,
+                        "sequence": sequence,
+                        "segments": entries[:i] + ([replacement.entry()] if replacement else [])
+                        + entries[i + len(run):],
+                        "tombstones": self._write_tombstones(self._committed_deleted, sequence),
+                    })
+                logger.info(f"Compacted FAISS segments {', '.join(entry['file'] for entry in run)} "
+                            f"({merged.ntotal} vectors, {len(purged)} deleted ones dropped)")
+        except Exception as e:
+            logger.warning(f"FAISS segment compaction stopped: {e}")
+
+    def _swap_in(self, run, replacement) -> bool:
+        """Replace a run of segments by their compaction (None if empty), if all are still committed and unchanged."""
+        entries = self.manifest["segments"]
+        count = len(run)
+        if not any(entries[j:j + count] == run for j in range(len(entries) - count + 1)):
+            return False
+        files = [segment.file for segment in self.segments]
+        try:
+            i = files.index(run[0]["file"])
+        except ValueError:
+            return False
+        if files[i:i + count] != [entry["file"] for entry in run]:
+            return False
+        self.segments = self.segments[:i] + ([replacement] if replacement else []) + self.segments[i + count:]
+        return True
@@ -1,8 +1,13 @@
 import os
 import chromadb
+import numpy as np
 from chromadb.errors import NotFoundError
+from utils import iter_batches
 from config import config
 
+# Stay below Chroma's maximum batch size for a single add/delete/get call
+CHROMA_BATCH_SIZE = 5000
+
 
 class ChromaEmbeddingFunction(chromadb.EmbeddingFunction):
     def __init__(self, embedding_function):
@@ -48,8 +53,24 @@ class PlatServedChromaDb:
                 embedding_function=self.embedding_function
             )
 
+    def is_new(self):
+        """True while the store holds no vectors, so the vector dimension is not fixed yet."""
+        try:
+            return self.client.get_collection(name=self.collection_name).count() == 0
+        except NotFoundError:
+            return True
+
     def store_the_chunks(self, chunks):
-        """Store document chunks in the vector database."""
+        """Store document chunks in the vector database; chunks may be any iterable, e.g. a chunk generator."""
+        for batch in iter_batches(chunks, config.INDEX_EMBED_BATCH_SIZE):
+            self._add_chunks(batch)
+
+    def store_the_embedded_chunks(self, chunks, embeddings):
+        """Store document chunks whose embeddings were already computed by the caller."""
+        self._add_chunks(chunks, np.asarray(embeddings, dtype='float32'))
+
+    def _add_chunks(self, chunks, embeddings=None):
+        """Add chunks to the collection, letting Chroma embed them when no embeddings are given."""
         if not self.collection:
             raise ValueError("Collection not initialized. Call set_embedding_function first.")
 
@@ -70,11 +91,12 @@ class PlatServedChromaDb:
 
         self.collection.add(
             documents=documents,
+            embeddings=embeddings,
             metadatas=metadatas,
             ids=ids
         )
 
-    def persist_vector_store(self):
+    def persist_vector_store(self, checkpoint=False, compact=True):
         """Persist the vector store (ChromaDB handles this automatically)."""
         pass
 
@@ -112,17 +134,75 @@ class PlatServedChromaDb:
             return False
 
         try:
-            # Query for documents with this file
-            results = self.collection.query(
-                query_texts=["dummy"],
-                n_results=1,
+            # Metadata-only lookup: unlike query(), get() does not embed anything
+            results = self.collection.get(
                 where={"file": file_name},
+                limit=1,
                 include=[]
             )
-            return len(results['ids'][0]) > 0 if results['ids'] else False
+            return len(results['ids']) > 0
         except Exception:
             return False
 
+    def list_indexed_files(self):
+        """Return the set of files that have chunks in the collection, paging through metadata only."""
+        files = set()
+        if not self.collection:
+            return files
+
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=CHROMA_BATCH_SIZE, offset=offset)
+            metadatas = page["metadatas"] or []
+            files.update(metadata["file"] for metadata in metadatas if metadata and "file" in metadata)
+            if len(metadatas) < CHROMA_BATCH_SIZE:
+                break
+            offset += CHROMA_BATCH_SIZE
+        return files
+
+    def list_chunk_ids_by_file(self):
+        """Return {file: [chunk ids]} for every file in the collection, from one paged metadata scan."""
+        chunk_ids = {}
+        if not self.collection:
+            return chunk_ids
+
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=CHROMA_BATCH_SIZE, offset=offset)
+            metadatas = page["metadatas"] or []
+            for chunk_id, metadata in zip(page["ids"], metadatas):
+                if metadata and "file" in metadata:
+                    chunk_ids.setdefault(metadata["file"], []).append(chunk_id)
+            if len(metadatas) < CHROMA_BATCH_SIZE:
+                break
+            offset += CHROMA_BATCH_SIZE
+        return chunk_ids
+
+    def list_file_chunk_ids(self, file_name):
+        """Return the ids of the chunks stored for a file."""
+        if not self.collection:
+            return []
+        return self.collection.get(where={"file": file_name}, include=[])["ids"]
+
+    def delete_chunks(self, chunk_ids):
+        """Remove chunks from the collection. Returns the number of ids requested."""
+        if not self.collection or not chunk_ids:
+            return 0
+        chunk_ids = list(chunk_ids)
+        for start in range(0, len(chunk_ids), CHROMA_BATCH_SIZE):
+            self.collection.delete(ids=chunk_ids[start:start + CHROMA_BATCH_SIZE])
+        return len(chunk_ids)
+
+    def delete_file(self, file_name):
+        """Remove every chunk of a file from the collection. Returns the number removed."""
+        return self.delete_chunks(self.list_file_chunk_ids(file_name))
+
+    def replace_file(self, file_name, chunks):
+        """Replace the chunks of a file with new ones (any iterable), embedding them. Returns the number removed."""
+        removed = self.delete_file(file_name)
+        self.store_the_chunks(chunks)
+        return removed
+
 
 class MockDocument:
     """Mock document class to maintain compatibility with existing code."""
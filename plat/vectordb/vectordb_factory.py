@@ -1,3 +1,4 @@
+import os
 from plat.vectordb.vectordb_chroma import PlatServedChromaDb
 from plat.vectordb.vectordb_faiss import PlatServedFaissDb
 from plat.vectordb.vectordb_milvus import PlatServedMilvusDb
@@ -26,3 +27,7 @@ class VectorDbFactory:
             )
         else:
             raise ValueError(f"Unsupported model type: {self.db_type}")
+
+    def get_store_dir(self):
+        """Local directory of the store, where index-side files such as the manifest live."""
+        return os.path.join(config.VECTORDB_ROOT, f"{self.db_type}-{self.vectordb_provider}")
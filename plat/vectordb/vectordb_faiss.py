@@ -1,15 +1,33 @@
 import os
+import json
 import faiss
 import pickle
+import threading
 import numpy as np
 """
 FAISS vector database implementation for the RAG system.
 
 This module provides a FAISS-based vector store that supports storing document chunks,
-searching for similar content, and persisting the index to disk.
+searching for similar content, and persisting the index to disk. The index family (flat,
+ivf, hnsw or ivfpq) is described in plat/vectordb/faiss_index.py, the segments the
+index is persisted in in plat/vectordb/faiss_segments.py, and the memory-mapped chunk
+metadata in plat/vectordb/chunk_store.py.
 """
 
+from utils import iter_batches
+from plat.vectordb.chunk_store import ChunkStore
+from plat.vectordb.faiss_index import (
+    INDEX_CONFIG_FILE, index_config_from_settings, load_index_config, write_index_config,
+    needs_training, train_size, create_index, train_index,
+)
+from plat.vectordb.faiss_segments import SEGMENTS_FILE, SegmentedIndex
 from config import config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# a build may commit and remove the files of the state being loaded: load the new one
+_LOAD_ATTEMPTS = 3
 
 
 class PlatServedFaissDb:
@@ -18,6 +36,11 @@ class PlatServedFaissDb:
 
     Provides methods for storing document embeddings, searching for similar chunks,
     and persisting the index and metadata to disk.
+
+    Vectors are stored under the stable ids the chunk store assigns. Deleting chunks
+    (delete_file, delete_chunks, replace_file) marks their metadata and their vectors
+    deleted, so they drop out of searches at once, also while other threads search the
+    same store; compaction frees them in the background.
     """
     def __init__(self, vectordb_provider: str, api_url: str, api_key: str = None):
         self.vectordb_provider = vectordb_provider
@@ -28,15 +51,21 @@ class PlatServedFaissDb:
         self.db_dir = os.path.join(config.VECTORDB_ROOT, f"faiss-{vectordb_provider}")
         os.makedirs(self.db_dir, exist_ok=True)
 
-        self.index_path = os.path.join(self.db_dir, "index.faiss")
+        self.chunks_dir = os.path.join(self.db_dir, "chunks")
+        # pickled metadata of stores written before the chunk store, migrated on load
         self.metadata_path = os.path.join(self.db_dir, "metadata.pkl")
         self.id_map_path = os.path.join(self.db_dir, "id_map.pkl")
+        self.file_map_path = os.path.join(self.db_dir, "file_map.pkl")
+        self.index_config_path = os.path.join(self.db_dir, INDEX_CONFIG_FILE)
 
         # Initialize components
         self.embedding_function = None
-        self.index = None
-        self.metadata = []  # List of chunk metadata
-        self.id_to_idx = {}  # Maps chunk IDs to FAISS indices
+        self.index = None  # SegmentedIndex
+        self.pending = []  # (vectors, ids) waiting for an ivf index to be trained
+        self.chunks = None  # Chunk metadata, found by vector id
+        # guards the chunk store: searches read it while deletions and persists change it
+        self._lock = threading.RLock()
+        self._chunk_compactor = None
 
         # Load existing index if available
         self._load_index()
@@ -50,83 +79,236 @@ class PlatServedFaissDb:
             test_embedding = embedding_function.embed_query("test")
             embedding_dim = len(test_embedding)
 
-            # Create FAISS index
-            self.index = faiss.IndexFlatL2(embedding_dim)
+            # Create FAISS index; ivf types stay untrained until enough vectors are stored
+            self.index = SegmentedIndex(self.db_dir, index_config_from_settings(), embedding_dim)
 
-    def _load_index(self):
-        """Load existing FAISS index and metadata if available."""
-        try:
-            if os.path.exists(self.index_path):
-                self.index = faiss.read_index(self.index_path)
+    @property
+    def index_config(self):
+        return self.index.index_config if self.index is not None else None
 
-            if os.path.exists(self.metadata_path):
-                with open(self.metadata_path, 'rb') as f:
-                    self.metadata = pickle.load(f)
+    def is_new(self):
+        """True while the store holds no index, so the vector dimension is not fixed yet."""
+        return self.index is None
 
-            if os.path.exists(self.id_map_path):
-                with open(self.id_map_path, 'rb') as f:
-                    self.id_to_idx = pickle.load(f)
-
-        except Exception as e:
-            print(f"Warning: Could not load existing FAISS index: {e}")
-            self.index = None
-            self.metadata = []
-            self.id_to_idx = {}
+    def _load_index(self):
+        """Load existing FAISS index and metadata if available."""
+        for attempt in range(_LOAD_ATTEMPTS):
+            try:
+                # stores written before index configs existed hold a flat index
+                index_config = load_index_config(self.db_dir) or {"type": "flat"}
+                self.index, pending, chunks_manifest = SegmentedIndex.load(self.db_dir, index_config)
+                self.pending = [pending] if pending is not None else []
+
+                self.chunks = ChunkStore(self.chunks_dir, manifest=chunks_manifest)
+                if not self.chunks.exists() and os.path.exists(self.metadata_path):
+                    self._migrate_metadata()
+                return
+            except FileNotFoundError as e:
+                error = e
+            except Exception as e:
+                error = e
+                break
+
+        print(f"Warning: Could not load existing FAISS index: {error}")
+        self.index = None
+        self.pending = []
+        self.chunks = ChunkStore(self.chunks_dir, load=False)
+
+    def _migrate_metadata(self):
+        """Move the pickled metadata of an older store into the chunk store, once."""
+        with open(self.metadata_path, 'rb') as f:
+            metadata = pickle.load(f)
+        self.chunks.append(metadata)
+        del metadata
+        self.chunks.persist()
+        for path in (self.metadata_path, self.id_map_path, self.file_map_path):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"Migrated the metadata of {len(self.chunks)} chunks to {self.chunks_dir}")
 
     def store_the_chunks(self, chunks):
-        """Store document chunks in the FAISS index."""
+        """Store document chunks in the FAISS index; chunks may be any iterable, e.g. a chunk generator."""
         if not self.embedding_function or not self.index:
             raise ValueError("Embedding function not set. Call set_embedding_function first.")
 
-        # Prepare data for batch insertion
-        texts = [chunk["text"] for chunk in chunks]
-        embeddings = np.array(self.embedding_function.embed_documents(texts))
-
-        # Add to FAISS index
-        start_idx = len(self.metadata)
-        self.index.add(embeddings.astype('float32'))
-
-        # Store metadata
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = {
-                "id": chunk["id"],
-                "file": chunk["file"],
-                "page": chunk["page"],
-                "line": chunk["line"],
-                "count": chunk["count"],
-                "text": chunk["text"],
-                "faiss_idx": start_idx + i
-            }
-            self.metadata.append(chunk_metadata)
-            self.id_to_idx[chunk["id"]] = start_idx + i
-
-    def persist_vector_store(self):
-        """Persist the FAISS index and metadata to disk."""
-        if self.index:
-            faiss.write_index(self.index, self.index_path)
-
-        with open(self.metadata_path, 'wb') as f:
-            pickle.dump(self.metadata, f)
+        # Embed and add in bounded batches so a chunk stream is never held in memory at once
+        for batch in iter_batches(chunks, config.INDEX_EMBED_BATCH_SIZE):
+            embeddings = self.embedding_function.embed_documents([chunk["text"] for chunk in batch])
+            self.store_the_embedded_chunks(batch, embeddings)
 
-        with open(self.id_map_path, 'wb') as f:
-            pickle.dump(self.id_to_idx, f)
-
-    def search_similar_chunks(self, query_text, k=5):
-        """Search for similar chunks using FAISS."""
+    def store_the_embedded_chunks(self, chunks, embeddings):
+        """Store document chunks whose embeddings were already computed by the caller."""
+        if not self.index:
+            raise ValueError("FAISS index not initialized. Call set_embedding_function first.")
+
+        embeddings = np.asarray(embeddings, dtype='float32')
+        with self._lock:
+            # Store metadata; the chunk store assigns the ids the vectors are stored under
+            ids = self.chunks.append(chunks)
+
+            # Add to FAISS index, or hold the vectors until there are enough to train it
+            if self.index.is_trained:
+                self.index.add(embeddings, ids)
+            else:
+                self.pending.append((embeddings, ids))
+                if sum(len(ids) for _, ids in self.pending) >= train_size(self.index_config):
+                    self._train()
+
+    def _train(self):
+        """Train the ivf index on the buffered vectors, then add them."""
+        vectors = np.concatenate([vectors for vectors, _ in self.pending])
+        logger.info(f"Training the {self.index_config['type']} index on {len(vectors)} vectors")
+        self.index.train(vectors)
+        self.index.add(vectors, np.concatenate([ids for _, ids in self.pending]))
+        self.pending = []
+
+    def rebuild_index(self, index_config):
+        """
+        Convert the index to another type or parameters, reusing the stored vectors.
+
+        ivf types are trained on train_size() vectors spread evenly over the store. Both
+        indexes are held in memory until the new one is complete; converting from ivfpq
+        starts from its compressed, approximate vectors. The result is a single segment,
+        without the deleted vectors.
+        """
+        if self.pending:
+            self._train()
+        if not self.index or self.index.ntotal == 0:
+            raise ValueError("The FAISS store is empty")
+        self.index.wait_for_compaction()
+        if self.index_config["type"] == "ivfpq":
+            logger.warning("Rebuilding from an ivfpq index: its vectors are PQ approximations")
+
+        if needs_training(index_config):
+            wanted = np.unique(np.linspace(0, self.index.ntotal - 1, train_size(index_config)).astype(np.int64))
+            batches = []
+            first = 0
+            for _, vectors in self.index.reconstruct_all():
+                batches.append(vectors[wanted[(wanted >= first) & (wanted < first + len(vectors))] - first])
+                first += len(vectors)
+            sample = np.concatenate(batches)
+            rebuilt, index_config = train_index(index_config, self.index.d, sample)
+            template = faiss.clone_index(rebuilt)
+        else:
+            rebuilt = create_index(index_config, self.index.d)
+            template = create_index(index_config, self.index.d)
+        for ids, vectors in self.index.reconstruct_all():
+            rebuilt.add_with_ids(vectors, ids)
+        self.index.replace(rebuilt, index_config, template)
+
+    def persist_vector_store(self, checkpoint=False, compact=True):
+        """
+        Persist the FAISS index and metadata to disk.
+
+        Only what changed since the last persist is written: the vectors added since then as
+        a new segment, the ids of deleted vectors, and the new chunk metadata. Renaming
+        segments.json into place commits all of it at once, so a crash while writing leaves
+        the previous store intact. Segments piling up are merged, and deleted vectors and
+        chunk rows dropped, in the background afterwards; close() waits for that.
+
+        Args:
+            checkpoint: A mid-build checkpoint; vectors still waiting for training are saved
+                as they are, where otherwise the index is trained on them, whatever their number
+            compact: Start the background compaction afterwards; False commits only the
+                changes, e.g. a deletion made while serving queries, and leaves it to compact()
+        """
+        if not self.index:
+            return
+        with self._lock:
+            if self.pending and not checkpoint:
+                self._train()
+
+            write_index_config(self.index_config_path + ".tmp", self.index_config)
+            os.replace(self.index_config_path + ".tmp", self.index_config_path)
+            pending = None
+            if self.pending:
+                pending = tuple(np.concatenate(column) for column in zip(*self.pending))
+            chunks_manifest = self.chunks.prepare()
+            self.index.save(pending, chunks_manifest)
+            self.chunks.commit(chunks_manifest, write_manifest=False)
+        if compact:
+            self.index.maybe_compact()
+            self._maybe_compact_chunks()
+
+    def compact(self):
+        """Drop the committed deleted vectors and chunk rows if they are due, and wait for it."""
+        if not self.index:
+            return
+        self.index.maybe_compact()
+        self._maybe_compact_chunks()
+        self.close()
+
+    def _maybe_compact_chunks(self):
+        """Start removing deleted rows from the chunk store in the background once they exceed FAISS_MAX_DELETED_RATIO."""
+        if self._chunk_compactor is not None and self._chunk_compactor.is_alive():
+            return
+        with self._lock:
+            chunks = self.chunks
+            snapshot = chunks.compaction(config.FAISS_MAX_DELETED_RATIO)
+        if snapshot is None:
+            return
+        self._chunk_compactor = threading.Thread(
+            target=self._compact_chunks, args=(chunks, snapshot), name="chunk-compaction",
+        )
+        self._chunk_compactor.start()
+
+    def _compact_chunks(self, chunks, snapshot):
+        manifest = None
+        try:
+            # rewrite from the committed files, without holding the lock searches need
+            manifest = chunks.write_compaction(snapshot)
+        except Exception as e:
+            logger.warning(f"Chunk store compaction stopped: {e}")
+        with self._lock:
+            if not chunks.finish_compaction(snapshot, manifest):
+                return
+            self.index.commit_chunks(manifest)
+            chunks.commit(manifest, write_manifest=False)
+        logger.info(f"Compacted the chunk store ({len(snapshot['purged'])} deleted chunks dropped)")
+
+    def is_stale(self):
+        """True if another process committed the store since it was loaded; writing it would undo that."""
+        path = os.path.join(self.db_dir, SEGMENTS_FILE)
+        if not os.path.exists(path):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            sequence = json.load(f)["sequence"]
+        return self.index is None or sequence != self.index.manifest["sequence"]
+
+    def close(self):
+        """Wait for background compaction; call before releasing the store lock."""
+        if self._chunk_compactor is not None:
+            self._chunk_compactor.join()
+        if self.index is not None:
+            self.index.wait_for_compaction()
+
+    def search_similar_chunks(self, query_text, k=5, nprobe=None, ef_search=None):
+        """
+        Search for similar chunks using FAISS.
+
+        Args:
+            query_text: Text to search for
+            k: Number of chunks to return
+            nprobe: IVF cells to scan (ivf, ivfpq); more is slower and finds more true neighbours
+            ef_search: HNSW candidates to explore (hnsw); more is slower and finds more true neighbours
+        """
         if not self.embedding_function or not self.index or self.index.ntotal == 0:
             return []
 
         # Embed query
         query_embedding = np.array(self.embedding_function.embed_query(query_text)).astype('float32').reshape(1, -1)
 
-        # Search FAISS index
-        distances, indices = self.index.search(query_embedding, min(k, self.index.ntotal))
+        # Search every segment of the FAISS index; deleted vectors are skipped
+        distances, ids = self.index.search(query_embedding, k, nprobe, ef_search)
 
         # Format results
         results = []
-        for distance, idx in zip(distances[0], indices[0]):
-            if idx < len(self.metadata):
-                chunk_data = self.metadata[idx]
+        with self._lock:
+            # only the returned chunks are read from the chunk store
+            for distance, idx in zip(distances, self.chunks.positions_of(ids)):
+                if idx < 0:
+                    continue
+                chunk_data = self.chunks.get(int(idx))
                 # Create mock document for compatibility
                 mock_doc = MockDocument(
                     page_content=chunk_data["text"],
@@ -144,7 +326,81 @@ class PlatServedFaissDb:
 
     def check_file_is_indexed(self, file_name):
         """Check if a file has been indexed."""
-        return any(chunk["file"] == file_name for chunk in self.metadata)
+        with self._lock:
+            return file_name in self.chunks.file_index
+
+    def list_indexed_files(self):
+        """Return the set of files that have chunks in the index."""
+        with self._lock:
+            return set(self.chunks.file_index)
+
+    def get_file_chunk_ranges(self, file_name):
+        """Return the [start, end) chunk store row ranges and chunk count of a file, or None."""
+        with self._lock:
+            entry = self.chunks.file_index.get(file_name)
+            if entry is None:
+                return None
+            return {"ranges": [list(r) for r in entry["ranges"]], "count": entry["count"]}
+
+    def _file_positions(self, file_name):
+        entry = self.chunks.file_index.get(file_name)
+        if entry is None:
+            return []
+        return [idx for start, end in entry["ranges"] for idx in range(start, end)]
+
+    def list_chunk_ids_by_file(self):
+        """Return {file: [chunk ids]} for every file in the index."""
+        with self._lock:
+            return {
+                file_name: self.chunks.chunk_ids(self._file_positions(file_name))
+                for file_name in self.chunks.file_index
+            }
+
+    def list_file_chunk_ids(self, file_name):
+        """Return the ids of the chunks stored for a file."""
+        with self._lock:
+            return self.chunks.chunk_ids(self._file_positions(file_name))
+
+    def delete_file(self, file_name):
+        """Remove every chunk of a file; searches stop returning them at once. Returns the number removed."""
+        with self._lock:
+            return self._delete_positions(self._file_positions(file_name))
+
+    def replace_file(self, file_name, chunks):
+        """
+        Replace the chunks of a file with new ones (any iterable), embedding them.
+
+        The next persist commits the removal and the new chunks together.
+
+        Returns:
+            The number of chunks removed
+        """
+        removed = self.delete_file(file_name)
+        self.store_the_chunks(chunks)
+        return removed
+
+    def delete_chunks(self, chunk_ids):
+        """Remove chunks and their vectors from the index. Returns the number removed."""
+        with self._lock:
+            return self._delete_positions(self.chunks.positions(set(chunk_ids)))
+
+    def _delete_positions(self, positions):
+        if not positions or not self.index:
+            return 0
+        removed = set(positions)
+        ids = self.chunks.vector_ids(sorted(removed))
+        if self.pending:
+            # vectors still waiting for training are dropped from the buffer
+            pending = []
+            for vectors, held in self.pending:
+                keep = ~np.isin(held, ids)
+                if keep.any():
+                    pending.append((vectors[keep], held[keep]))
+            self.pending = pending
+        # searches skip the vectors from now on; compaction drops them from the segments
+        self.index.delete(ids)
+        self.chunks.delete(removed)
+        return len(removed)
 
     def convert_index_to_tsv(self, full_data=False):
         """Convert FAISS index to TSV format for visualization."""
@@ -153,7 +409,7 @@ class PlatServedFaissDb:
 
         try:
             # Reconstruct vectors
-            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            vectors = np.concatenate([batch for _, batch in self.index.reconstruct_all()])
             tsv_path = os.path.join(self.db_dir, "vectors.tsv")
             np.savetxt(tsv_path, vectors, delimiter="\t")
 
@@ -1,7 +1,19 @@
 import os
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType
+import json
+from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
+from utils import iter_batches
 from config import config
 
+# Page size for query iterators; deletes are sent in bounded expressions
+MILVUS_QUERY_BATCH_SIZE = 4096
+MILVUS_DELETE_BATCH_SIZE = 1000
+
+
+def _file_expr(file_name):
+    """Build a filter expression matching one file, escaping backslashes for the Milvus parser."""
+    escaped_file_name = file_name.replace('\\', '\\\\')
+    return f'file == "{escaped_file_name}"'
+
 
 class PlatServedMilvusDb:
     def __init__(self, vectordb_provider: str, api_url: str, api_key: str = None):
@@ -35,6 +47,10 @@ class PlatServedMilvusDb:
             # Collection doesn't exist, create it
             self._create_collection()
 
+    def is_new(self):
+        """True while the collection does not exist, so the vector dimension is not fixed yet."""
+        return not utility.has_collection(self.collection_name)
+
     def _create_collection(self):
         """Create the Milvus collection with proper schema."""
         if not self.embedding_function:
@@ -67,10 +83,20 @@ class PlatServedMilvusDb:
         self.collection.load()
 
     def store_the_chunks(self, chunks):
-        """Store document chunks in Milvus."""
+        """Store document chunks in Milvus; chunks may be any iterable, e.g. a chunk generator."""
         if not self.collection or not self.embedding_function:
             raise ValueError("Collection not initialized. Call set_embedding_function first.")
 
+        # Embed and insert in bounded batches so a chunk stream is never held in memory at once
+        for batch in iter_batches(chunks, config.INDEX_EMBED_BATCH_SIZE):
+            embeddings = self.embedding_function.embed_documents([chunk["text"] for chunk in batch])
+            self.store_the_embedded_chunks(batch, embeddings)
+
+    def store_the_embedded_chunks(self, chunks, embeddings):
+        """Store document chunks whose embeddings were already computed by the caller."""
+        if not self.collection:
+            raise ValueError("Collection not initialized. Call set_embedding_function first.")
+
         # Prepare data for batch insertion
         ids = []
         vectors = []
@@ -80,12 +106,9 @@ class PlatServedMilvusDb:
         lines = []
         counts = []
 
-        for chunk in chunks:
-            # Generate embeddings
-            vector = self.embedding_function.embed_query(chunk["text"])
-
+        for chunk, vector in zip(chunks, embeddings):
             ids.append(chunk["id"])
-            vectors.append(vector)
+            vectors.append([float(v) for v in vector])
             texts.append(chunk["text"])
             files.append(chunk["file"])
             pages.append(chunk["page"])
@@ -94,8 +117,8 @@ class PlatServedMilvusDb:
 
         # Insert data
         entities = [ids, vectors, texts, files, pages, lines, counts]
+        # Flushing seals a segment, so it is left to persist_vector_store
         self.collection.insert(entities)
-        self.collection.flush()
 
     def search_similar_chunks(self, query_text, k=5):
         """Search for similar chunks in Milvus."""
@@ -145,11 +168,8 @@ class PlatServedMilvusDb:
 
         try:
             # Query for documents with this file
-            # Escape backslashes for Milvus expression parser
-            escaped_file_name = file_name.replace('\\', '\\\\')
-            expr = f'file == "{escaped_file_name}"'
             results = self.collection.query(
-                expr=expr,
+                expr=_file_expr(file_name),
                 limit=1,
                 output_fields=[]
             )
@@ -157,7 +177,64 @@ class PlatServedMilvusDb:
         except Exception:
             return False
 
-    def persist_vector_store(self):
+    def list_indexed_files(self):
+        """Return the set of files that have chunks in the collection, paging through the file field only."""
+        if not self.collection:
+            return set()
+        return {row["file"] for row in self._iterate_rows('id != ""', ["file"])}
+
+    def list_chunk_ids_by_file(self):
+        """Return {file: [chunk ids]} for every file in the collection, from one paged scan of id and file."""
+        chunk_ids = {}
+        if not self.collection:
+            return chunk_ids
+        for row in self._iterate_rows('id != ""', ["id", "file"]):
+            chunk_ids.setdefault(row["file"], []).append(row["id"])
+        return chunk_ids
+
+    def list_file_chunk_ids(self, file_name):
+        """Return the ids of the chunks stored for a file."""
+        if not self.collection:
+            return []
+        return [row["id"] for row in self._iterate_rows(_file_expr(file_name), ["id"])]
+
+    def _iterate_rows(self, expr, output_fields):
+        """Yield every row matching expr, fetched in pages with a query iterator."""
+        iterator = self.collection.query_iterator(
+            batch_size=MILVUS_QUERY_BATCH_SIZE,
+            expr=expr,
+            output_fields=output_fields
+        )
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            iterator.close()
+
+    def delete_chunks(self, chunk_ids):
+        """Remove chunks from the collection. Returns the number of ids requested."""
+        if not self.collection or not chunk_ids:
+            return 0
+        chunk_ids = list(chunk_ids)
+        for start in range(0, len(chunk_ids), MILVUS_DELETE_BATCH_SIZE):
+            batch = chunk_ids[start:start + MILVUS_DELETE_BATCH_SIZE]
+            self.collection.delete(expr=f"id in {json.dumps(batch)}")
+        return len(chunk_ids)
+
+    def delete_file(self, file_name):
+        """Remove every chunk of a file from the collection. Returns the number removed."""
+        return self.delete_chunks(self.list_file_chunk_ids(file_name))
+
+    def replace_file(self, file_name, chunks):
+        """Replace the chunks of a file with new ones (any iterable), embedding them. Returns the number removed."""
+        removed = self.delete_file(file_name)
+        self.store_the_chunks(chunks)
+        return removed
+
+    def persist_vector_store(self, checkpoint=False, compact=True):
         """Persist the vector store (Milvus handles this automatically)."""
         if self.collection:
             self.collection.flush()
@@ -6,74 +6,183 @@ It discovers files, chunks them into semantic units, generates embeddings, and s
 them for later retrieval.
 """
 
-import os
-import numpy as np
 from utils.doc_file_find import find_files_with_ext
-from utils import chunk_a_text_file, chunk_a_code_file, chunk_a_pdf_file
+from indexer.index_pipeline import IndexPipeline
+from indexer.index_manifest import IndexManifest, describe_file
+from indexer.store_lock import StoreLock
 from plat.embedding.embedding_factory import EmbeddingFactory
+from plat.embedding.embedding_cache import CachedEmbeddings
+from plat.embedding.embedding_reduction import EmbeddingReducer, create_store_reduction, with_store_reduction
+from plat.http_transport import get_transport
 from plat.vectordb.vectordb_factory import VectorDbFactory
 from config import config
 
 
-def docIndex():
-    target_directory = config.RAW_DOC_PATH
-    exclude_subdirs = [".bak"]
-    desired_extensions = ".*"
+def docIndex(progress: dict = None, cancel_event=None):
+    """
+    Bring the vector store in line with the documents under RAW_DOC_PATH.
+
+    Args:
+        progress: Optional dict updated in place with the build phase and pipeline counters
+        cancel_event: Optional threading.Event; setting it stops the build, keeping the files already stored
+    """
+    progress = progress if progress is not None else {}
 
     # choose the embedding model
     embedding_model = EmbeddingFactory(
         embedding_provider=config.EMBEDDING_PROVIDER, api_key=config.EMBEDDING_API_KEY
     )
-    embedding_accessor = embedding_model.get_embedding_accessor()
+    embedding_accessor = embedding_model.get_embedding_accessor(indexing=True)
+    try:
+        _update_store(embedding_accessor, progress, cancel_event)
+    finally:
+        # release the embedding cache and stop any embedding worker processes
+        if isinstance(embedding_accessor, CachedEmbeddings):
+            progress["embedding_cache"] = dict(embedding_accessor.stats)
+        if hasattr(embedding_accessor, "close"):
+            embedding_accessor.close()
+
+
+def _update_store(embedding_accessor, progress: dict, cancel_event):
+    """Index, re-index and drop files so the store matches RAW_DOC_PATH."""
+    target_directory = config.RAW_DOC_PATH
+    exclude_subdirs = [".bak"]
+    desired_extensions = ".*"
 
-    # choose the vectordb model
+    # choose the vectordb model; only one build may write a store at a time
     vectordb_model = VectorDbFactory(
         vectordb_provider=config.VECTORDB_PROVIDER,
         db_type=config.VECTORDB_TYPE,
         api_key=config.VECTORDB_API_KEY,
     )
-    vectordb_accessor = vectordb_model.get_vectordb_accessor()
-    vectordb_accessor.set_embedding_function(embedding_accessor)
+    store_dir = vectordb_model.get_store_dir()
+    with StoreLock(store_dir):
+        vectordb_accessor = vectordb_model.get_vectordb_accessor()
 
-    # find files in the raw_doc stored
-    files_found = find_files_with_ext(
-        target_directory, desired_extensions, exclude_subdirs
-    )
-    files_new = []
-    if files_found:
-        for file_path in files_found:
-            is_indexed=vectordb_accessor.check_file_is_indexed(file_path)
-            if is_indexed:
-                continue
-            files_new.append(file_path)
-        total_files = len(files_found)
-        total_new = len(files_new)
-        if total_new == 0:
+        # find files in the raw_doc stored
+        progress["phase"] = "scanning"
+        files_found = find_files_with_ext(
+            target_directory, desired_extensions, exclude_subdirs
+        )
+
+        # a new store picks its dimensionality reduction before its first vector is written;
+        # from then on the saved transform applies to every document and query vector
+        if vectordb_accessor.is_new() and files_found and EmbeddingReducer.load(store_dir) is None:
+            progress["phase"] = "reducing"
+            create_store_reduction(embedding_accessor, store_dir, files_found)
+        embedding_accessor = with_store_reduction(embedding_accessor, store_dir)
+        vectordb_accessor.set_embedding_function(embedding_accessor)
+
+        # compare the files on disk with the manifest of what is already indexed
+        manifest = IndexManifest(store_dir)
+        if not manifest.exists:
+            _adopt_indexed_files(manifest, vectordb_accessor)
+        files_added, files_changed, files_removed, files_resumed = manifest.diff(files_found)
+        resume = {}
+        if manifest.build_in_progress or files_resumed:
+            progress["phase"] = "recovering"
+            resume = _recover_interrupted_build(manifest, vectordb_accessor, files_resumed)
+        if not (files_added or files_changed or files_removed or files_resumed):
+            if manifest.dirty:
+                manifest.save()
+            # files deleted on the admin page are only marked deleted in the store until now
+            if hasattr(vectordb_accessor, "compact"):
+                vectordb_accessor.compact()
+            progress["phase"] = "done"
             return
-    else:
-        return
-
-    # chunk all found files & load embeddings in vector store
-    all_chunks, all_vectors, chunks, vectors = (
-        [],
-        np.array([]),
-        [],
-        np.array([]),
-    )
-    for f_id, file in enumerate(files_new):
+
+        # drop the chunks of changed and removed files, then index added and changed files
+        files_stale = files_changed + files_removed
+        if files_stale:
+            progress["phase"] = "deleting"
+            stale_ids = []
+            for file in files_stale:
+                if manifest.is_complete(file):
+                    stale_ids.extend(manifest.chunk_ids(file))
+                else:
+                    # a partial entry only lists the chunks stored by the last checkpoint
+                    vectordb_accessor.delete_file(file)
+            vectordb_accessor.delete_chunks(stale_ids)
+            for file in files_stale:
+                manifest.forget(file)
+
+        # chunk, embed & store the new files in a pipeline that checkpoints as it goes, then
+        # persist the vector store; the pipeline leaves only complete files behind when it
+        # stops early, so finished work is kept on failure too
+        progress["phase"] = "indexing"
+        manifest.begin_build()
+        pipeline = IndexPipeline(
+            embedding_accessor, vectordb_accessor, manifest=manifest,
+            stats=progress, cancel_event=cancel_event, resume=resume,
+        )
+        try:
+            pipeline.run(files_resumed + files_added + files_changed)
+        finally:
+            progress["phase"] = "persisting"
+            vectordb_accessor.persist_vector_store()
+            if hasattr(vectordb_accessor, "close"):
+                vectordb_accessor.close()
+            manifest.end_build()
+            manifest.save()
+            http_stats = get_transport().stats()
+            if http_stats:
+                progress["http"] = http_stats
+        progress["phase"] = "done"
+
+
+def unindex_file(file_path, vectordb_accessor, store_dir):
+    """
+    Drop one document from the vector store and the index manifest, without a build.
+
+    Searches through vectordb_accessor stop returning the file's chunks at once. Call
+    with the store lock held: the removal is persisted before this returns. Only the
+    deletion is committed; the next build compacts the store.
+
+    Returns:
+        The number of chunks removed
+    """
+    removed = vectordb_accessor.delete_file(file_path)
+    vectordb_accessor.persist_vector_store(compact=False)
+    if hasattr(vectordb_accessor, "close"):
+        vectordb_accessor.close()
+    manifest = IndexManifest(store_dir)
+    manifest.forget(file_path)
+    if manifest.dirty:
+        manifest.save()
+    return removed
+
+
+def _recover_interrupted_build(manifest, vectordb_accessor, files_resumed):
+    """
+    Line the store up with the manifest after a build died between checkpoints.
+
+    Chunks of files the manifest does not know were written after the last checkpoint and
+    are dropped. For files recorded as partial, every chunk the store already holds is
+    reused, so it is not embedded again.
+
+    Returns:
+        Dict mapping resumed files to the set of chunk ids already stored for them
+    """
+    for file_path in vectordb_accessor.list_indexed_files():
+        if file_path not in manifest.files:
+            vectordb_accessor.delete_file(file_path)
+    return {
+        file_path: set(vectordb_accessor.list_file_chunk_ids(file_path))
+        for file_path in files_resumed
+    }
+
+
+def _adopt_indexed_files(manifest, vectordb_accessor):
+    """Seed a new manifest with files indexed before manifests existed, so they are not re-embedded."""
+    # one bulk scan of chunk ids and files instead of a round trip per file
+    for file_path, chunk_ids in vectordb_accessor.list_chunk_ids_by_file().items():
         try:
-            _, ext = os.path.splitext(file)
-            match ext:
-                case ".pdf":
-                    chunks = chunk_a_pdf_file(file, config.MAX_CHUNK_SIZE, config.CHUNK_OVERLAP)
-                case ".txt":
-                    chunks = chunk_a_text_file(file, config.MAX_CHUNK_SIZE, config.CHUNK_OVERLAP)
-                case _:
-                    chunks = chunk_a_code_file(file, config.MAX_CHUNK_SIZE, config.CHUNK_OVERLAP)
-        except Exception as e:
-            print(f"An error occurred with file {file}: {e}")
-        else:
-            vectordb_accessor.store_the_chunks(chunks)
-
-    # persist the vector store
-    vectordb_accessor.persist_vector_store()
\ No newline at end of file
+            info = describe_file(file_path)
+        except OSError:
+            # gone from disk: recorded anyway so the diff reports it as removed and drops its chunks
+            info = {"size": -1, "mtime_ns": -1, "hash": ""}
+        manifest.record(file_path, info, chunk_ids)
+
+
+if __name__ == "__main__":
+    docIndex()
@@ -19,7 +19,11 @@ from flask import (
 from plat.llmodel.llmodel_factory import LLModelFactory
 from plat.vectordb.vectordb_factory import VectorDbFactory
 from plat.embedding.embedding_factory import EmbeddingFactory
-from rag_index import docIndex
+from plat.embedding.embedding_reduction import with_store_reduction
+from plat.embedding.query_cache import query_cache_stats
+from rag_index import docIndex, unindex_file
+from indexer.index_jobs import IndexJobManager, IndexJobConflict
+from indexer.store_lock import StoreLock, StoreLockedError
 from rerank.rerank_retrieved_docs import get_context_from_documents_with_query
 from config import config
 from logger import get_logger
@@ -56,7 +60,9 @@ def initialize_components():
             api_key=config.VECTORDB_API_KEY,
         )
         vectordb_accessor = vectordb_model.get_vectordb_accessor()
-        vectordb_accessor.set_embedding_function(embedding_accessor)
+        vectordb_accessor.set_embedding_function(
+            with_store_reduction(embedding_accessor, vectordb_model.get_store_dir())
+        )
         logger.info(f"Initialized vector database: {config.VECTORDB_TYPE}")
 
         # choose the llm model
@@ -78,6 +84,47 @@ def initialize_components():
         raise
 
 
+def _vectordb_model():
+    return VectorDbFactory(
+        vectordb_provider=config.VECTORDB_PROVIDER,
+        db_type=config.VECTORDB_TYPE,
+        api_key=config.VECTORDB_API_KEY,
+    )
+
+
+def reload_vector_store():
+    """Swap in a freshly loaded vector store so queries see the documents of a finished build."""
+    global vectordb_accessor
+    if embedding_accessor is None:
+        return
+    vectordb_model = _vectordb_model()
+    accessor = vectordb_model.get_vectordb_accessor()
+    # a build into a new store may have created its reduction
+    accessor.set_embedding_function(with_store_reduction(embedding_accessor, vectordb_model.get_store_dir()))
+    vectordb_accessor = accessor
+    logger.info(f"Reloaded vector database after indexing: {config.VECTORDB_TYPE}")
+
+
+def _writable_vector_store():
+    """The store queries are served from, reloaded first if another process committed to it since."""
+    if vectordb_accessor is None or (hasattr(vectordb_accessor, "is_stale") and vectordb_accessor.is_stale()):
+        reload_vector_store()
+    return vectordb_accessor if vectordb_accessor is not None else _vectordb_model().get_vectordb_accessor()
+
+
+def _positive_int(value):
+    """Return value as an int if it is a positive integer or its decimal string, else None."""
+    if isinstance(value, str) and value.strip().isdecimal():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return None
+
+
+# Index builds run in the background; queries keep being served meanwhile
+index_job_manager = IndexJobManager(docIndex, on_store_updated=reload_vector_store)
+
+
 @app.route("/")
 def index():
     initialize_components()
@@ -103,8 +150,18 @@ def query():
 
         logger.info(f"Processing query: '{query_text[:50]}...'")
 
-        # Retrieve and rerank the results
-        results = vectordb_accessor.search_similar_chunks(query_text, config.RETRIEVAL_DOCS)
+        # Retrieve and rerank the results; FAISS stores accept recall/latency knobs per query
+        search_kwargs = {}
+        if config.VECTORDB_TYPE == "faiss":
+            for name in ("nprobe", "ef_search"):
+                if data.get(name) in (None, ""):
+                    continue
+                value = _positive_int(data[name])
+                if value is None:
+                    logger.warning(f"Invalid {name} received: {data[name]!r}")
+                    return jsonify(error=f"{name} must be a positive integer"), 400
+                search_kwargs[name] = value
+        results = vectordb_accessor.search_similar_chunks(query_text, config.RETRIEVAL_DOCS, **search_kwargs)
         enhanced_context_text, sources = get_context_from_documents_with_query(query_text, results, config.RELEVANT_DOCS)
 
         # Generate response from LLM
@@ -123,6 +180,11 @@ def query():
         return jsonify(error="Internal server error"), 500
 
 
+@app.route("/query_cache", methods=["GET"])
+def query_cache():
+    return jsonify(query_cache_stats())
+
+
 @app.route("/admin")
 def admin():
     files = os.listdir(config.RAW_DOC_PATH)
@@ -180,13 +242,21 @@ def delete_file(filename):
             return "Invalid filename", 400
 
         file_path = os.path.join(config.RAW_DOC_PATH, filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"File deleted successfully: {filename}")
-        else:
-            logger.warning(f"File not found for deletion: {filename}")
+        # drop the file's chunks too, so queries stop citing it without waiting for a build
+        store_dir = _vectordb_model().get_store_dir()
+        with StoreLock(store_dir):
+            removed = unindex_file(file_path, _writable_vector_store(), store_dir)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                logger.info(f"File deleted successfully: {filename} ({removed} chunks removed from the index)")
+            else:
+                logger.warning(f"File not found for deletion: {filename}")
         return redirect(url_for("admin"))
 
+    except StoreLockedError as e:
+        logger.warning(f"Not deleting {filename} during an index build: {e}")
+        return "An index build is running; delete the file once it finishes", 409
+
     except Exception as e:
         logger.error(f"Error deleting file {filename}: {e}")
         return "Delete failed", 500
@@ -195,14 +265,49 @@ def delete_file(filename):
 @app.route('/index_docs', methods=['POST'])
 def index_docs():
     try:
-        logger.info("Starting document indexing process")
-        docIndex()
-        logger.info("Document indexing completed successfully")
-        return jsonify({'message': 'Data loaded successfully!'})
+        job = index_job_manager.submit(_vectordb_model().get_store_dir())
+        logger.info(f"Started document indexing job {job.job_id}")
+        return jsonify({
+            'message': 'Indexing started',
+            'job_id': job.job_id,
+            'status_url': url_for('index_job_status', job_id=job.job_id),
+        }), 202
+
+    except IndexJobConflict as e:
+        logger.warning(f"Indexing already in progress: {e}")
+        return jsonify({
+            'error': 'Indexing already in progress',
+            'job_id': e.job.job_id,
+            'status_url': url_for('index_job_status', job_id=e.job.job_id),
+        }), 409
 
     except Exception as e:
-        logger.error(f"Error during document indexing: {e}")
-        return jsonify({'error': 'Indexing failed'}), 500
+        logger.error(f"Error starting document indexing: {e}")
+        return jsonify({'error': 'Indexing failed to start'}), 500
+
+
+@app.route('/index_jobs', methods=['GET'])
+def index_jobs():
+    return jsonify(jobs=[job.to_dict() for job in index_job_manager.list()])
+
+
+@app.route('/index_jobs/<job_id>', methods=['GET'])
+def index_job_status(job_id):
+    job = index_job_manager.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown index job"), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/index_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_index_job(job_id):
+    job = index_job_manager.get(job_id)
+    if job is None:
+        return jsonify(error="Unknown index job"), 404
+    if not index_job_manager.cancel(job_id):
+        return jsonify(error=f"Index job already {job.status}"), 409
+    logger.info(f"Cancellation requested for index job {job_id}")
+    return jsonify(job.to_dict()), 202
 
 
 @app.route('/goto_chat', methods=['GET', 'POST'])
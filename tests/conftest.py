@@ -0,0 +1,83 @@
+"""
+Shared fixtures: a deterministic embedding model and vector stores under tmp_path.
+
+Run the tests from the repository root with `python -m pytest tests`.
+"""
+
+import os
+import sys
+import hashlib
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+
+DIM = 16
+
+
+class FakeEmbeddings:
+    """Embed a text as a unit vector seeded by its hash: equal texts get equal vectors."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
+    @staticmethod
+    def vector(text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def make_chunks(file: str, count: int, first: int = 1):
+    """Chunks of a file in the shape the chunkers produce."""
+    return [
+        {
+            "id": f"f({file}):p(1)l({n}-{n}):{n}",
+            "file": file,
+            "page": 1,
+            "line": f"{n}-{n}",
+            "count": 3,
+            "text": f"chunk {n} of {file}",
+        }
+        for n in range(first, first + count)
+    ]
+
+
+@pytest.fixture
+def store_root(tmp_path, monkeypatch):
+    """Point VECTORDB_ROOT at a fresh directory, with the text and embedding caches off."""
+    root = tmp_path / "vdb"
+    monkeypatch.setattr(config, "VECTORDB_ROOT", str(root))
+    monkeypatch.setattr(config, "TEXT_CACHE_MAX_MB", 0)
+    # chunk workers are spawned processes that read their config from the environment
+    monkeypatch.setenv("TEXT_CACHE_MAX_MB", "0")
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_MAX_MB", 0)
+    monkeypatch.setattr(config, "FAISS_INDEX_TYPE", "flat")
+    return root
+
+
+@pytest.fixture
+def open_faiss_store(store_root):
+    """Open (or reopen) the FAISS store under store_root; the stores are closed after the test."""
+    from plat.vectordb.vectordb_faiss import PlatServedFaissDb
+
+    opened = []
+
+    def open_store():
+        store = PlatServedFaissDb("local", None)
+        store.set_embedding_function(FakeEmbeddings())
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
@@ -0,0 +1,235 @@
+import os
+import numpy as np
+import pytest
+from config import config
+from plat.vectordb import chunk_store as chunk_store_module
+from plat.vectordb.chunk_store import ChunkStore
+from plat.vectordb.faiss_index import stored_ids
+from conftest import make_chunks
+
+
+def _file_positions(store, file_name):
+    entry = store.file_index.get(file_name)
+    return [pos for start, end in entry["ranges"] for pos in range(start, end)] if entry else []
+
+
+def _rows_by_vid(store):
+    """{vid: chunk} of every row that is not deleted."""
+    rows = {}
+    for file_name in store.file_index:
+        positions = _file_positions(store, file_name)
+        for vid, pos in zip(store.vector_ids(positions).tolist(), positions):
+            rows[vid] = store.get(pos)
+    return rows
+
+
+def _assert_consistent(store, expected):
+    """The store holds exactly the expected {vid: chunk} rows, by every lookup."""
+    assert _rows_by_vid(store) == expected
+    vids = np.array(sorted(expected), dtype=np.int64)
+    positions = store.positions_of(vids)
+    assert (positions >= 0).all()
+    assert [store.get(int(pos)) for pos in positions] == [expected[vid] for vid in vids.tolist()]
+    chunk_ids = [chunk["id"] for chunk in expected.values()]
+    assert sorted(store.chunk_ids(store.positions(chunk_ids))) == sorted(chunk_ids)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks"), load=False)
+    for number in range(4):
+        store.append(make_chunks(f"doc{number}.txt", 25))
+    store.persist()
+    return store
+
+
+def test_delete_hides_rows_until_compaction_and_persists_tombstones(store, tmp_path):
+    expected = _rows_by_vid(store)
+    removed = store.vector_ids(_file_positions(store, "doc1.txt"))
+    rows = len(store)
+
+    store.delete(_file_positions(store, "doc1.txt"))
+    for vid in removed.tolist():
+        del expected[vid]
+    assert "doc1.txt" not in store.file_index
+    assert (store.positions_of(removed) == -1).all()
+    assert store.positions([chunk["id"] for chunk in make_chunks("doc1.txt", 25)]) == []
+    _assert_consistent(store, expected)
+
+    store.persist()
+    manifest = store._manifest
+    # the rows stay in place, only the tombstones are written
+    assert manifest["rows"] == rows
+    assert manifest["deleted"]["rows"] == len(removed)
+    reopened = ChunkStore(str(tmp_path / "chunks"))
+    _assert_consistent(reopened, expected)
+
+
+def test_compaction_keeps_surviving_rows_and_vids(store, tmp_path):
+    store.delete(_file_positions(store, "doc2.txt"))
+    store.delete(store.positions(["f(doc0.txt):p(1)l(3-3):3"]))
+    store.persist()
+    expected = _rows_by_vid(store)
+    next_vid = store._next_vid
+
+    snapshot = store.compaction(max_deleted_ratio=0.1)
+    assert snapshot is not None
+    manifest = store.write_compaction(snapshot)
+    assert store.finish_compaction(snapshot, manifest)
+    store.commit(manifest)
+
+    assert len(store) == len(expected)
+    assert store._manifest["deleted"] is None
+    assert "doc2.txt" not in store.files
+    _assert_consistent(store, expected)
+    # vector ids are never reused
+    assert store.append(make_chunks("doc9.txt", 1)).tolist() == [next_vid]
+    _assert_consistent(ChunkStore(str(tmp_path / "chunks")), expected)
+
+
+def test_compaction_is_not_due_below_the_ratio(store):
+    store.delete(store.positions(["f(doc0.txt):p(1)l(1-1):1"]))
+    store.persist()
+    assert store.compaction(max_deleted_ratio=0.2) is None
+
+
+def test_writes_during_compaction_are_kept(store, tmp_path):
+    store.delete(_file_positions(store, "doc3.txt"))
+    store.persist()
+    snapshot = store.compaction(max_deleted_ratio=0.1)
+    manifest = store.write_compaction(snapshot)
+
+    # rows added and deleted between the snapshot and the swap, committed or not
+    added = store.append(make_chunks("doc5.txt", 10))
+    store.delete(_file_positions(store, "doc0.txt")[:5])
+    store.delete(store.positions(["f(doc5.txt):p(1)l(2-2):2"]))
+    expected = _rows_by_vid(store)
+    assert store.finish_compaction(snapshot, manifest)
+    store.commit(manifest)
+
+    _assert_consistent(store, expected)
+    assert set(added.tolist()) - set(expected) == {added[1]}
+    store.persist()
+    _assert_consistent(ChunkStore(str(tmp_path / "chunks")), expected)
+
+
+def test_compaction_is_dropped_after_a_persist(store, tmp_path):
+    store.delete(_file_positions(store, "doc3.txt"))
+    store.persist()
+    snapshot = store.compaction(max_deleted_ratio=0.1)
+    manifest = store.write_compaction(snapshot)
+
+    store.append(make_chunks("doc5.txt", 3))
+    store.persist()
+    expected = _rows_by_vid(store)
+    assert not store.finish_compaction(snapshot, manifest)
+    _assert_consistent(store, expected)
+    assert not any(name.endswith(".tmp") for name in os.listdir(str(tmp_path / "chunks")))
+    _assert_consistent(ChunkStore(str(tmp_path / "chunks")), expected)
+
+
+def test_id_runs_merge_and_resolve_hash_collisions(tmp_path, monkeypatch):
+    store = ChunkStore(str(tmp_path / "chunks"), load=False)
+    chunks = []
+    for batch in range(12):
+        chunks += make_chunks(f"doc{batch}.txt", batch + 1)
+        store.append(chunks[-(batch + 1):])
+        store.persist()
+    # one run per persist would be 12; merging keeps O(log n) of them
+    assert len(store._manifest["id_runs"]) < 6
+    found = store.positions([chunk["id"] for chunk in chunks])
+    assert store.chunk_ids(found) == [chunk["id"] for chunk in chunks]
+
+    # every id sharing one hash: lookups still tell them apart by the id itself
+    monkeypatch.setattr(chunk_store_module, "id_hash", lambda chunk_id: 7)
+    colliding = ChunkStore(str(tmp_path / "colliding"), load=False)
+    colliding.append(make_chunks("a.txt", 5))
+    colliding.persist()
+    colliding.append(make_chunks("a.txt", 5, first=6))
+    colliding.persist()
+    wanted = [chunk["id"] for chunk in make_chunks("a.txt", 10)]
+    assert colliding.chunk_ids(colliding.positions(wanted[::-1])) == wanted[::-1]
+
+
+def test_deleted_chunks_disappear_from_search(open_faiss_store):
+    store = open_faiss_store()
+    for number in range(3):
+        store.store_the_chunks(make_chunks(f"doc{number}.txt", 10))
+    store.persist_vector_store()
+    query = "chunk 4 of doc1.txt"
+    assert store.search_similar_chunks(query, k=1)[0][0].metadata["file"] == "doc1.txt"
+
+    assert store.delete_file("doc1.txt") == 10
+    # at once, before the deletion is persisted
+    assert all(doc.metadata["file"] != "doc1.txt" for doc, _ in store.search_similar_chunks(query, k=30))
+    store.persist_vector_store(compact=False)
+
+    reopened = open_faiss_store()
+    results = reopened.search_similar_chunks(query, k=30)
+    assert len(results) == 20
+    assert all(doc.metadata["file"] != "doc1.txt" for doc, _ in results)
+    assert "doc1.txt" not in reopened.list_indexed_files()
+
+
+def test_store_compaction_keeps_survivors_in_their_segments(open_faiss_store, monkeypatch):
+    monkeypatch.setattr(config, "FAISS_MAX_DELETED_RATIO", 0.1)
+    store = open_faiss_store()
+    for number in range(4):
+        store.store_the_chunks(make_chunks(f"doc{number}.txt", 10))
+        store.persist_vector_store()
+    survivors = {
+        vid: chunk["id"] for vid, chunk in _rows_by_vid(store.chunks).items() if chunk["file"] != "doc1.txt"
+    }
+
+    store.delete_file("doc1.txt")
+    store.persist_vector_store()
+    store.close()
+
+    assert len(store.chunks) == len(survivors)
+    assert len(store.index.deleted) == 0
+    assert store.index.ntotal == len(survivors)
+    assert {vid: chunk["id"] for vid, chunk in _rows_by_vid(store.chunks).items()} == survivors
+    for segment in store.index.segments:
+        ids = stored_ids(segment.index)
+        assert ((ids >= segment.first) & (ids <= segment.last)).all()
+    all_ids = np.concatenate([stored_ids(segment.index) for segment in store.index.segments])
+    assert sorted(all_ids.tolist()) == sorted(survivors)
+
+    reopened = open_faiss_store()
+    for vid, chunk_id in survivors.items():
+        text = reopened.chunks.get(int(reopened.chunks.positions_of([vid])[0]))["text"]
+        assert reopened.search_similar_chunks(text, k=1)[0][0].metadata["source"] == chunk_id
+
+
+def test_store_writes_during_chunk_compaction_are_kept(open_faiss_store, monkeypatch):
+    monkeypatch.setattr(config, "FAISS_MAX_DELETED_RATIO", 0.1)
+    store = open_faiss_store()
+    for number in range(3):
+        store.store_the_chunks(make_chunks(f"doc{number}.txt", 10))
+    store.persist_vector_store()
+    store.delete_file("doc0.txt")
+
+    write_compaction = store.chunks.write_compaction
+
+    def write_while_changing(snapshot):
+        # another thread adds and deletes chunks while the compaction is being written
+        store.store_the_chunks(make_chunks("doc3.txt", 5))
+        store.delete_chunks(["f(doc2.txt):p(1)l(1-1):1"])
+        return write_compaction(snapshot)
+
+    monkeypatch.setattr(store.chunks, "write_compaction", write_while_changing)
+    store.persist_vector_store()
+    store.close()
+
+    assert store.chunks._manifest["rows"] == 20
+    expected = {"doc1.txt": 10, "doc2.txt": 9, "doc3.txt": 5}
+    assert {name: entry["count"] for name, entry in store.chunks.file_index.items()} == expected
+    store.persist_vector_store()
+
+    reopened = open_faiss_store()
+    assert {name: entry["count"] for name, entry in reopened.chunks.file_index.items()} == expected
+    assert reopened.search_similar_chunks("chunk 4 of doc3.txt", k=1)[0][0].metadata["file"] == "doc3.txt"
+    assert all(
+        doc.metadata["source"] != "f(doc2.txt):p(1)l(1-1):1"
+        for doc, _ in reopened.search_similar_chunks("chunk 1 of doc2.txt", k=30)
+    )
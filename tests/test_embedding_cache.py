@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from plat.embedding.embedding_cache import CachedEmbeddings
+from conftest import DIM, FakeEmbeddings
+
+ROW_BYTES = DIM * 4
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+    """Open (or reopen) a cache of at most `rows` vectors over its own FakeEmbeddings."""
+    opened = []
+
+    def open_cache(rows=100):
+        cache = CachedEmbeddings(FakeEmbeddings(), "fake-model", cache_dir=str(tmp_path), max_bytes=rows * ROW_BYTES)
+        opened.append(cache)
+        return cache
+
+    yield open_cache
+    for cache in opened:
+        cache.close()
+
+
+def _embedded(cache):
+    """Texts the provider was asked to embed, in order."""
+    return [text for call in cache.embedding_accessor.calls for text in call]
+
+
+def _assert_vectors(vectors, texts):
+    assert np.allclose(vectors, [FakeEmbeddings.vector(text) for text in texts])
+
+
+def test_only_misses_reach_the_provider(open_cache):
+    cache = open_cache()
+    texts = ["alpha", "beta", "alpha"]
+    _assert_vectors(cache.embed_documents(texts), texts)
+    assert _embedded(cache) == ["alpha", "beta"]
+    assert cache.stats == {"hits": 1, "misses": 2, "evictions": 0, "entries": 2}
+
+    # whitespace differences share an entry
+    vectors = cache.embed_documents(["beta", " alpha\n", "gamma"])
+    assert _embedded(cache) == ["alpha", "beta", "gamma"]
+    _assert_vectors(vectors, ["beta", "alpha", "gamma"])
+    assert cache.stats["hits"] == 3
+    assert cache.stats["misses"] == 3
+
+
+def test_least_recently_used_vectors_are_evicted_first(open_cache):
+    cache = open_cache(rows=4)
+    for text in ["a", "b", "c", "d"]:
+        cache.embed_documents([text])
+    cache.embed_documents(["a"])
+
+    # "b" is now the least recently used
+    cache.embed_documents(["e"])
+    assert cache.stats["evictions"] == 1
+    cache.embed_documents(["a", "c", "d", "e"])
+    assert _embedded(cache) == ["a", "b", "c", "d", "e"]
+
+    # used in that order, so "a" goes next
+    cache.embed_documents(["b"])
+    cache.embed_documents(["c", "d", "e", "b"])
+    assert _embedded(cache) == ["a", "b", "c", "d", "e", "b"]
+    cache.embed_documents(["a"])
+    assert _embedded(cache) == ["a", "b", "c", "d", "e", "b", "a"]
+    assert cache.stats["entries"] == 4
+
+
+def test_a_batch_larger_than_the_cache_is_embedded_in_full(open_cache):
+    cache = open_cache(rows=4)
+    texts = [f"text {n}" for n in range(10)]
+    _assert_vectors(cache.embed_documents(texts), texts)
+    assert cache.stats["entries"] == 4
+
+    # only the vectors that fit were kept
+    _assert_vectors(cache.embed_documents(texts), texts)
+    assert _embedded(cache) == texts + texts[4:]
+
+
+def test_reopened_cache_serves_the_vectors_stored_before(open_cache):
+    texts = [f"text {n}" for n in range(20)]
+    first = open_cache()
+    first.embed_documents(texts)
+    first.close()
+
+    reopened = open_cache()
+    _assert_vectors(reopened.embed_documents(texts[::-1]), texts[::-1])
+    assert _embedded(reopened) == []
+    assert reopened.stats["hits"] == 20
+
+    # entries added by another open cache are picked up from the shared log
+    other = open_cache()
+    other.embed_documents(["new text"])
+    reopened.embed_documents(["new text"])
+    assert _embedded(reopened) == []
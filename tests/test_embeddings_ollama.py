@@ -0,0 +1,103 @@
+import asyncio
+import json
+import httpx
+import pytest
+import requests
+from config import config
+from plat.embedding import embeddings_ollama
+from plat.embedding.embeddings_ollama import OllamaEmbeddings
+
+
+class _FakeServer:
+    """/api/embed that rejects batches over max_inputs with 413 and any batch holding "bad" with 400."""
+
+    def __init__(self, max_inputs=8, status=None, body=None, error=None):
+        self.max_inputs = max_inputs
+        self.status = status
+        self.body = body
+        self.error = error
+        self.batches = []
+
+    def reply(self, texts):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        if self.status is not None:
+            return self.status, self.body or "{}"
+        if len(texts) > self.max_inputs:
+            return 413, '{"error": "request entity too large"}'
+        if "bad" in texts:
+            return 400, '{"error": "the input length exceeds the context length"}'
+        return 200, json.dumps({"embeddings": [[float(len(text))] for text in texts]})
+
+
+class _Transport:
+    def __init__(self, server):
+        self.server = server
+
+    def post(self, url, json=None, timeout=None):
+        status, body = self.server.reply(json["input"])
+        response = requests.Response()
+        response.status_code = status
+        response._content = body.encode("utf-8")
+        response.url = url
+        return response
+
+
+class _AsyncTransport(_Transport):
+    async def post(self, url, json=None, timeout=None):
+        status, body = self.server.reply(json["input"])
+        return httpx.Response(status, content=body.encode("utf-8"), request=httpx.Request("POST", url))
+
+
+@pytest.fixture(params=["sync", "async"])
+def embed(request, monkeypatch):
+    """Embed a list of texts with OllamaEmbeddings against a fake server, on either path."""
+    monkeypatch.setattr(config, "OLLAMA_EMBEDDING_BATCH_SIZE", 16)
+    monkeypatch.setattr(config, "OLLAMA_EMBEDDING_CONCURRENCY", 1)
+    embeddings = OllamaEmbeddings("test-model")
+
+    def run(server, texts):
+        if request.param == "sync":
+            monkeypatch.setattr(embeddings_ollama, "get_transport", lambda: _Transport(server))
+            return embeddings.embed_documents(texts)
+        monkeypatch.setattr(embeddings_ollama, "get_async_transport", lambda: _AsyncTransport(server))
+        return asyncio.run(embeddings.aembed_documents(texts))
+
+    return run
+
+
+def test_rejected_batches_are_split_until_they_pass(embed):
+    server = _FakeServer(max_inputs=4)
+    texts = ["x" * n for n in range(1, 17)]
+    assert embed(server, texts) == [[float(n)] for n in range(1, 17)]
+    # the halves of the async path are in flight together, so only the sizes are compared
+    assert sorted(len(batch) for batch in server.batches) == [4, 4, 4, 4, 8, 8, 16]
+
+
+def test_a_rejected_input_fails_on_its_own(embed):
+    server = _FakeServer()
+    with pytest.raises(Exception, match="context length"):
+        embed(server, ["a", "b", "bad", "c"])
+    assert ["bad"] in server.batches
+    assert ["a"] not in server.batches
+
+
+@pytest.mark.parametrize("status, body", [
+    (500, '{"error": "model crashed"}'),
+    (200, "not json"),
+    (200, '{"embeddings": [[1.0]]}'),
+])
+def test_other_failures_are_raised_without_splitting(embed, status, body):
+    server = _FakeServer(status=status, body=body)
+    with pytest.raises(Exception):
+        embed(server, ["a", "b", "c", "d"])
+    assert server.batches == [["a", "b", "c", "d"]]
+
+
+def test_timeouts_are_raised_without_splitting(embed, request):
+    sync = request.node.callspec.params["embed"] == "sync"
+    server = _FakeServer(error=requests.exceptions.ReadTimeout("timed out") if sync else httpx.ReadTimeout("timed out"))
+    with pytest.raises(Exception, match="timed out"):
+        embed(server, ["a", "b", "c", "d"])
+    assert len(server.batches) == 1
@@ -0,0 +1,63 @@
+import json
+import threading
+import time
+import pytest
+from indexer import index_jobs
+from indexer.index_jobs import IndexJobManager, RUNNING, SUCCEEDED
+
+
+def _wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """A job manager keeping the last three finished jobs; its first build waits for release."""
+    monkeypatch.setattr(index_jobs, "HISTORY_SIZE", 3)
+    started, release = threading.Event(), threading.Event()
+
+    def build(progress, cancel_event):
+        if not started.is_set():
+            started.set()
+            release.wait()
+
+    manager = IndexJobManager(build, history_dir=str(tmp_path))
+    manager.started, manager.release = started, release
+    yield manager
+    release.set()
+
+
+def _run(manager, store):
+    job = manager.submit(store)
+    _wait_until(lambda: store not in manager._active)
+    return job
+
+
+def _history(tmp_path):
+    with open(tmp_path / index_jobs.HISTORY_FILE) as f:
+        return [record["job_id"] for record in json.load(f)]
+
+
+def test_only_the_most_recent_finished_jobs_are_kept(manager, tmp_path):
+    running = manager.submit("slow")
+    manager.started.wait()
+    jobs = [_run(manager, "fast") for _ in range(5)]
+
+    # running jobs are never dropped
+    assert running.status == RUNNING
+    kept = [job.job_id for job in reversed(jobs[-3:])]
+    assert [job.job_id for job in manager.list()] == kept + [running.job_id]
+    assert manager.get(jobs[0].job_id) is None
+    assert _history(tmp_path) == kept
+
+    # once finished, the oldest job makes way like any other
+    manager.release.set()
+    _wait_until(lambda: not manager._active)
+    assert running.status == SUCCEEDED
+    assert [job.job_id for job in manager.list()] == kept
+    assert _history(tmp_path) == kept
+    reloaded = IndexJobManager(manager.build, history_dir=str(tmp_path))
+    assert [job.job_id for job in reloaded.list()] == kept
@@ -0,0 +1,127 @@
+import shutil
+import threading
+import pytest
+from config import config
+from indexer.index_manifest import IndexManifest
+from indexer.index_pipeline import IndexCancelled, IndexPipeline
+from conftest import FakeEmbeddings
+
+# rag_index imports every vector store client
+pytest.importorskip("pymilvus")
+
+
+class _FakeEmbeddingFactory:
+    def __init__(self, **kwargs):
+        pass
+
+    def get_embedding_accessor(self, indexing=False):
+        return FakeEmbeddings()
+
+
+def _write_doc(path, paragraphs):
+    with open(path, "w") as f:
+        f.write("\n\n".join(
+            f"Paragraph {n} of {path.stem} describes step {n} of the procedure in some detail."
+            for n in range(paragraphs)
+        ))
+
+
+@pytest.fixture
+def build(store_root, tmp_path, monkeypatch):
+    """Run docIndex over a raw directory of one large and three small documents."""
+    import rag_index
+
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    _write_doc(raw_dir / "big.txt", 120)
+    for number in range(3):
+        _write_doc(raw_dir / f"doc{number}.txt", 10)
+    monkeypatch.setattr(config, "RAW_DOC_PATH", str(raw_dir))
+    monkeypatch.setattr(config, "VECTORDB_PROVIDER", "local")
+    monkeypatch.setattr(config, "VECTORDB_TYPE", "faiss")
+    monkeypatch.setattr(config, "MAX_CHUNK_SIZE", 200)
+    monkeypatch.setattr(config, "INDEX_CHUNK_WORKERS", 1)
+    monkeypatch.setattr(config, "INDEX_EMBED_WORKERS", 1)
+    monkeypatch.setattr(config, "INDEX_EMBED_BATCH_SIZE", 4)
+    monkeypatch.setattr(config, "INDEX_EMBED_ASYNC", False)
+    monkeypatch.setattr(config, "INDEX_CHECKPOINT_CHUNKS", 8)
+    monkeypatch.setattr(config, "INDEX_CHECKPOINT_SECONDS", 0)
+    monkeypatch.setattr(rag_index, "EmbeddingFactory", _FakeEmbeddingFactory)
+
+    def run(cancel_event=None):
+        rag_index.docIndex(cancel_event=cancel_event)
+
+    run.raw_dir = raw_dir
+    return run
+
+
+def _stored_ids(open_faiss_store):
+    store = open_faiss_store()
+    return {file: sorted(chunk_ids) for file, chunk_ids in store.list_chunk_ids_by_file().items()}
+
+
+def _uninterrupted(build, store_root, open_faiss_store):
+    """The chunk ids of a clean build of the raw directory as it is now, in a scratch store."""
+    build()
+    expected = _stored_ids(open_faiss_store)
+    shutil.rmtree(store_root)
+    return expected
+
+
+def _fail_after(patch, chunks, error):
+    """Make the store call error after every write once it has stored the given number of chunks."""
+    from plat.vectordb.vectordb_faiss import PlatServedFaissDb
+
+    store_the_embedded_chunks = PlatServedFaissDb.store_the_embedded_chunks
+    stored = []
+
+    def store_then_fail(self, batch, vectors):
+        store_the_embedded_chunks(self, batch, vectors)
+        stored.extend(batch)
+        if len(stored) >= chunks:
+            error()
+
+    patch.setattr(PlatServedFaissDb, "store_the_embedded_chunks", store_then_fail)
+
+
+def test_cancelled_build_resumes_to_the_same_chunks(build, store_root, open_faiss_store, monkeypatch):
+    expected = _uninterrupted(build, store_root, open_faiss_store)
+    big = str(build.raw_dir / "big.txt")
+
+    # cancelled part way through the small files, which follow the large one
+    cancel_event = threading.Event()
+    with monkeypatch.context() as patch, pytest.raises(IndexCancelled):
+        _fail_after(patch, len(expected[big]) + 8, cancel_event.set)
+        build(cancel_event)
+    interrupted = _stored_ids(open_faiss_store)
+    assert interrupted and len(interrupted) < len(expected)
+    # only whole files are kept, each with exactly its own chunks
+    assert all(expected[file] == chunk_ids for file, chunk_ids in interrupted.items())
+
+    build()
+    assert _stored_ids(open_faiss_store) == expected
+
+
+def test_changed_partial_file_drops_the_chunks_stored_after_its_checkpoint(
+        build, store_root, open_faiss_store, monkeypatch):
+    big = str(build.raw_dir / "big.txt")
+
+    def crash():
+        raise RuntimeError("killed")
+
+    # a build killed between checkpoints: the chunks of files in flight are left in the
+    # store, as they are on Chroma and Milvus, which write through at once
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(IndexPipeline, "_discard_partial_files", lambda self: None)
+        _fail_after(patch, 28, crash)
+        build()
+    manifest = IndexManifest(open_faiss_store().db_dir)
+    assert not manifest.is_complete(big)
+    assert len(_stored_ids(open_faiss_store)[big]) > len(manifest.chunk_ids(big))
+
+    # the file shrinks, so its new chunks reuse only some of the old ids
+    _write_doc(build.raw_dir / "big.txt", 30)
+    build()
+    resumed = _stored_ids(open_faiss_store)
+    shutil.rmtree(store_root)
+    assert resumed == _uninterrupted(build, store_root, open_faiss_store)
@@ -0,0 +1,72 @@
+import importlib
+import fitz
+import pytest
+from config import config
+from utils import text_cache
+from utils.chunk_a_pdf_file import chunk_a_pdf_file, chunk_a_pdf_page_range, renumber_pdf_chunks
+
+# the package exports a function of the same name as the module
+pdf_module = importlib.import_module("utils.chunk_a_pdf_file")
+
+PAGES = 7
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    """A PDF of PAGES pages, with the text cache on under tmp_path."""
+    monkeypatch.setattr(config, "TEXT_CACHE_MAX_MB", 64)
+    monkeypatch.setattr(config, "TEXT_CACHE_DIR", str(tmp_path / "text_cache"))
+    monkeypatch.setattr(text_cache, "_cache", None)
+    path = str(tmp_path / "manual.pdf")
+    with fitz.open() as doc:
+        for number in range(PAGES):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Section {number} explains part {number} of the manual.")
+            page.insert_text((72, 200), f"Section {number} ends with a second paragraph.")
+        doc.save(path)
+    return path
+
+
+@pytest.fixture
+def extractions(monkeypatch):
+    """The (start, end) page ranges read from PDFs rather than from the cache."""
+    calls = []
+    iter_pdf_pages = pdf_module.iter_pdf_pages
+
+    def counted(file, start=0, end=None):
+        calls.append((start, end))
+        return iter_pdf_pages(file, start, end)
+
+    monkeypatch.setattr(pdf_module, "iter_pdf_pages", counted)
+    return calls
+
+
+def _chunk_in_ranges(pdf, ranges):
+    chunks = []
+    for start, end in ranges:
+        chunks += renumber_pdf_chunks(chunk_a_pdf_page_range(pdf, start, end, 100, 10), len(chunks) + 1)
+    return chunks
+
+
+def test_page_ranges_are_served_from_the_whole_file_entry(pdf, extractions):
+    whole = chunk_a_pdf_file(pdf, 100, 10)
+    assert len({chunk["page"] for chunk in whole}) == PAGES
+    assert extractions == [(0, PAGES)]
+
+    # any range size, without reading the PDF again
+    assert _chunk_in_ranges(pdf, [(0, 3), (3, 7)]) == whole
+    assert _chunk_in_ranges(pdf, [(0, 2), (2, 4), (4, 6), (6, 7)]) == whole
+    assert extractions == [(0, PAGES)]
+
+
+def test_whole_file_is_served_from_the_page_range_entries(pdf, extractions):
+    ranges = _chunk_in_ranges(pdf, [(0, 4), (4, 7)])
+    assert extractions == [(0, 4), (4, 7)]
+    assert chunk_a_pdf_file(pdf, 100, 10) == ranges
+    assert extractions == [(0, 4), (4, 7)]
+
+
+def test_only_the_missing_pages_are_read(pdf, extractions):
+    _chunk_in_ranges(pdf, [(2, 4)])
+    assert chunk_a_pdf_file(pdf, 100, 10) == _chunk_in_ranges(pdf, [(0, 7)])
+    assert extractions == [(2, 4), (0, PAGES), (4, PAGES)]
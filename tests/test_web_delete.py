@@ -0,0 +1,79 @@
+import os
+import pytest
+from config import config
+from indexer.index_manifest import IndexManifest, describe_file
+from indexer.store_lock import StoreLock
+from conftest import FakeEmbeddings, make_chunks
+
+# rag_web imports every vector store client
+pytest.importorskip("pymilvus")
+
+
+@pytest.fixture
+def web(store_root, tmp_path, monkeypatch, open_faiss_store):
+    """The web app serving a FAISS store of three indexed documents."""
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    monkeypatch.setattr(config, "RAW_DOC_PATH", str(raw_dir))
+    monkeypatch.setattr(config, "VECTORDB_PROVIDER", "local")
+    monkeypatch.setattr(config, "VECTORDB_TYPE", "faiss")
+    monkeypatch.setattr(config, "FAISS_MAX_DELETED_RATIO", 0.01)
+    import rag_web
+
+    store = open_faiss_store()
+    manifest = IndexManifest(store.db_dir)
+    for number in range(3):
+        path = str(raw_dir / f"doc{number}.txt")
+        with open(path, "w") as f:
+            f.write(f"document {number}\n")
+        chunks = make_chunks(path, 10)
+        store.store_the_chunks(chunks)
+        manifest.record(path, describe_file(path), [chunk["id"] for chunk in chunks])
+    store.persist_vector_store()
+    manifest.save()
+
+    monkeypatch.setattr(rag_web, "embedding_accessor", FakeEmbeddings())
+    monkeypatch.setattr(rag_web, "vectordb_accessor", store)
+    return rag_web, store, raw_dir
+
+
+def _files(directory):
+    return {
+        os.path.relpath(os.path.join(dirpath, name), directory): os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _, names in os.walk(directory) for name in names
+    }
+
+
+def test_delete_removes_the_chunks_and_commits_only_tombstones(web, open_faiss_store):
+    rag_web, store, raw_dir = web
+    path = str(raw_dir / "doc1.txt")
+    before = _files(store.db_dir)
+
+    response = rag_web.app.test_client().post("/delete/doc1.txt")
+
+    assert response.status_code == 302
+    assert not os.path.exists(path)
+    assert path not in IndexManifest(store.db_dir).files
+    after = _files(store.db_dir)
+    written = {name for name in after if before.get(name) != after[name]}
+    # the chunk columns, blobs, id runs and index segments are left alone
+    assert {os.path.basename(name).split(".")[0] for name in written if name.startswith("chunks")} == {"deleted"}
+    assert not any(name.startswith("segments") and name.endswith(".faiss") for name in written)
+    assert all(before[name] == after[name] for name in before if name in after and name.endswith((".col", ".blob", ".faiss")))
+
+    reopened = open_faiss_store()
+    assert path not in reopened.list_indexed_files()
+    assert len(reopened.index.deleted) == 10
+    assert reopened.chunks._manifest["deleted"]["rows"] == 10
+    results = reopened.search_similar_chunks(f"chunk 3 of {path}", k=30)
+    assert len(results) == 20
+    assert all(doc.metadata["file"] != path for doc, _ in results)
+
+
+def test_delete_during_an_index_build_is_refused(web):
+    rag_web, store, raw_dir = web
+    with StoreLock(store.db_dir):
+        response = rag_web.app.test_client().post("/delete/doc1.txt")
+    assert response.status_code == 409
+    assert os.path.exists(str(raw_dir / "doc1.txt"))
+    assert str(raw_dir / "doc1.txt") in store.list_indexed_files()
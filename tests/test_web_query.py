@@ -0,0 +1,52 @@
+import pytest
+from config import config
+
+# rag_web imports every vector store client
+pytest.importorskip("pymilvus")
+
+
+class _FakeStore:
+    def __init__(self):
+        self.searches = []
+
+    def search_similar_chunks(self, query_text, k, **search_kwargs):
+        self.searches.append(search_kwargs)
+        return []
+
+
+class _FakeLLM:
+    def generate_response(self, context, question):
+        return "answer"
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """The web app answering queries from a fake FAISS store and LLM."""
+    monkeypatch.setattr(config, "RAW_DOC_PATH", str(tmp_path / "raw"))
+    monkeypatch.setattr(config, "VECTORDB_TYPE", "faiss")
+    import rag_web
+
+    store = _FakeStore()
+    monkeypatch.setattr(rag_web, "vectordb_accessor", store)
+    monkeypatch.setattr(rag_web, "llmodel_accessor", _FakeLLM())
+    monkeypatch.setattr(rag_web, "get_context_from_documents_with_query", lambda query, results, k: ("", []))
+    return rag_web.app.test_client(), store
+
+
+def test_search_parameters_are_passed_to_the_store(web):
+    client, store = web
+    response = client.post("/query", json={"query_text": "how?", "nprobe": "16", "ef_search": 64})
+    assert response.status_code == 200
+    response = client.post("/query", json={"query_text": "how?", "nprobe": "", "ef_search": None})
+    assert response.status_code == 200
+    assert store.searches == [{"nprobe": 16, "ef_search": 64}, {}]
+
+
+@pytest.mark.parametrize("name", ["nprobe", "ef_search"])
+@pytest.mark.parametrize("value", ["abc", "-3", -3, 0, 1.5, True, [8]])
+def test_invalid_search_parameters_are_rejected(web, name, value):
+    client, store = web
+    response = client.post("/query", json={"query_text": "how?", name: value})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": f"{name} must be a positive integer"}
+    assert store.searches == []
@@ -1,4 +1,9 @@
 from .doc_file_find import find_files_with_ext
-from .chunk_a_code_file import chunk_a_code_file
-from .chunk_a_text_file import chunk_a_text_file
-from .chunk_a_pdf_file import chunk_a_pdf_file
+from .chunk_a_code_file import chunk_a_code_file, iter_code_file_chunks
+from .chunk_a_text_file import chunk_a_text_file, iter_text_file_chunks
+from .pdf_extract import iter_pdf_pages, pdf_page_ranges
+from .chunk_a_pdf_file import chunk_a_pdf_file, iter_pdf_file_chunks, chunk_a_pdf_page_range, renumber_pdf_chunks
+from .chunk_a_file import chunk_a_file, iter_file_chunks
+from .file_hash import hash_file
+from .text_cache import TextCache, get_text_cache
+from .iter_batches import iter_batches
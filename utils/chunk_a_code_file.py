@@ -1,5 +1,13 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
+from .chunk_engine import accumulate_chunks
+from .text_cache import cached_units
+
+
+# Bump when _read_lines changes its output, to invalidate cached lines
+_EXTRACTOR_VERSION = 1
+_STATEMENT_END = re.compile(r"[;})][^\S\n]*$", re.MULTILINE)
+_BLOCK_BOUNDARY_PREFIXES = ('def ', 'class ', 'function ', 'public ', 'private ', 'protected ', '# ', '// ', '/* ')
 
 
 def chunk_a_code_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
@@ -15,104 +23,78 @@ def chunk_a_code_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -
         List of chunk dictionaries
     """
     try:
-        with open(file, "r", errors="ignore") as f:
-            code_text = f.read()
-
-        # Split into logical code blocks (functions, classes, etc.)
-        blocks = _split_code_into_blocks(code_text)
-
-        chunks = []
-        seq_no = 1
-        current_chunk = ""
-        current_size = 0
-        block_start = 0
-
-        for block_idx, block in enumerate(blocks):
-            # If adding this block would exceed the limit
-            if current_size + len(block) > max_chunk_size and current_chunk:
-                # Create chunk
-                line_range = f"{block_start + 1}-{block_idx}"
-                chunks.append(_create_code_chunk_metadata(file, current_chunk, seq_no, line_range))
-                seq_no += 1
-
-                # Start new chunk with overlap
-                if overlap > 0 and len(current_chunk) > overlap:
-                    overlap_text = current_chunk[-overlap:].strip()
-                    # Find a safe break point in overlap text
-                    safe_break = _find_safe_code_break(overlap_text)
-                    overlap_text = overlap_text[:safe_break] if safe_break else overlap_text
-
-                    current_chunk = overlap_text + "\n" + block
-                    current_size = len(current_chunk)
-                    block_start = block_idx
-                else:
-                    current_chunk = block
-                    current_size = len(block)
-                    block_start = block_idx
-            else:
-                # Add to current chunk
-                if current_chunk:
-                    current_chunk += "\n" + block
-                else:
-                    current_chunk = block
-                current_size = len(current_chunk)
-
-        # Add final chunk
-        if current_chunk:
-            line_range = f"{block_start + 1}-{len(blocks)}"
-            chunks.append(_create_code_chunk_metadata(file, current_chunk, seq_no, line_range))
-
-        return chunks
+        return list(iter_code_file_chunks(file, max_chunk_size, overlap))
 
     except Exception as e:
         # Fallback to simple line-based chunking
         return _fallback_chunk_code_file(file, max_chunk_size)
 
 
-def _split_code_into_blocks(code_text: str) -> List[str]:
-    """Split code into logical blocks (functions, classes, etc.)."""
-    # Split by common code boundaries
-    lines = code_text.splitlines()
-    blocks = []
+def iter_code_file_chunks(file: str, max_chunk_size: int = 500, overlap: int = 50) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of chunk_a_code_file: read the file line by line and yield chunks as produced.
+
+    Peak memory is bounded by max_chunk_size (and the longest line), not by the file size.
+
+    Args:
+        file: Path to the code file
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
+
+    Yields:
+        Chunk dictionaries
+    """
+    # Lines come from the text cache when this content was read before
+    lines = cached_units(file, "code", _EXTRACTOR_VERSION, _read_lines)
+    # Split into logical code blocks (functions, classes, etc.) and pack them into chunks
+    chunks = accumulate_chunks(_iter_code_blocks(lines, max_chunk_size), max_chunk_size, overlap,
+                               separator="\n", overlap_break=_find_safe_code_break)
+    for seq_no, (text, start, end) in enumerate(chunks, start=1):
+        yield _create_code_chunk_metadata(file, text, seq_no, f"{start + 1}-{end}")
+
+
+def _read_lines(file: str) -> Iterator[str]:
+    """Yield the lines of a code file without their line endings."""
+    with open(file, "r", errors="ignore") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def _iter_code_blocks(lines: Iterable[str], max_block_size: int) -> Iterator[str]:
+    """
+    Yield logical code blocks (functions, classes, etc.) from an iterable of lines without line endings.
+
+    A block ends before a boundary line (definition, comment or blank line); blocks that
+    grow past max_block_size without one are cut at a line break so memory stays bounded.
+    """
     current_block = []
+    current_size = 0
 
     for line in lines:
         stripped = line.strip()
         # Check if this is a boundary (function def, class def, etc.)
-        if (stripped.startswith(('def ', 'class ', 'function ', 'public ', 'private ', 'protected '))
-            or stripped.startswith(('# ', '// ', '/* '))
-            or not stripped):  # Empty lines as separators
+        if (stripped.startswith(_BLOCK_BOUNDARY_PREFIXES)
+            or not stripped  # Empty lines as separators
+            or current_size > max_block_size):
 
             if current_block:
-                blocks.append('\n'.join(current_block))
+                yield '\n'.join(current_block)
                 current_block = []
+                current_size = 0
 
         current_block.append(line)
+        current_size += len(line) + 1
 
     if current_block:
-        blocks.append('\n'.join(current_block))
-
-    return blocks if blocks else [code_text]
+        yield '\n'.join(current_block)
 
 
 def _find_safe_code_break(text: str) -> int:
     """Find a safe place to break code (after complete statements)."""
-    # Look for statement endings
-    patterns = [
-        r'[;]\s*$',  # Semicolon
-        r'[\}]\s*$',  # Closing brace
-        r'[\)]\s*$',  # Closing parenthesis
-    ]
-
-    lines = text.split('\n')
-    pos = 0
-
-    for i, line in enumerate(lines):
-        for pattern in patterns:
-            if re.search(pattern, line):
-                return pos + len('\n'.join(lines[:i+1]))
-
-        pos += len(line) + 1  # +1 for newline
+    # End of the first line that ends a statement: semicolon, closing brace or parenthesis
+    match = _STATEMENT_END.search(text)
+    if match:
+        return match.end()
 
     return len(text) // 2  # Fallback to middle
 
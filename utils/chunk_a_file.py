@@ -0,0 +1,52 @@
+import os
+from typing import List, Dict, Any, Iterator
+from .chunk_a_code_file import chunk_a_code_file, iter_code_file_chunks
+from .chunk_a_text_file import chunk_a_text_file, iter_text_file_chunks
+from .chunk_a_pdf_file import chunk_a_pdf_file, iter_pdf_file_chunks
+
+
+def chunk_a_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
+    """
+    Chunk a file with the chunker that matches its extension.
+
+    Args:
+        file: Path to the file
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
+
+    Returns:
+        List of chunk dictionaries
+    """
+    _, ext = os.path.splitext(file)
+    match ext:
+        case ".pdf":
+            return chunk_a_pdf_file(file, max_chunk_size, overlap)
+        case ".txt":
+            return chunk_a_text_file(file, max_chunk_size, overlap)
+        case _:
+            return chunk_a_code_file(file, max_chunk_size, overlap)
+
+
+def iter_file_chunks(file: str, max_chunk_size: int = 500, overlap: int = 50) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of chunk_a_file: yield the chunks of a file as its chunker produces them.
+
+    Unlike chunk_a_file, errors are raised instead of falling back to the simple chunkers,
+    since chunks may already have been consumed.
+
+    Args:
+        file: Path to the file
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
+
+    Yields:
+        Chunk dictionaries
+    """
+    _, ext = os.path.splitext(file)
+    match ext:
+        case ".pdf":
+            return iter_pdf_file_chunks(file, max_chunk_size, overlap)
+        case ".txt":
+            return iter_text_file_chunks(file, max_chunk_size, overlap)
+        case _:
+            return iter_code_file_chunks(file, max_chunk_size, overlap)
@@ -1,7 +1,11 @@
+import os
 import re
-import fitz  # PyMuPDF
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 from config import config
+from .chunk_engine import PARAGRAPH_BREAK, accumulate_chunks
+from .file_hash import hash_file
+from .pdf_extract import PDF_EXTRACTOR_VERSION, iter_pdf_pages, pdf_page_count
+from .text_cache import get_text_cache
 
 
 def chunk_a_pdf_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
@@ -17,100 +21,141 @@ def chunk_a_pdf_file(file: str, max_chunk_size: int = 500, overlap: int = 50) ->
         List of chunk dictionaries
     """
     try:
-        doc = fitz.open(file)
-        chunks = []
-        seq_no = 1
+        pages = list(_cached_pages(file))
+    except Exception as e:
+        print(f"Error extracting text from PDF {file}: {e}")
+        return []
 
-        for page_num, page in enumerate(doc):
-            try:
-                # Extract text with better structure preservation
-                text_blocks = page.get_text("dict")["blocks"]
-                page_text = _extract_page_text(text_blocks)
+    try:
+        return list(_chunk_pages(file, pages, max_chunk_size, overlap))
 
-                if not page_text.strip():
-                    continue
+    except Exception as e:
+        # Fallback to simple method if advanced method fails, reusing the extracted text
+        print(f"Error in advanced PDF chunking for {file}: {e}")
+        return _fallback_chunk_pdf_file(file, pages, max_chunk_size)
 
-                # Split into paragraphs for better semantic chunking
-                paragraphs = re.split(r'\n\s*\n', page_text)
-                paragraphs = [p.strip() for p in paragraphs if p.strip()]
 
-                page_chunks = _chunk_paragraphs(
-                    paragraphs, file, page_num + 1, max_chunk_size, overlap, seq_no
-                )
-                chunks.extend(page_chunks)
-                seq_no += len(page_chunks)
+def iter_pdf_file_chunks(file: str, max_chunk_size: int = 500, overlap: int = 50) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of chunk_a_pdf_file: yield each page's chunks as its text is extracted.
 
-            except Exception as e:
-                # Log error but continue with other pages
-                print(f"Error processing page {page_num + 1} in {file}: {e}")
-                continue
+    Args:
+        file: Path to the PDF file
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
 
-        doc.close()
-        return chunks
+    Yields:
+        Chunk dictionaries
+    """
+    return _chunk_pages(file, _cached_pages(file), max_chunk_size, overlap)
 
-    except Exception as e:
-        # Fallback to simple method if advanced method fails
-        print(f"Error in advanced PDF chunking for {file}: {e}")
-        return _fallback_chunk_pdf_file(file, max_chunk_size)
 
+def chunk_a_pdf_page_range(file: str, start: int, end: int,
+                           max_chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
+    """
+    Chunk the pages start..end-1 (0-based) of a PDF, so a large PDF can be chunked in parts.
+
+    The chunks are numbered from 1; renumber_pdf_chunks() numbers them as part of the whole
+    file once the chunk counts of the earlier page ranges are known.
 
-def _extract_page_text(text_blocks: List[Dict]) -> str:
-    """Extract and clean text from PDF text blocks."""
-    page_lines = []
-    for block in text_blocks:
-        if "lines" not in block:
+    Args:
+        file: Path to the PDF file
+        start: First page of the range, 0-based
+        end: Page after the last page of the range
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
+
+    Returns:
+        List of chunk dictionaries
+    """
+    return list(_chunk_pages(file, _cached_pages(file, start, end), max_chunk_size, overlap))
+
+
+def renumber_pdf_chunks(chunks: List[Dict[str, Any]], first_seq: int) -> List[Dict[str, Any]]:
+    """Number the chunks of a page range from first_seq, giving the ids chunking the whole file gives."""
+    for seq_no, chunk in enumerate(chunks, start=first_seq):
+        chunk["id"] = f"f({chunk['file']}):p({chunk['page']})l({chunk['line']}):{seq_no}"
+    return chunks
+
+
+def _cached_pages(file: str, start: int = 0, end: int = None) -> Iterator[Tuple[int, str]]:
+    """
+    (page number, page text) pairs of the pages start..end-1 (0-based), from the text cache
+    when this content was extracted before.
+
+    Each page is cached on its own, so whole-file and page-range chunking share the entries
+    whatever the range size. Runs of missing pages are extracted with one open of the PDF.
+    """
+    cache = get_text_cache()
+    if cache is None:
+        yield from iter_pdf_pages(file, start, end)
+        return
+
+    stat = os.stat(file)
+    content_hash = hash_file(file)
+    if end is None:
+        count = cache.get(content_hash, "pdf-pages", PDF_EXTRACTOR_VERSION)
+        if count is None:
+            count = [pdf_page_count(file)]
+            cache.put(file, stat, content_hash, "pdf-pages", PDF_EXTRACTOR_VERSION, count)
+        end = count[0]
+
+    extracted = None  # reads the PDF from the first page missing from the cache on
+    try:
+        for page_num in range(start, end):
+            kind = f"pdf-p{page_num + 1}"
+            units = cache.get(content_hash, kind, PDF_EXTRACTOR_VERSION)
+            if units is None:
+                if extracted is None:
+                    extracted = iter_pdf_pages(file, page_num, end)
+                page = next(extracted, None)
+                if page is None:
+                    break  # end is past the last page
+                units = [page]
+                cache.put(file, stat, content_hash, kind, PDF_EXTRACTOR_VERSION, units)
+            elif extracted is not None:
+                extracted.close()
+                extracted = None
+            yield units[0]
+    finally:
+        if extracted is not None:
+            extracted.close()
+
+def _chunk_pages(file: str, pages: Iterable[Tuple[int, str]],
+                 max_chunk_size: int, overlap: int) -> Iterator[Dict[str, Any]]:
+    """Chunk (page number, page text) pairs, numbering the chunks across the whole file."""
+    seq_no = 1
+
+    for page_num, page_text in pages:
+        if not page_text.strip():
+            continue
+
+        try:
+            page_chunks = _chunk_page_text(
+                page_text, file, page_num, max_chunk_size, overlap, seq_no
+            )
+        except Exception as e:
+            # Log error but continue with other pages
+            print(f"Error processing page {page_num} in {file}: {e}")
             continue
-        for line in block["lines"]:
-            line_text = "".join([span["text"] for span in line["spans"]])
-            if line_text.strip():
-                page_lines.append(line_text)
 
-    return "\n".join(page_lines)
+        yield from page_chunks
+        seq_no += len(page_chunks)
 
 
-def _chunk_paragraphs(paragraphs: List[str], file: str, page_num: int,
+def _chunk_page_text(page_text: str, file: str, page_num: int,
                      max_chunk_size: int, overlap: int, start_seq: int) -> List[Dict[str, Any]]:
-    """Chunk paragraphs with overlap."""
-    chunks = []
-    seq_no = start_seq
-    current_chunk = ""
-    current_size = 0
-    para_start = 1
-
-    for para_idx, paragraph in enumerate(paragraphs):
-        # If adding this paragraph would exceed the limit
-        if current_size + len(paragraph) > max_chunk_size and current_chunk:
-            # Create chunk
-            chunks.append(_create_pdf_chunk_metadata(
-                file, current_chunk, seq_no, page_num, f"{para_start}-{para_idx}"
-            ))
-            seq_no += 1
-
-            # Start new chunk with overlap
-            if overlap > 0 and len(current_chunk) > overlap:
-                overlap_text = current_chunk[-overlap:].strip()
-                current_chunk = overlap_text + " " + paragraph
-                current_size = len(current_chunk)
-                para_start = para_idx + 1
-            else:
-                current_chunk = paragraph
-                current_size = len(paragraph)
-                para_start = para_idx + 1
-        else:
-            # Add to current chunk
-            if current_chunk:
-                current_chunk += " " + paragraph
-            else:
-                current_chunk = paragraph
-            current_size = len(current_chunk)
-
-    # Add final chunk
-    if current_chunk:
-        chunks.append(_create_pdf_chunk_metadata(
-            file, current_chunk, seq_no, page_num, f"{para_start}-{len(paragraphs)}"
-        ))
+    """Split a page's text into paragraphs and chunk them with overlap."""
+    # Split into paragraphs for better semantic chunking
+    paragraphs = (p.strip() for p in PARAGRAPH_BREAK.split(page_text))
+    paragraphs = [p for p in paragraphs if p]
 
-    return chunks
+    return [
+        _create_pdf_chunk_metadata(file, text, seq_no, page_num, f"{start + 1}-{end}")
+        for seq_no, (text, start, end) in enumerate(
+            accumulate_chunks(paragraphs, max_chunk_size, overlap), start=start_seq
+        )
+    ]
 
 
 def _create_pdf_chunk_metadata(file: str, text: str, seq_no: int, page: int, line_range: str) -> Dict[str, Any]:
@@ -126,23 +171,15 @@ def _create_pdf_chunk_metadata(file: str, text: str, seq_no: int, page: int, lin
     }
 
 
-def _fallback_chunk_pdf_file(file: str, max_chunk_size: int = 500) -> List[Dict[str, Any]]:
-    """Fallback PDF chunking using simple sentence splitting."""
+def _fallback_chunk_pdf_file(file: str, pages: List[Tuple[int, str]], max_chunk_size: int = 500) -> List[Dict[str, Any]]:
+    """Fallback PDF chunking using simple sentence splitting over already extracted page texts."""
     sentence_enders = re.compile(r"[.!?]\s*")
 
     try:
-        doc = fitz.open(file)
         chunks, seq_no = [], 1
 
-        for page_num, page in enumerate(doc):
-            text_blocks = page.get_text("dict")["blocks"]
-            page_lines = []
-            for block in text_blocks:
-                if "lines" not in block:
-                    continue
-                for line in block["lines"]:
-                    line_text = "".join([span["text"] for span in line["spans"]])
-                    page_lines.append(line_text)
+        for page_num, page_text in pages:
+            page_lines = page_text.splitlines()
 
             chunk, size, sentence, counter = "", 0, "", 0
             line_begin = 1
@@ -155,9 +192,9 @@ def _fallback_chunk_pdf_file(file: str, max_chunk_size: int = 500) -> List[Dict[
                         line_range = f"{line_begin}-{line_number + 1}"
                         chunks.append(
                             {
-                                "id": f"f({file}):p({page_num + 1})l({line_range}):{seq_no}",
+                                "id": f"f({file}):p({page_num})l({line_range}):{seq_no}",
                                 "file": file,
-                                "page": page_num + 1,
+                                "page": page_num,
                                 "line": line_range,
                                 "size": size,
                                 "count": counter,
@@ -182,9 +219,9 @@ def _fallback_chunk_pdf_file(file: str, max_chunk_size: int = 500) -> List[Dict[
                 line_range = f"{line_begin}-{line_number + 1}"
                 chunks.append(
                     {
-                        "id": f"f({file}):p({page_num + 1})l({line_range}):{seq_no}",
+                        "id": f"f({file}):p({page_num})l({line_range}):{seq_no}",
                         "file": file,
-                        "page": page_num + 1,
+                        "page": page_num,
                         "line": line_range,
                         "size": size,
                         "count": counter,
@@ -192,7 +229,6 @@ def _fallback_chunk_pdf_file(file: str, max_chunk_size: int = 500) -> List[Dict[
                     }
                 )
 
-        doc.close()
         return chunks
 
     except Exception as e:
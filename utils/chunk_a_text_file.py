@@ -1,6 +1,14 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from config import config
+from .chunk_engine import PARAGRAPH_BREAK, accumulate_chunks, split_at_spaces
+from .text_cache import cached_units
+
+
+# Files are read in blocks of this many characters, so memory does not grow with file size
+_READ_BLOCK_SIZE = 1 << 20
+# Bump when _read_paragraphs changes its output, to invalidate cached paragraphs
+_EXTRACTOR_VERSION = 1
 
 
 def chunk_a_text_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
@@ -16,53 +24,67 @@ def chunk_a_text_file(file: str, max_chunk_size: int = 500, overlap: int = 50) -
         List of chunk dictionaries
     """
     try:
-        with open(file, "r", errors="ignore") as f:
-            source_text = f.read()
+        return list(iter_text_file_chunks(file, max_chunk_size, overlap))
 
-        # Normalize whitespace
-        file_text = re.sub(r"\s+", " ", source_text.strip())
+    except Exception as e:
+        # Fallback to simple line-based chunking if advanced method fails
+        return _fallback_chunk_text_file(file, max_chunk_size)
 
-        # Split into paragraphs first (better semantic boundaries)
-        paragraphs = re.split(r'\n\s*\n', file_text)
-        paragraphs = [p.strip() for p in paragraphs if p.strip()]
 
-        chunks = []
-        seq_no = 1
-        current_chunk = ""
-        current_size = 0
+def iter_text_file_chunks(file: str, max_chunk_size: int = 500, overlap: int = 50) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming version of chunk_a_text_file: read the file incrementally and yield chunks as produced.
 
-        for para_idx, paragraph in enumerate(paragraphs):
-            # If adding this paragraph would exceed the limit
-            if current_size + len(paragraph) > max_chunk_size and current_chunk:
-                # Create chunk
-                chunks.append(_create_chunk_metadata(file, current_chunk, seq_no, 0, para_idx))
-                seq_no += 1
+    Peak memory is bounded by the read block size and max_chunk_size, not by the file size.
 
-                # Start new chunk with overlap from previous chunk
-                if overlap > 0 and len(current_chunk) > overlap:
-                    overlap_text = current_chunk[-overlap:].strip()
-                    current_chunk = overlap_text + " " + paragraph
-                    current_size = len(current_chunk)
-                else:
-                    current_chunk = paragraph
-                    current_size = len(paragraph)
-            else:
-                # Add to current chunk
-                if current_chunk:
-                    current_chunk += " " + paragraph
-                else:
-                    current_chunk = paragraph
-                current_size = len(current_chunk)
+    Args:
+        file: Path to the text file
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
 
-        # Add final chunk
-        if current_chunk:
-            chunks.append(_create_chunk_metadata(file, current_chunk, seq_no, 0, len(paragraphs)))
+    Yields:
+        Chunk dictionaries
+    """
+    # Normalized paragraphs come from the text cache when this content was read before
+    paragraphs = cached_units(file, "text", _EXTRACTOR_VERSION, _read_paragraphs)
+    segments = (piece for paragraph in paragraphs for piece in split_at_spaces(paragraph, max_chunk_size))
+    chunks = accumulate_chunks(segments, max_chunk_size, overlap)
+    for seq_no, (text, _, end) in enumerate(chunks, start=1):
+        yield _create_chunk_metadata(file, text, seq_no, 0, end)
 
-        return chunks
 
-    except Exception as e:
-        # Fallback to simple line-based chunking if advanced method fails
-        return _fallback_chunk_text_file(file, max_chunk_size)
+def _read_paragraphs(file: str) -> Iterator[str]:
+    """
+    Yield the whitespace-normalized paragraphs (separated by blank lines) of a text file.
+
+    Paragraphs longer than the read block size are cut at a word boundary, so memory stays
+    bounded for files without blank lines.
+    """
+    with open(file, "r", errors="ignore") as f:
+        carry = ""
+        while True:
+            block = f.read(_READ_BLOCK_SIZE)
+            text = carry + block
+            if not text:
+                break
+
+            parts = PARAGRAPH_BREAK.split(text)
+            # the last part may continue in the next block, unless this was the last block
+            carry = parts.pop() if block else ""
+            if len(carry) > _READ_BLOCK_SIZE:
+                # no paragraph break in a whole block: release all but the last partial word
+                cut = carry.rfind(" ", 0, len(carry) - 1)
+                if cut <= 0:
+                    cut = len(carry)
+                parts.append(carry[:cut])
+                carry = carry[cut:]
+
+            for part in parts:
+                paragraph = " ".join(part.split())
+                if paragraph:
+                    yield paragraph
+            if not block:
+                break
 
 
 def _create_chunk_metadata(file: str, text: str, seq_no: int, page: int, line_info: Any) -> Dict[str, Any]:
@@ -0,0 +1,89 @@
+"""
+Shared chunking core for the text, code and PDF chunkers.
+
+Each chunker only decides where its segments end (paragraphs, code blocks, PDF
+paragraphs); accumulate_chunks() packs those segments into chunks of at most
+max_chunk_size characters with overlap. Segments are collected in a list and joined
+once, when a chunk is emitted, so the cost of chunking is linear in the input size.
+"""
+
+import re
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+# Blank line(s) between paragraphs
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def accumulate_chunks(segments: Iterable[str], max_chunk_size: int, overlap: int,
+                      separator: str = " ",
+                      overlap_break: Optional[Callable[[str], int]] = None) -> Iterator[Tuple[str, int, int]]:
+    """
+    Pack segments into chunks of at most max_chunk_size characters, with overlap.
+
+    A segment is added to the current chunk unless that would make it exceed
+    max_chunk_size; then the chunk is emitted and the next one starts with the last
+    `overlap` characters of it. Segments longer than max_chunk_size are emitted alone,
+    so callers should split them first if that matters.
+
+    Args:
+        segments: Iterable of segment strings, e.g. paragraphs or code blocks
+        max_chunk_size: Maximum characters per chunk
+        overlap: Number of characters to overlap between chunks
+        separator: String placed between segments in a chunk
+        overlap_break: Optional callable returning where to cut the overlap text (0 keeps it all)
+
+    Yields:
+        Tuples of (text, start, end), where start and end are the indexes of the first
+        segment in the chunk and one past the last one
+    """
+    pieces = []
+    size = 0  # length of separator.join(pieces)
+    start = 0
+    sep_len = len(separator)
+
+    for index, segment in enumerate(segments):
+        if size and size + len(segment) > max_chunk_size:
+            text = separator.join(pieces)
+            yield text, start, index
+
+            start = index
+            if overlap > 0 and len(text) > overlap:
+                overlap_text = text[-overlap:].strip()
+                if overlap_break is not None:
+                    cut = overlap_break(overlap_text)
+                    if cut:
+                        overlap_text = overlap_text[:cut]
+                pieces = [overlap_text, segment]
+                size = len(overlap_text) + sep_len + len(segment)
+            else:
+                pieces = [segment]
+                size = len(segment)
+        elif size:
+            pieces.append(segment)
+            size += sep_len + len(segment)
+        else:
+            pieces = [segment]
+            size = len(segment)
+
+    if size:
+        yield separator.join(pieces), start, index + 1
+
+
+def split_at_spaces(text: str, max_size: int) -> Iterator[str]:
+    """
+    Split text into pieces of at most max_size characters, preferring to cut at spaces.
+
+    Walks the text by offset, so a long paragraph is split in linear time.
+    """
+    pos = 0
+    end = len(text)
+    while end - pos > max_size:
+        cut = text.rfind(" ", pos, pos + max_size + 1)
+        if cut <= pos:
+            cut = pos + max_size
+        yield text[pos:cut]
+        pos = cut
+        while pos < end and text[pos] == " ":
+            pos += 1
+    if pos < end:
+        yield text[pos:]
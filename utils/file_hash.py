@@ -0,0 +1,42 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+# Read files in 1 MiB blocks so hashing large files does not load them into memory
+_BLOCK_SIZE = 1 << 20
+
+# Recent digests keyed by path, reused while the file's size and mtime are unchanged,
+# so the manifest and the text cache do not hash the same file twice
+_MEMO_SIZE = 1024
+_memo = OrderedDict()
+
+
+def hash_file(file: str) -> str:
+    """
+    Compute the SHA-256 content hash of a file.
+
+    Args:
+        file: Path to the file
+
+    Returns:
+        Hex digest of the file content
+    """
+    stat = os.stat(file)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    memo = _memo.get(file)
+    if memo is not None and memo[0] == signature:
+        _memo.move_to_end(file)
+        return memo[1]
+
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        while True:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+
+    _memo[file] = (signature, digest.hexdigest())
+    if len(_memo) > _MEMO_SIZE:
+        _memo.popitem(last=False)
+    return digest.hexdigest()
@@ -0,0 +1,23 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Consume any iterable in lists of at most batch_size items.
+
+    Args:
+        items: Iterable to consume, e.g. a chunk generator
+        batch_size: Maximum number of items per batch
+
+    Yields:
+        Lists of consecutive items
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, max(1, batch_size)))
+        if not batch:
+            return
+        yield batch
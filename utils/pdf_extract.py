@@ -0,0 +1,66 @@
+"""
+PDF text extraction for the PDF chunker.
+
+Pages are read with PyMuPDF's "blocks" text mode, which returns each text block (roughly
+a paragraph) as one string, far cheaper than building the span-level "dict" output.
+Blocks are joined with blank lines, so the chunker's paragraph split sees the document's
+own paragraph boundaries.
+
+Large PDFs are indexed in page ranges of PDF_EXTRACT_PAGES_PER_TASK pages, which the
+index pipeline hands to its chunk workers as separate tasks (see pdf_page_ranges).
+"""
+
+from typing import Iterator, List, Tuple
+import fitz  # PyMuPDF
+from config import config
+
+# Bump when the extracted page text changes, to invalidate the text cache
+PDF_EXTRACTOR_VERSION = 1
+# Block type of text blocks in get_text("blocks") output (1 is an image)
+_TEXT_BLOCK = 0
+
+
+def iter_pdf_pages(file: str, start: int = 0, end: int = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page number, page text) for the pages start..end-1 (0-based) of a PDF, in order,
+    page numbers from 1. By default every page is read.
+    """
+    with fitz.open(file) as doc:
+        end = doc.page_count if end is None else min(end, doc.page_count)
+        for page_num in range(start, end):
+            yield page_num + 1, _page_text(file, page_num, doc[page_num])
+
+
+def pdf_page_count(file: str) -> int:
+    """Return the number of pages of a PDF."""
+    with fitz.open(file) as doc:
+        return doc.page_count
+
+
+def pdf_page_ranges(file: str) -> List[Tuple[int, int]]:
+    """
+    Split a PDF into (start, end) page ranges (0-based, end exclusive) of
+    PDF_EXTRACT_PAGES_PER_TASK pages; a smaller PDF is a single range.
+    """
+    page_count = pdf_page_count(file)
+    per_task = max(1, config.PDF_EXTRACT_PAGES_PER_TASK)
+    return [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+
+def _page_text(file: str, page_num: int, page) -> str:
+    """Text of one page: its text blocks with blank lines dropped, separated by blank lines."""
+    try:
+        blocks = page.get_text("blocks", sort=False)
+    except Exception as e:
+        # Log error but continue with other pages
+        print(f"Error processing page {page_num + 1} in {file}: {e}")
+        return ""
+
+    paragraphs = []
+    for block in blocks:
+        if block[6] != _TEXT_BLOCK:
+            continue
+        text = "\n".join(line for line in block[4].splitlines() if line.strip())
+        if text:
+            paragraphs.append(text)
+    return "\n\n".join(paragraphs)
@@ -0,0 +1,190 @@
+"""
+On-disk cache of extracted, normalized document text.
+
+Extraction (PyMuPDF for PDFs, decoding and whitespace normalization for text files) does
+not depend on MAX_CHUNK_SIZE, CHUNK_OVERLAP or the vector store, so its output is cached
+under TEXT_CACHE_DIR and reused by every rebuild until the file content changes.
+
+Each entry holds the units a chunker splits into chunks, one JSON value per line:
+normalized paragraphs for text files and lines for code files. PDFs get one entry per
+page, holding its [page number, page text] pair, so chunking a whole PDF and chunking it
+in page ranges share them. Entries are keyed by the file's content hash, the kind of
+units and the extractor version, so changing an extractor only needs a version bump. The cache is kept
+under TEXT_CACHE_MAX_MB by evicting the least recently used entries.
+"""
+
+import os
+import json
+from typing import Callable, Iterable, Iterator
+from config import config
+from .file_hash import hash_file
+
+_ENTRY_SUFFIX = ".jsonl"
+
+
+class TextCache:
+    """
+    Size-bounded cache of extracted text units, safe to share between processes.
+
+    Args:
+        cache_dir: Directory holding the entries
+        max_bytes: Total size above which least recently used entries are evicted
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size = None  # bytes in the cache as last scanned plus what this process added
+
+    def units(self, file: str, kind: str, version: int,
+              extract: Callable[[str], Iterable]) -> Iterator:
+        """
+        Yield the extracted units of a file, from the cache or from extract(file).
+
+        On a miss the units are written to the cache while they are yielded; the entry is
+        only kept if every unit was produced and the file did not change in the meantime.
+        """
+        stat = os.stat(file)
+        path = self._entry_path(hash_file(file), kind, version)
+        try:
+            f = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            yield from self._extract_and_store(file, stat, path, extract)
+            return
+
+        with f:
+            # mark the entry as recently used for eviction
+            os.utime(path)
+            try:
+                for line in f:
+                    yield json.loads(line)
+            except ValueError:
+                # truncated or corrupt entry: drop it so the next run extracts again
+                self._remove(path)
+                raise
+
+    def get(self, content_hash: str, kind: str, version: int):
+        """Return the units of an entry as a list, or None if it is not cached."""
+        path = self._entry_path(content_hash, kind, version)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                os.utime(path)
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self._remove(path)
+            return None
+
+    def put(self, file: str, stat, content_hash: str, kind: str, version: int, units):
+        """Store the units extracted from a file, unless it changed since stat was taken."""
+        now = os.stat(file)
+        if (now.st_size, now.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return
+        path = self._entry_path(content_hash, kind, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for unit in units:
+                f.write(json.dumps(unit))
+                f.write("\n")
+        os.replace(tmp_path, path)
+        self._added(os.path.getsize(path))
+
+    def _extract_and_store(self, file: str, stat, path: str, extract):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        stored = False
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for unit in extract(file):
+                    f.write(json.dumps(unit))
+                    f.write("\n")
+                    yield unit
+
+            now = os.stat(file)
+            if (now.st_size, now.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                os.replace(tmp_path, path)
+                stored = True
+        finally:
+            if not stored:
+                self._remove(tmp_path)
+
+        if stored:
+            self._added(os.path.getsize(path))
+
+    def _entry_path(self, content_hash: str, kind: str, version: int) -> str:
+        # fan out over subdirectories so no single directory grows too large
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}-{kind}-v{version}{_ENTRY_SUFFIX}")
+
+    def _added(self, size: int):
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        """Yield (mtime, path, size) for every entry in the cache."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process
+                    yield stat.st_mtime, entry.path, stat.st_size
+
+    def evict(self):
+        """Remove least recently used entries until the cache is at most 90% of max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        self._size = total
+
+    def clear(self):
+        """Remove every entry."""
+        for _, path, _ in list(self._entries()):
+            self._remove(path)
+        self._size = 0
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_cache = None
+
+
+def get_text_cache():
+    """Return the process-wide TextCache, or None when TEXT_CACHE_MAX_MB is 0."""
+    global _cache
+    if config.TEXT_CACHE_MAX_MB <= 0:
+        return None
+    if _cache is None:
+        _cache = TextCache(config.TEXT_CACHE_DIR, config.TEXT_CACHE_MAX_MB * (1 << 20))
+    return _cache
+
+
+def cached_units(file: str, kind: str, version: int, extract: Callable[[str], Iterable]) -> Iterator:
+    """Yield the extracted units of a file through the text cache, or straight from extract(file) if it is off."""
+    cache = get_text_cache()
+    if cache is None:
+        return iter(extract(file))
+    return cache.units(file, kind, version, extract)